@@ -0,0 +1,79 @@
+"""Benchmarks the Internet checksum engine against the previous word by word implementation
+
+The copy made by int.from_bytes for the buffers that aren't bytes (copy column) and a sum over
+memoryview.cast("H") (no copy, one int per 16 bits word) are measured too
+
+usage: python -m benchmarks.checksum
+"""
+import os
+import struct
+import sys
+import timeit
+from typing import Callable
+
+from tcpy.ip_util import Buffer, ip_checksum
+
+SIZES = [20, 1500, 9000]
+
+
+def legacy_checksum(raw: Buffer, start: int = 0) -> int:
+    """previous implementation (one struct.unpack and one slice per 16 bits word)"""
+    csum, idx = start, 0
+    length = len(raw)
+
+    while idx + 1 < length:
+        csum += struct.unpack("!H", raw[idx : idx + 2])[0]
+        idx += 2
+
+    if idx < length:
+        csum += int(raw[idx])
+
+    while csum >> 16:
+        csum = (csum & 0xFFFF) + (csum >> 16)
+
+    return csum ^ 0xFFFF
+
+
+def cast_checksum(raw: Buffer, start: int = 0) -> int:
+    """sums the native 16 bits words of a memoryview cast (the sum is byte swapped on little endian hosts)"""
+    view = memoryview(raw)
+    csum = sum(view[: len(view) & ~1].cast("H"))
+    if len(view) & 1:
+        csum += view[-1] if sys.byteorder == "little" else view[-1] << 8
+    while csum >> 16:
+        csum = (csum & 0xFFFF) + (csum >> 16)
+    if sys.byteorder == "little":
+        csum = ((csum & 0xFF) << 8) | (csum >> 8)
+    csum += start
+    while csum >> 16:
+        csum = (csum & 0xFFFF) + (csum >> 16)
+    return csum ^ 0xFFFF
+
+
+def bench(fn: Callable[[Buffer], int], raw: Buffer, number: int) -> float:
+    """returns the average time spent per call in microseconds"""
+    return timeit.timeit(lambda: fn(raw), number=number) / number * 1e6
+
+
+def main() -> None:
+    print(
+        f"{'size':>6} {'buffer':>10} {'legacy (us)':>12} {'bulk (us)':>10} {'speedup':>8} "
+        f"{'copy (us)':>10} {'cast (us)':>10}"
+    )
+    for size in SIZES:
+        data = os.urandom(size)
+        number = max(200, 200000 // size)
+        for raw in (data, bytearray(data), memoryview(data)):
+            assert cast_checksum(raw, 0x1234) == ip_checksum(raw, 0x1234)
+            legacy = bench(legacy_checksum, raw, number)
+            bulk = bench(ip_checksum, raw, number)
+            copy = 0.0 if isinstance(raw, bytes) else bench(bytes, raw, number)  # type: ignore
+            cast = bench(cast_checksum, raw, number)
+            print(
+                f"{size:>6} {type(raw).__name__:>10} {legacy:>12.2f} {bulk:>10.2f} {legacy / bulk:>7.1f}x "
+                f"{copy:>10.2f} {cast:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
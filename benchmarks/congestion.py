@@ -0,0 +1,123 @@
+"""Simulates bulk transfers between two engines over a bottleneck link (bandwidth, delay, drop tail
+queue and random losses) and compares the goodput of the congestion controls, the simulation runs
+on a virtual clock in the current process (a fixed retransmission timeout is used, the receiver
+delays its ACKs)
+
+note: the receiver discards the segments arriving out of order for now, so every loss costs
+the retransmission of the rest of the window
+
+usage: python -m benchmarks.congestion
+"""
+import heapq
+import random
+from typing import List, Tuple
+
+from tcpy.congestion import CONGESTION_CONTROLS
+from tcpy.tcp import TCPHeader
+from tcpy.tcp_engine import TCPEngine
+
+TRANSFER = 4 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+BANDWIDTH = 20e6 / 8  # bytes per second on the bottleneck
+DELAY = 0.02  # one way propagation delay
+QUEUE = 64 * 1500  # bytes queued before the bottleneck
+RTO = 0.25
+LOSSES = (0.0, 0.001, 0.01)
+
+CLIENT, SERVER = 0x0A000001, 0x0A000004
+
+
+class Simulation:
+
+    """Two engines connected by a link: data segments go through the bottleneck, ACKs only have the delay"""
+
+    def __init__(self, congestion: str, loss: float, seed: int = 42):
+        self.now = 0.0
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.events: List[Tuple[float, int, int, int, bytes]] = []
+        self.count = 0
+        # time at which the bottleneck finishes sending the queued segments
+        self.busy_until = 0.0
+        self.dropped = 0
+
+        self.client = TCPEngine(self.output, clock=self.clock, buffer_size=BUFFER_SIZE, congestion=congestion)
+        self.server = TCPEngine(self.output, clock=self.clock, buffer_size=BUFFER_SIZE)
+
+    def clock(self) -> float:
+        return self.now
+
+    def output(self, saddr: int, daddr: int, seg: TCPHeader) -> None:
+        raw = seg.encode()
+        deliver = self.now + DELAY
+        if daddr == SERVER:
+            start = max(self.now, self.busy_until)
+            if self.rng.random() < self.loss or (start - self.now) * BANDWIDTH > QUEUE:
+                self.dropped += 1
+                return
+            self.busy_until = start + len(raw) / BANDWIDTH
+            deliver = self.busy_until + DELAY
+
+        self.count += 1
+        heapq.heappush(self.events, (deliver, self.count, saddr, daddr, raw))
+
+    def run(self) -> float:
+        """runs the transfer
+
+        :returns: the goodput in bytes per second
+
+        """
+        listener = self.server.listen(SERVER, 80)
+        tcb = self.client.connect(CLIENT, 5000, SERVER, 80)
+        peer = None
+        buf = memoryview(bytearray(BUFFER_SIZE))
+        sent = received = 0
+        progress, snd_una = 0.0, tcb.snd_una
+
+        while received < TRANSFER:
+            if sent < TRANSFER:
+                sent += self.client.send(tcb, bytes(min(TRANSFER - sent, tcb.snd_buf.free())))
+
+            deadline = progress + RTO if tcb.snd_una != tcb.snd_max else None
+            if deadline is not None and (not self.events or deadline < self.events[0][0]):
+                self.now = progress = deadline
+                self.client.retransmit_timeout(tcb)
+                continue
+
+            # delayed ACKs of the receiver
+            timeout = self.server.timers.timeout()
+            if timeout is not None and (not self.events or self.now + timeout < self.events[0][0]):
+                self.now += timeout
+                self.server.timers.advance()
+                continue
+
+            self.now, _, saddr, daddr, raw = heapq.heappop(self.events)
+            engine = self.server if daddr == SERVER else self.client
+            engine.segment_arrives(saddr, daddr, TCPHeader.decode(raw))
+
+            if tcb.snd_una != snd_una:
+                progress, snd_una = self.now, tcb.snd_una
+            if peer is None:
+                peer = self.server.accept(listener)
+            if peer is not None:
+                received += self.server.recv_into(peer, buf)
+
+        return TRANSFER / self.now
+
+
+def main() -> None:
+    print(f"bottleneck: {BANDWIDTH * 8 / 1e6:.0f} Mbit/s, rtt: {2 * DELAY * 1e3:.0f} ms")
+    print(f"{'loss':>6} {'algorithm':>10} {'Mbit/s':>8} {'retransmits':>12} {'fast retx':>10} {'timeouts':>9}")
+    for loss in LOSSES:
+        for name in CONGESTION_CONTROLS:
+            sim = Simulation(name, loss)
+            goodput = sim.run()
+            client = sim.client
+            print(
+                f"{loss:>6.3f} {name:>10} {goodput * 8 / 1e6:>8.2f} {client.retransmits:>12} "
+                f"{client.fast_retransmits:>10} {client.timeouts:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Benchmarks the decoding of a received TCP segment through the ethernet, IP and TCP layers
+
+It compares the zero copy decoding (every layer's payload is a memoryview over the frame)
+with copying the payload at every layer (what the decoders used to do by slicing bytes)
+
+usage: python -m benchmarks.decode
+"""
+import timeit
+import tracemalloc
+from typing import Callable, List
+
+from tcpy.eth import EthernetHeader
+from tcpy.ip import IPHeader
+from tcpy.tcp import TCPHeader
+from tcpy.tests.utils import tcp_frame
+
+PAYLOAD_SIZES = [0, 512, 1460]
+
+
+def decode_zero_copy(raw: bytes) -> List[object]:
+    eth = EthernetHeader.decode(raw)
+    ip_hdr = IPHeader.decode(eth.payload)
+    return [eth, ip_hdr, TCPHeader.decode(ip_hdr.payload)]
+
+
+def decode_copy(raw: bytes) -> List[object]:
+    eth = EthernetHeader.decode(bytes(raw))
+    ip_hdr = IPHeader.decode(bytes(eth.payload))
+    return [eth, ip_hdr, TCPHeader.decode(bytes(ip_hdr.payload))]
+
+
+def allocated_per_frame(fn: Callable[[bytes], List[object]], raw: bytes) -> int:
+    """returns the number of bytes allocated to decode a frame (keeping every layer alive)"""
+    fn(raw)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        decoded = fn(raw)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    del decoded
+    return after - before
+
+
+def main() -> None:
+    print(f"{'payload':>8} {'decoder':>10} {'bytes/frame':>12} {'us/frame':>9}")
+    for size in PAYLOAD_SIZES:
+        raw = tcp_frame(size)
+        for name, fn in (("copy", decode_copy), ("zero-copy", decode_zero_copy)):
+            number = 20000
+            elapsed = timeit.timeit(lambda: fn(raw), number=number) / number * 1e6
+            print(
+                f"{size:>8} {name:>10} {allocated_per_frame(fn, raw):>12} {elapsed:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
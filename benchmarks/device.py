@@ -0,0 +1,86 @@
+"""Benchmarks the round trip latency of the stack (an ICMP echo request in, the reply out)
+and the throughput for the in-memory devices, everything runs in the current process
+
+usage: python -m benchmarks.device
+"""
+import time
+from typing import List
+
+from tcpy.arp import mac2b
+from tcpy.constants import ARP_IPV4
+from tcpy.netdev import CallableDevice, NetDevice, SocketPairDevice
+from tcpy.stack import Stack
+from tcpy.tests.utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC, icmp_echo_frame
+
+ROUND_TRIPS = 20000
+BATCH = 32
+PAYLOAD_SIZE = 56
+
+
+def new_stack(device: NetDevice) -> Stack:
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, mtu=1500, batch_size=BATCH, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+    return stack
+
+
+def bench_callable() -> None:
+    frame = icmp_echo_frame(PAYLOAD_SIZE)
+    replies: List[bytes] = []
+    device = CallableDevice(replies.append)
+    stack = new_stack(device)
+
+    start = time.perf_counter()
+    for _ in range(ROUND_TRIPS):
+        device.inject(frame)
+        stack.rx_batch()
+    latency = (time.perf_counter() - start) / ROUND_TRIPS
+
+    start = time.perf_counter()
+    for _ in range(ROUND_TRIPS // BATCH):
+        for _ in range(BATCH):
+            device.inject(frame)
+        stack.rx_batch()
+    throughput = (ROUND_TRIPS // BATCH) * BATCH / (time.perf_counter() - start)
+
+    report("callable", latency, throughput)
+    device.close()
+
+
+def bench_socketpair() -> None:
+    frame = icmp_echo_frame(PAYLOAD_SIZE)
+    device = SocketPairDevice()
+    stack = new_stack(device)
+    peer = device.peer
+
+    start = time.perf_counter()
+    for _ in range(ROUND_TRIPS):
+        peer.send(frame)
+        stack.rx_batch()
+        peer.recv(65535)
+    latency = (time.perf_counter() - start) / ROUND_TRIPS
+
+    start = time.perf_counter()
+    for _ in range(ROUND_TRIPS // BATCH):
+        for _ in range(BATCH):
+            peer.send(frame)
+        stack.rx_batch()
+        for _ in range(BATCH):
+            peer.recv(65535)
+    throughput = (ROUND_TRIPS // BATCH) * BATCH / (time.perf_counter() - start)
+
+    report("socketpair", latency, throughput)
+    device.close()
+
+
+def report(name: str, latency: float, throughput: float) -> None:
+    print(f"{name:>10} {latency * 1e6:>16.1f} {throughput:>12.0f}")
+
+
+def main() -> None:
+    print(f"{'device':>10} {'round trip (us)':>16} {'frames/s':>12}")
+    bench_callable()
+    bench_socketpair()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmarks the IP reassembly under a fragment flood: fragments of datagrams that never complete
+(one fragment each, with a new identification) are interleaved with fragmented echo requests,
+the frames go through an in-process device
+
+The memory of the incomplete datagrams is bounded (the oldest ones are evicted), the echo requests
+answered, the reassembly memory and the memory allocated during the run (tracemalloc peak) are reported.
+
+usage: python -m benchmarks.fragments
+"""
+import time
+import tracemalloc
+from typing import List, Tuple
+
+from tcpy.arp import mac2b
+from tcpy.constants import ARP_IPV4, ICMP, ICMP_V4_ECHO
+from tcpy.icmpv4 import ICMPv4Header
+from tcpy.netdev import CallableDevice
+from tcpy.stack import Stack
+from tcpy.tests.utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC, fragment_frames
+
+ECHOES = 200
+ECHO_SIZE = 8000
+FRAGMENT_SIZE = 1480
+# bogus fragments per echo request
+FLOODS = [0, 100, 1000]
+
+
+def run(flood: int) -> Tuple[float, int, int, float]:
+    """floods the stack with fragments
+
+    :returns: (ratio of the echo requests answered, reassembly memory in bytes, peak memory in bytes,
+    time per fragment in seconds)
+
+    """
+    replies: List[bytes] = []
+    device = CallableDevice(replies.append)
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, mtu=1500, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+
+    echo = ICMPv4Header(typ=ICMP_V4_ECHO, code=0, csum=0, data=bytes(ECHO_SIZE))
+    echo.adjust_checksum()
+    payload = echo.encode()
+    # the second fragment of a datagram: it stays incomplete
+    bogus = [fragment_frames(ICMP, payload, FRAGMENT_SIZE, id)[1] for id in range(1 << 16)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    frames = memory = 0
+    for idx in range(ECHOES):
+        for frame in (bogus[(idx * flood + n) % len(bogus)] for n in range(flood)):
+            device.inject(frame)
+            frames += 1
+            stack.rx_batch()
+        for frame in fragment_frames(ICMP, payload, FRAGMENT_SIZE, id=0xFFFF - idx):
+            device.inject(frame)
+            frames += 1
+        while stack.rx_batch():
+            pass
+        memory = max(memory, stack.reassembly.memory)
+    elapsed = (time.perf_counter() - start) / frames
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    device.close()
+
+    return len(replies) / ECHOES, memory, peak, elapsed
+
+
+def main() -> None:
+    print(f"{'flood':>6} {'answered':>9} {'reassembly (KB)':>16} {'peak memory (KB)':>17} {'fragment (us)':>14}")
+    for flood in FLOODS:
+        answered, memory, peak, elapsed = run(flood)
+        print(f"{flood:>6} {answered:>9.0%} {memory / 1024:>16.0f} {peak / 1024:>17.0f} {elapsed * 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmarks the memory used by header objects and the time spent to decode them
+and dispatch on their type (eager vs lazy decoding)
+
+usage: python -m benchmarks.headers
+"""
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, List
+
+from tcpy.eth import EthernetHeader
+from tcpy.ip import IPHeader
+from tcpy.tcp import TCPHeader
+from tcpy.tests.utils import tcp_frame
+
+COUNT = 10000
+
+
+class DictIPHeader:
+
+    """IPHeader storing its fields in a __dict__ (what the headers used to do), used as a baseline"""
+
+    def __init__(self, hdr: IPHeader):
+        self._version = hdr._version
+        self._ihl = hdr._ihl
+        self._tos = hdr._tos
+        self.len = hdr.len
+        self.id = hdr.id
+        self._flags = hdr._flags
+        self._frag_offset = hdr._frag_offset
+        self._ttl = hdr._ttl
+        self.proto = hdr.proto
+        self._csum = hdr._csum
+        self.saddr = hdr.saddr
+        self.daddr = hdr.daddr
+        self.payload = hdr.payload
+
+
+def object_size(obj: Any) -> int:
+    """returns the size of the object itself (and of its __dict__ if it has one)"""
+    return sys.getsizeof(obj) + sys.getsizeof(getattr(obj, "__dict__", None) or ())
+
+
+def memory_per_object(build: Callable[[], Any]) -> float:
+    """returns the average number of bytes allocated per object built (including its fields)"""
+    objects: List[Any] = []
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(COUNT):
+            objects.append(build())
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    # Remove the list overhead
+    return (after - before - len(objects) * 8) / COUNT
+
+
+def dispatch(raw: bytes, lazy: bool) -> bool:
+    """decodes the ethernet and IP layers and checks the IP protocol (the lazy IP header doesn't
+    verify the checksum, see check_checksum)"""
+    eth = EthernetHeader.decode(raw, lazy=lazy)
+    ip_hdr = IPHeader.decode(eth.payload, lazy=lazy)
+    return ip_hdr.is_tcp()
+
+
+def main() -> None:
+    raw = tcp_frame(512)
+    ip_raw = raw[14:]
+    eager_ip = IPHeader.decode(ip_raw)
+
+    print("IPHeader object size (bytes)")
+    print(f"  __dict__ (baseline): {object_size(DictIPHeader(eager_ip))}")
+    print(f"  __slots__ (eager):   {object_size(eager_ip)}")
+    print(f"  __slots__ (lazy):    {object_size(IPHeader.decode(ip_raw, lazy=True))}")
+
+    print("IPHeader allocated per decode, fields included (bytes)")
+    print(f"  eager: {memory_per_object(lambda: IPHeader.decode(ip_raw)):.0f}")
+    print(f"  lazy:  {memory_per_object(lambda: IPHeader.decode(ip_raw, lazy=True)):.0f}")
+
+    print("decode time (us)")
+    for name, fn in (
+        ("ethernet", lambda lazy: EthernetHeader.decode(raw, lazy=lazy)),
+        ("IP", lambda lazy: IPHeader.decode(ip_raw, lazy=lazy)),
+        ("TCP", lambda lazy: TCPHeader.decode(ip_raw[20:], lazy=lazy)),
+        ("eth + IP + is_tcp()", lambda lazy: dispatch(raw, lazy)),
+    ):
+        eager = timeit.timeit(lambda: fn(False), number=COUNT) / COUNT * 1e6
+        lazy = timeit.timeit(lambda: fn(True), number=COUNT) / COUNT * 1e6
+        print(f"  {name:<20} eager: {eager:.2f}, lazy: {lazy:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmarks bulk transfers across a path whose MTU is smaller than the one of the interfaces: a router
+between two stacks drops the datagrams bigger than the path MTU and answers with an ICMP fragmentation
+needed message, everything runs in the current process
+
+With path MTU discovery the sender settles on the biggest segments fitting in the path (the segments lost
+before are sent again right away), it's compared with a sender using the conservative 576 bytes MTU.
+
+usage: python -m benchmarks.pmtu
+"""
+import time
+from typing import List, Tuple
+
+from tcpy.arp import mac2b
+from tcpy.constants import ARP_IPV4, ETH_P_IP, ICMP, ICMP_V4_DST_UNREACHABLE, ICMP_V4_FRAG_NEEDED
+from tcpy.eth import ETH_HEADER_SIZE, EthernetHeader
+from tcpy.icmpv4 import ICMPv4Header
+from tcpy.ip import IP_HEADER_SIZE, IPHeader
+from tcpy.ip_util import ip2int
+from tcpy.netdev import CallableDevice
+from tcpy.stack import Stack
+from tcpy.tests.utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC
+
+TRANSFER_SIZE = 4 * 1024 * 1024
+BUFFER_SIZE = 256 * 1024
+PATH_MTUS = [1400, 1000, 576]
+ROUTER = ip2int("10.0.0.1")
+
+
+def frag_needed(datagram: bytes, mtu: int) -> bytes:
+    """builds the ICMP fragmentation needed message of the router"""
+    data = mtu.to_bytes(4, "big") + datagram[: IP_HEADER_SIZE + 8]
+    icmp = ICMPv4Header(typ=ICMP_V4_DST_UNREACHABLE, code=ICMP_V4_FRAG_NEEDED, csum=0, data=data)
+    icmp.adjust_checksum()
+    payload = icmp.encode()
+    ip_hdr = IPHeader.build(ROUTER, ip2int(PEER_IP), ICMP, len(payload), 0)
+    return EthernetHeader.spec.pack(mac2b(PEER_MAC), mac2b(STACK_MAC), ETH_P_IP) + ip_hdr.encode() + payload
+
+
+def transfer(path_mtu: int, sender_mtu: int) -> Tuple[float, int, int]:
+    """sends TRANSFER_SIZE bytes across the router
+
+    :returns: (time in seconds, segment size of the sender, ICMP messages sent by the router)
+
+    """
+    devices: List[CallableDevice] = []
+    messages = 0
+
+    def deliver(idx: int, frame: bytes) -> None:
+        nonlocal messages
+        if len(frame) - ETH_HEADER_SIZE > path_mtu:
+            messages += 1
+            devices[0].inject(frag_needed(frame[ETH_HEADER_SIZE:], path_mtu))
+            return
+        devices[idx].inject(frame)
+
+    devices.extend((CallableDevice(lambda frame: deliver(1, frame)), CallableDevice(lambda frame: deliver(0, frame))))
+    sender = Stack(ip=PEER_IP, mac=PEER_MAC, mtu=sender_mtu, device=devices[0], buffer_size=BUFFER_SIZE)
+    receiver = Stack(ip=STACK_IP, mac=STACK_MAC, device=devices[1], buffer_size=BUFFER_SIZE)
+    sender.table.insert(ARP_IPV4, STACK_IP, mac2b(STACK_MAC))
+    receiver.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+
+    def pump() -> None:
+        while receiver.rx_batch() + sender.rx_batch():
+            pass
+
+    listener = receiver.listen(4242)
+    client = sender.connect(STACK_IP, 4242)
+    sender.flush()
+    pump()
+    server = receiver.tcp.accept(listener)
+    assert server is not None
+
+    data = memoryview(bytes(TRANSFER_SIZE))
+    buf = memoryview(bytearray(BUFFER_SIZE))
+    sent = received = 0
+    start = time.perf_counter()
+    while received < TRANSFER_SIZE:
+        sent += sender.tcp.send(client, data[sent:])
+        sender.flush()
+        pump()
+        received += receiver.tcp.recv_into(server, buf)
+        receiver.flush()
+        pump()
+    elapsed = time.perf_counter() - start
+    assert sender.tcp.timeouts == 0
+
+    for device in devices:
+        device.close()
+    return elapsed, client.mss, messages
+
+
+def main() -> None:
+    print(f"{'path mtu':>9} {'pmtud (MB/s)':>13} {'mss':>6} {'icmp':>5} {'576 (MB/s)':>11} {'mss':>6}")
+    for path_mtu in PATH_MTUS:
+        elapsed, mss, messages = transfer(path_mtu, 1500)
+        conservative, small_mss, _ = transfer(path_mtu, 576)
+        print(
+            f"{path_mtu:>9} {TRANSFER_SIZE / elapsed / 1e6:>13.1f} {mss:>6} {messages:>5}"
+            f" {TRANSFER_SIZE / conservative / 1e6:>11.1f} {small_mss:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Benchmarks the out of order queue under heavy reordering: every window of segments arrives
+in a random order (the holes are filled in a random order too)
+
+The SeqRanges of the out of order data is compared with a sorted list of ranges searched and
+updated linearly (the previous implementation), then a whole connection receives the reordered
+segments (the data is stored at its place in the receive buffer, the SACK blocks of the
+duplicate ACKs come from the same ranges).
+
+usage: python -m benchmarks.reordering
+"""
+import random
+import time
+from typing import Callable, List, Tuple
+
+from tcpy.constants import TCP_ACK
+from tcpy.seq import SeqRanges, seq_add, seq_le, seq_lt
+from tcpy.tcb import TCB, TCPState
+from tcpy.tcp import TCPHeader
+from tcpy.tcp_engine import TCPEngine
+
+SEG = 1448
+WINDOWS = [16, 256, 4096]
+SEGMENTS = 16384
+# close to the end of the sequence space: sequence numbers wrap around during the runs
+IRS = 0xFFFF0000
+
+A, B = 0x0A000001, 0x0A000004
+
+
+def windows(window: int, count: int) -> List[int]:
+    """returns the offsets of count segments, every window of segments is shuffled"""
+    rand = random.Random(window)
+    offsets = []
+    for start in range(0, count, window):
+        block = list(range(start, min(start + window, count)))
+        rand.shuffle(block)
+        offsets.extend(block)
+    return offsets
+
+
+def add_range(ranges: List[List[int]], start: int, end: int) -> None:
+    """adds a range to a sorted list of ranges, searched and updated linearly"""
+    idx = 0
+    while idx < len(ranges) and seq_lt(ranges[idx][1], start):
+        idx += 1
+    while idx < len(ranges) and seq_le(ranges[idx][0], end):
+        if seq_lt(ranges[idx][0], start):
+            start = ranges[idx][0]
+        if seq_lt(end, ranges[idx][1]):
+            end = ranges[idx][1]
+        del ranges[idx]
+    ranges.insert(idx, [start, end])
+
+
+def linear(offsets: List[int]) -> int:
+    ranges: List[List[int]] = []
+    rcv_nxt = IRS
+    for offset in offsets:
+        seq = seq_add(IRS, offset * SEG)
+        if seq == rcv_nxt:
+            rcv_nxt = seq_add(rcv_nxt, SEG)
+            while ranges and seq_le(ranges[0][0], rcv_nxt):
+                _, end = ranges.pop(0)
+                if seq_lt(rcv_nxt, end):
+                    rcv_nxt = end
+        else:
+            add_range(ranges, seq, seq_add(seq, SEG))
+    return rcv_nxt
+
+
+def bisect(offsets: List[int]) -> int:
+    ranges = SeqRanges(max_ranges=SEGMENTS)
+    rcv_nxt = IRS
+    for offset in offsets:
+        seq = seq_add(IRS, offset * SEG)
+        if seq == rcv_nxt:
+            rcv_nxt = ranges.pop_front(seq_add(rcv_nxt, SEG))
+        else:
+            ranges.add(seq, seq_add(seq, SEG))
+    return rcv_nxt
+
+
+def bench(queue: Callable[[List[int]], int], window: int) -> float:
+    count = min(SEGMENTS, 64 * window)
+    offsets = windows(window, count)
+    start = time.perf_counter()
+    assert queue(offsets) == seq_add(IRS, count * SEG)
+    return (time.perf_counter() - start) / count
+
+
+def connection(window: int) -> Tuple[float, int, int]:
+    """delivers reordered segments to an established connection
+
+    :returns: (time per segment, maximum number of out of order ranges, maximum out of order bytes)
+
+    """
+    engine = TCPEngine(lambda saddr, daddr, seg: None)
+    tcb = TCB((A, 5000, B, 80), TCPState.ESTABLISHED, iss=1000, buffer_size=window * SEG)
+    tcb.snd_una = tcb.snd_nxt
+    tcb.snd_wnd = 0xFFFF
+    tcb.rcv_nxt = tcb.rcv_acked = IRS
+    tcb.sack_ok = True
+    engine.table.insert(tcb)
+
+    payload = bytes(SEG)
+    segments = [
+        TCPHeader(
+            src_port=5000,
+            dst_port=80,
+            seq=seq_add(IRS, offset * SEG),
+            ack=tcb.snd_nxt,
+            hl=5,
+            flags=TCP_ACK,
+            win_size=0xFFFF,
+            csum=0,
+            uptr=0,
+            additional_fields=b"",
+            payload=payload,
+        )
+        for offset in windows(window, SEGMENTS)
+    ]
+    buf = memoryview(bytearray(window * SEG))
+    ranges = size = 0
+    start = time.perf_counter()
+    for idx, seg in enumerate(segments, 1):
+        engine.segment_arrives(A, B, seg)
+        if tcb.ooo is not None:
+            ranges = max(ranges, len(tcb.ooo))
+            size = max(size, tcb.ooo.size)
+        if idx % window == 0:
+            # the application reads the window once it's complete
+            engine.recv_into(tcb, buf)
+    elapsed = (time.perf_counter() - start) / SEGMENTS
+    assert tcb.rcv_nxt == seq_add(IRS, SEGMENTS * SEG) and tcb.ooo is None
+    return elapsed, ranges, size
+
+
+def main() -> None:
+    print(f"{'window':>8} {'linear (us)':>12} {'bisect (us)':>12}")
+    for window in WINDOWS:
+        print(f"{window:>8} {bench(linear, window) * 1e6:>12.2f} {bench(bisect, window) * 1e6:>12.2f}")
+
+    print(f"\n{'window':>8} {'segment (us)':>14} {'max ranges':>12} {'max ooo bytes':>14}")
+    for window in WINDOWS:
+        elapsed, ranges, size = connection(window)
+        print(f"{window:>8} {elapsed * 1e6:>14.2f} {ranges:>12} {size:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmarks the RX loop of the stack (packets per second) for several batch sizes
+
+A separate process floods the stack with ICMP echo requests (and drains the replies)
+through an in-memory device (datagram socketpair) standing in for the TAP device
+
+usage: python -m benchmarks.rx_batch
+"""
+import select
+import socket
+import threading
+import time
+from multiprocessing import Process
+
+from tcpy.arp import mac2b
+from tcpy.constants import ARP_IPV4
+from tcpy.netdev import SocketPairDevice
+from tcpy.stack import Stack
+from tcpy.tests.utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC, icmp_echo_frame
+
+BATCH_SIZES = [1, 8, 32, 128]
+FRAMES = 50000
+PAYLOAD_SIZE = 56
+
+
+def flood(sock: socket.socket, count: int) -> None:
+    """sends count ICMP echo requests and drains the replies"""
+
+    def drain() -> None:
+        while True:
+            sock.recv(65535)
+
+    threading.Thread(target=drain, daemon=True).start()
+
+    frame = icmp_echo_frame(PAYLOAD_SIZE)
+    for _ in range(count):
+        sock.send(frame)
+
+    # Let the stack handle the last frames
+    time.sleep(1)
+
+
+def run(batch_size: int) -> float:
+    """returns the number of frames handled per second"""
+    device = SocketPairDevice()
+    for sock in (device.sock, device.peer):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 22)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, mtu=1500, batch_size=batch_size, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+
+    producer = Process(target=flood, args=(device.peer, FRAMES))
+    producer.start()
+
+    handled, wakeups = 0, 0
+    with select.epoll() as poller:
+        poller.register(device.fileno(), select.EPOLLIN)
+        start = time.perf_counter()
+        while handled < FRAMES:
+            if not poller.poll(1):
+                break
+            wakeups += 1
+            handled += stack.rx_batch()
+        elapsed = time.perf_counter() - start
+
+    producer.join()
+    device.close()
+
+    print(
+        f"{batch_size:>10} {handled / elapsed:>12.0f} {handled / max(wakeups, 1):>15.1f}"
+        f" {stack.tx.syscalls_per_frame():>18.2f}"
+    )
+    return handled / elapsed
+
+
+def main() -> None:
+    print(f"{'batch size':>10} {'frames/s':>12} {'frames/wakeup':>15} {'tx syscalls/frame':>18}")
+    for batch_size in BATCH_SIZES:
+        run(batch_size)
+
+
+if __name__ == "__main__":
+    main()
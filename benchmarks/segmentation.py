@@ -0,0 +1,83 @@
+"""Benchmarks the send path of a bulk transfer: a large send is cut into MSS sized segments whose
+Ethernet, IP and TCP headers are patched copies of the header template of the connection
+(compared with building a TCPHeader, an IPHeader and an Ethernet header per segment)
+
+The frames are written to a device discarding them, the cost per segment includes the TCP
+checksum of the payload.
+
+usage: python -m benchmarks.segmentation
+"""
+import time
+from typing import List
+
+from tcpy.arp import mac2b
+from tcpy.constants import ARP_IPV4
+from tcpy.ip_util import Buffer, ip2int
+from tcpy.netdev import NetDevice
+from tcpy.stack import Stack
+from tcpy.tcb import TCB, TCPState
+from tcpy.tests.utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC
+
+SEND_SIZE = 8 * 1024 * 1024
+MTUS = [1500, 9000]
+ROUNDS = 5
+
+
+class NullDevice(NetDevice):
+
+    """A device discarding the frames sent"""
+
+    def __init__(self) -> None:
+        self.frames = 0
+
+    def fileno(self) -> int:
+        return -1
+
+    def recv_into(self, buf: memoryview) -> int:
+        raise BlockingIOError()
+
+    def send(self, segments: List[Buffer]) -> None:
+        self.frames += 1
+
+
+def send(mtu: int, templates: bool) -> float:
+    """sends SEND_SIZE bytes on an established connection
+
+    :returns: the time per segment in seconds
+
+    """
+    device = NullDevice()
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, mtu=mtu, buffer_size=SEND_SIZE, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+    if not templates:
+        stack.tcp._data_output = None
+
+    data = bytes(SEND_SIZE)
+    elapsed = 0.0
+    for port in range(ROUNDS):
+        tcb = TCB((ip2int(PEER_IP), 5000 + port, ip2int(STACK_IP), 80), TCPState.ESTABLISHED, 1000, SEND_SIZE)
+        tcb.snd_una = tcb.snd_nxt
+        tcb.snd_wnd = SEND_SIZE
+        tcb.mss = stack.tcp_mss()
+        tcb.ts_ok = True
+        tcb.cc.init(tcb.mss)
+        tcb.cc.cwnd = SEND_SIZE
+        stack.tcp.table.insert(tcb)
+
+        start = time.perf_counter()
+        stack.tcp.send(tcb, data)
+        stack.flush()
+        elapsed += time.perf_counter() - start
+        assert tcb.snd_nxt - tcb.snd_una == SEND_SIZE
+
+    return elapsed / device.frames
+
+
+def main() -> None:
+    print(f"{'mtu':>6} {'headers (us)':>14} {'templates (us)':>16}")
+    for mtu in MTUS:
+        print(f"{mtu:>6} {send(mtu, False) * 1e6:>14.2f} {send(mtu, True) * 1e6:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
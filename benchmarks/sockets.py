@@ -0,0 +1,107 @@
+"""Benchmarks a request/response workload (a client sends a request, an echo server answers it)
+over tcpy sockets (two stacks linked by in-memory devices, each one running in a thread)
+and over kernel TCP sockets on the loopback interface
+
+usage: python -m benchmarks.sockets
+"""
+import socket
+import threading
+import time
+from typing import Any, Callable, Tuple
+
+from tcpy.netdev import SocketDevice
+from tcpy.socket import Socket
+from tcpy.stack import Stack
+from tcpy.tests.utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC
+
+REQUESTS = 2000
+PORT = 8080
+
+
+def echo(conn: Any, size: int) -> None:
+    while True:
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                conn.close()
+                return
+            data += chunk
+        conn.sendall(data)
+
+
+def run(client: Any, size: int) -> float:
+    request = bytes(size)
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.sendall(request)
+        received = 0
+        while received < size:
+            received += len(client.recv(size - received))
+    return (time.perf_counter() - start) / REQUESTS
+
+
+def bench_tcpy(size: int) -> float:
+    dev_a, dev_b = SocketDevice.pair()
+    client_stack = Stack(ip=PEER_IP, mac=PEER_MAC, device=dev_a)
+    server_stack = Stack(ip=STACK_IP, mac=STACK_MAC, device=dev_b)
+    client_stack.start_thread()
+    server_stack.start_thread()
+
+    server = Socket(server_stack)
+    server.bind(("", PORT))
+    server.listen()
+
+    def serve() -> None:
+        echo(server.accept()[0], size)
+
+    latency = bench(serve, lambda: Socket(client_stack), (STACK_IP, PORT), size)
+
+    server.close()
+    client_stack.stop()
+    server_stack.stop()
+    dev_a.close()
+    dev_b.close()
+    return latency
+
+
+def bench_kernel(size: int) -> float:
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    def serve() -> None:
+        conn = server.accept()[0]
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        echo(conn, size)
+
+    def client() -> socket.socket:
+        sock = socket.socket()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    latency = bench(serve, client, server.getsockname(), size)
+    server.close()
+    return latency
+
+
+def bench(serve: Callable[[], None], new_client: Callable[[], Any], address: Tuple[str, int], size: int) -> float:
+    thread = threading.Thread(target=serve)
+    thread.start()
+
+    client = new_client()
+    client.connect(address)
+    latency = run(client, size)
+    client.close()
+    thread.join()
+    return latency
+
+
+def main() -> None:
+    print(f"{'request size':>12} {'tcpy (us)':>10} {'kernel (us)':>12}")
+    for size in (64, 1024, 16384):
+        print(f"{size:>12} {bench_tcpy(size) * 1e6:>10.1f} {bench_kernel(size) * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Benchmarks a listener under a SYN flood: spoofed SYNs (their SYN-ACKs are never answered) are
+interleaved with the handshakes of a legitimate client, the frames go through an in-process device
+
+The listener keeps a TCB per SYN (unbounded half-open backlog), drops the SYNs beyond its half-open
+backlog, or answers them with SYN cookies. The flood is faster than the timeout of the half-open
+connections (the clock doesn't move), the legitimate handshakes completed, the TCBs and the memory
+allocated during the run (tracemalloc peak) are reported.
+
+usage: python -m benchmarks.syn_flood
+"""
+import time
+import tracemalloc
+from typing import Tuple
+
+from tcpy.arp import mac2b
+from tcpy.constants import ARP_IPV4, ETH_P_IP, IP_TCP, TCP_SYN
+from tcpy.eth import ETH_HEADER_SIZE, EthernetHeader
+from tcpy.ip import IPHeader
+from tcpy.ip_util import ip2int
+from tcpy.netdev import CallableDevice
+from tcpy.stack import Stack
+from tcpy.tcb import DEFAULT_SYN_BACKLOG, TCPState
+from tcpy.tcp import TCPHeader
+from tcpy.tcp_engine import TCPEngine
+from tcpy.tests.utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC, ip_frame
+
+HANDSHAKES = 100
+# spoofed SYNs per legitimate handshake
+FLOODS = [10, 50]
+MODES = ["unbounded", "drop", "cookies"]
+# source ports of the legitimate client (the spoofed SYNs use the ports below)
+CLIENT_PORT = 60000
+
+A = ip2int(PEER_IP)
+B = ip2int(STACK_IP)
+
+
+def spoofed_syn(port: int) -> bytes:
+    """builds a SYN from the given port"""
+    seg = TCPHeader(
+        src_port=port,
+        dst_port=80,
+        seq=port * 7919,
+        ack=0,
+        hl=5,
+        flags=TCP_SYN,
+        win_size=0xFFFF,
+        csum=0,
+        uptr=0,
+        additional_fields=b"",
+        payload=b"",
+    )
+    seg.adjust_checksum(IPHeader.build(A, B, IP_TCP, seg._length(), 0))
+    return ip_frame(IP_TCP, seg.encode())
+
+
+def run(mode: str, flood: int) -> Tuple[float, int, int, float]:
+    """floods a listener
+
+    :returns: (ratio of the legitimate handshakes completed, TCBs of the listener, peak memory in bytes,
+    time per SYN in seconds)
+
+    """
+    client: TCPEngine
+
+    def to_client(frame: bytes) -> None:
+        ip_hdr = IPHeader.decode(frame[ETH_HEADER_SIZE:])
+        seg = TCPHeader.decode(ip_hdr.payload)
+        # nobody answers the SYN-ACKs of the spoofed SYNs
+        if seg.dst_port >= CLIENT_PORT:
+            client.segment_arrives(ip_hdr.saddr, ip_hdr.daddr, seg)
+
+    device = CallableDevice(to_client)
+
+    def to_stack(saddr: int, daddr: int, seg: TCPHeader) -> None:
+        ip_hdr = IPHeader.build(saddr, daddr, IP_TCP, seg._length(), 0)
+        seg.adjust_checksum(ip_hdr)
+        eth = EthernetHeader.spec.pack(mac2b(STACK_MAC), mac2b(PEER_MAC), ETH_P_IP)
+        device.inject(eth + ip_hdr.encode() + seg.encode())
+
+    client = TCPEngine(to_stack)
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, mtu=1500, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+    stack.tcp.syn_cookies = mode == "cookies"
+    listener = stack.listen(80, syn_backlog=1 << 30 if mode == "unbounded" else DEFAULT_SYN_BACKLOG)
+    frames = [spoofed_syn(port) for port in range(1024, 1024 + HANDSHAKES * flood)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    connections = []
+    for idx in range(HANDSHAKES):
+        for frame in frames[idx * flood : (idx + 1) * flood]:
+            device.inject(frame)
+        connections.append(client.connect(A, CLIENT_PORT + idx, B, 80))
+        while stack.rx_batch():
+            pass
+        # the application accepts the established connections
+        while stack.tcp.accept(listener) is not None:
+            pass
+    elapsed = (time.perf_counter() - start) / (HANDSHAKES * (flood + 1))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    device.close()
+
+    completed = sum(1 for tcb in connections if tcb.state == TCPState.ESTABLISHED)
+    return completed / HANDSHAKES, len(stack.tcp.table), peak, elapsed
+
+
+def main() -> None:
+    print(f"{'flood':>6} {'mode':>10} {'completed':>10} {'TCBs':>7} {'peak memory (KB)':>17} {'SYN (us)':>9}")
+    for flood in FLOODS:
+        for mode in MODES:
+            completed, tcbs, peak, elapsed = run(mode, flood)
+            print(f"{flood:>6} {mode:>10} {completed:>10.0%} {tcbs:>7} {peak / 1024:>17.0f} {elapsed * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
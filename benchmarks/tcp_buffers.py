@@ -0,0 +1,115 @@
+"""Benchmarks a bulk transfer between two engines connected back to back (the send and receive
+buffers are ring buffers: the payload is copied once into each of them) and the memory
+used by idle connections (never used, or idle after carrying data: the storage of the empty buffers
+is freed)
+
+usage: python -m benchmarks.tcp_buffers
+"""
+import time
+import tracemalloc
+from collections import deque
+from typing import Callable, Deque, Dict, Tuple
+
+from tcpy.tcb import DEFAULT_BUFFER_SIZE
+from tcpy.tcp import TCPHeader
+from tcpy.tcp_engine import DELAYED_ACK_TIMEOUT, TCPEngine
+
+TRANSFER = 32 * 1024 * 1024
+CHUNK = 16 * 1024
+IDLE_CONNECTIONS = 10000
+USED_CONNECTIONS = 1000
+
+A, B = 0x0A000001, 0x0A000004
+
+
+def link(buffer_size: int = DEFAULT_BUFFER_SIZE) -> Tuple[TCPEngine, TCPEngine, Callable[[], None]]:
+    """returns two engines connected back to back and the function delivering the segments sent"""
+    wire: Deque[Tuple[int, int, TCPHeader]] = deque()
+    engines: Dict[int, TCPEngine] = {}
+
+    def output(saddr: int, daddr: int, seg: TCPHeader) -> None:
+        wire.append((saddr, daddr, seg))
+
+    def run() -> None:
+        while wire:
+            saddr, daddr, seg = wire.popleft()
+            engines[daddr].segment_arrives(saddr, daddr, seg)
+
+    client, server = TCPEngine(output, buffer_size=buffer_size), TCPEngine(output, buffer_size=buffer_size)
+    engines.update({A: client, B: server})
+    return client, server, run
+
+
+def transfer(buffer_size: int) -> float:
+    client, server, run = link(buffer_size)
+    listener = server.listen(B, 80)
+    tcb = client.connect(A, 5000, B, 80)
+    run()
+    peer = server.accept(listener)
+    assert peer is not None
+
+    chunk = bytes(CHUNK)
+    buf = memoryview(bytearray(buffer_size))
+    sent = received = 0
+    start = time.perf_counter()
+    while received < TRANSFER:
+        if sent < TRANSFER:
+            sent += client.send(tcb, chunk[: TRANSFER - sent])
+        run()
+        received += server.recv_into(peer, buf)
+        run()
+    return TRANSFER / (time.perf_counter() - start)
+
+
+def idle_memory() -> float:
+    engine = TCPEngine(lambda saddr, daddr, seg: None)
+    engine.listen(B, 80)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for port in range(IDLE_CONNECTIONS):
+        engine.connect(B, 10000 + port, A, 80)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / IDLE_CONNECTIONS
+
+
+def used_memory() -> float:
+    """returns the memory per connection of connections idle after exchanging data (both ends)"""
+    client, server, run = link()
+    listener = server.listen(B, 80)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for port in range(USED_CONNECTIONS):
+        tcb = client.connect(A, 10000 + port, B, 80)
+        run()
+        peer = server.accept(listener)
+        assert peer is not None
+        client.send(tcb, bytes(CHUNK))
+        run()
+        server.recv(peer, CHUNK)
+        server.send(peer, bytes(CHUNK))
+        run()
+        client.recv(tcb, CHUNK)
+        run()
+    # the last data is acknowledged once the delayed ACKs are sent
+    time.sleep(DELAYED_ACK_TIMEOUT)
+    client.timers.advance()
+    run()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / (2 * USED_CONNECTIONS)
+
+
+def main() -> None:
+    print(f"{'buffer size':>12} {'MB/s':>10}")
+    for buffer_size in (16 * 1024, DEFAULT_BUFFER_SIZE, 256 * 1024, 4 * 1024 * 1024):
+        print(f"{buffer_size:>12} {transfer(buffer_size) / 1e6:>10.1f}")
+
+    print(f"\nmemory per idle connection: {idle_memory():.0f} bytes")
+    print(f"memory per idle connection after a transfer: {used_memory():.0f} bytes")
+
+
+if __name__ == "__main__":
+    main()
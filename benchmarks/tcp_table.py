@@ -0,0 +1,86 @@
+"""Benchmarks the connection lookup and the processing of a segment (a pure ACK) on an
+established connection as the connection table grows
+
+usage: python -m benchmarks.tcp_table
+"""
+import random
+import time
+import tracemalloc
+from typing import List
+
+from tcpy.constants import TCP_ACK
+from tcpy.tcb import TCB, ConnKey, TCPState
+from tcpy.tcp import TCPHeader
+from tcpy.tcp_engine import TCPEngine
+
+SIZES = [1000, 10000, 100000]
+LOOKUPS = 200000
+SEGMENTS = 50000
+
+LADDR = 0x0A000004
+LPORT = 80
+
+
+def populate(engine: TCPEngine, count: int) -> List[ConnKey]:
+    """inserts count established connections (from 10.1.x.x:port)"""
+    keys = []
+    for idx in range(count):
+        key = (0x0A010000 + idx // 50000, 10000 + idx % 50000, LADDR, LPORT)
+        tcb = TCB(key, TCPState.ESTABLISHED, iss=1000)
+        tcb.snd_una = tcb.snd_nxt
+        tcb.rcv_nxt = 5000
+        tcb.snd_wnd = 0xFFFF
+        engine.table.insert(tcb)
+        keys.append(key)
+
+    return keys
+
+
+def ack(key: ConnKey) -> TCPHeader:
+    return TCPHeader(
+        src_port=key[1],
+        dst_port=key[3],
+        seq=5000,
+        ack=1001,
+        hl=5,
+        flags=TCP_ACK,
+        win_size=0xFFFF,
+        csum=0,
+        uptr=0,
+        additional_fields=b"",
+        payload=b"",
+    )
+
+
+def run(count: int) -> None:
+    engine = TCPEngine(lambda saddr, daddr, seg: None)
+
+    tracemalloc.start()
+    keys = populate(engine, count)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sample = [random.choice(keys) for _ in range(LOOKUPS)]
+    get = engine.table.get
+    start = time.perf_counter()
+    for key in sample:
+        get(key)
+    lookup = (time.perf_counter() - start) / LOOKUPS
+
+    segments = [(key[0], key[2], ack(key)) for key in sample[:SEGMENTS]]
+    start = time.perf_counter()
+    for saddr, daddr, seg in segments:
+        engine.segment_arrives(saddr, daddr, seg)
+    segment = (time.perf_counter() - start) / SEGMENTS
+
+    print(f"{count:>12} {lookup * 1e9:>12.0f} {segment * 1e6:>14.2f} {memory / count:>14.0f}")
+
+
+def main() -> None:
+    print(f"{'connections':>12} {'lookup (ns)':>12} {'segment (us)':>14} {'bytes/conn':>14}")
+    for count in SIZES:
+        run(count)
+
+
+if __name__ == "__main__":
+    main()
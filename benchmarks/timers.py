@@ -0,0 +1,126 @@
+"""Benchmarks the timer churn of many connections: every connection has a retransmission timer
+that is re-armed on each ACK and cancelled once its data is acknowledged (most timers never
+expire), the clock moves forward between the rounds and the expired timers are run
+
+The timer wheel (O(1) arm, cancel and re-arm) is compared with a binary heap where cancelled
+timers are left in the heap until they reach its top (lazy deletion, the usual way to cancel
+with heapq)
+
+usage: python -m benchmarks.timers
+"""
+import heapq
+import random
+import time
+from typing import Any, List, Optional, Tuple
+
+from tcpy.timer_wheel import Timer, TimerWheel
+
+CONNECTIONS = (10_000, 100_000)
+ROUNDS = 100
+# fraction of the connections getting an ACK per round, and of those whose data is all acknowledged
+ACTIVE = 0.5
+IDLE = 0.3
+RTO = 0.2
+STEP = 0.01
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class HeapTimer:
+    __slots__ = ("callback", "arg", "deadline", "entry")
+
+    def __init__(self, callback: Any, arg: Any = None):
+        self.callback = callback
+        self.arg = arg
+        self.deadline = 0.0
+        self.entry: Optional[List[Any]] = None
+
+
+class HeapTimers:
+
+    """Timers in a binary heap, a cancelled entry is only marked as such"""
+
+    def __init__(self, clock: Clock):
+        self._clock = clock
+        self._heap: List[List[Any]] = []
+        self._count = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, timer: HeapTimer, delay: float) -> None:
+        self.cancel(timer)
+        self._count += 1
+        timer.entry = [self._clock() + delay, self._count, timer]
+        heapq.heappush(self._heap, timer.entry)
+
+    def cancel(self, timer: HeapTimer) -> None:
+        if timer.entry is not None:
+            timer.entry[2] = None
+            timer.entry = None
+
+    def advance(self) -> int:
+        count, now = 0, self._clock()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, timer = heapq.heappop(self._heap)
+            if timer is not None:
+                timer.entry = None
+                timer.callback(timer.arg)
+                count += 1
+        return count
+
+
+def churn(timers: Any, clock: Clock, handles: List[Any], seed: int = 42) -> Tuple[float, int, int]:
+    """runs the rounds of ACKs
+
+    :returns: (operations per second, expired timers, entries in the structure at the end)
+
+    """
+    rng = random.Random(seed)
+    rounds = [
+        [(handle, rng.random() < IDLE) for handle in rng.sample(handles, int(len(handles) * ACTIVE))]
+        for _ in range(ROUNDS)
+    ]
+    for handle in handles:
+        timers.schedule(handle, RTO)
+
+    ops = expired = 0
+    start = time.perf_counter()
+    for acks in rounds:
+        for handle, idle in acks:
+            # new data acknowledged: the timer restarts, or stops if nothing is in flight anymore
+            if idle:
+                timers.cancel(handle)
+            else:
+                timers.schedule(handle, RTO)
+        ops += len(acks)
+        clock.now += STEP
+        expired += timers.advance()
+    elapsed = time.perf_counter() - start
+    return ops / elapsed, expired, len(timers)
+
+
+def main() -> None:
+    print(f"{'connections':>12} {'timers':>8} {'ops/s':>12} {'expired':>9} {'entries':>9}")
+    for connections in CONNECTIONS:
+        clock = Clock()
+        wheel = TimerWheel(clock)
+        wheel_timers = [Timer(lambda _: None) for _ in range(connections)]
+        ops, expired, entries = churn(wheel, clock, wheel_timers)
+        print(f"{connections:>12} {'wheel':>8} {ops:>12,.0f} {expired:>9} {entries:>9}")
+
+        clock = Clock()
+        heap = HeapTimers(clock)
+        heap_timers = [HeapTimer(lambda _: None) for _ in range(connections)]
+        ops, expired, entries = churn(heap, clock, heap_timers)
+        print(f"{connections:>12} {'heap':>8} {ops:>12,.0f} {expired:>9} {entries:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmarks the multi queue stack: frames handled per second with 1, 2 and 4 workers
+
+Every worker gets its own in-memory device (datagram socketpair) standing in for a queue of the TAP device,
+one producer process per queue floods it with ICMP echo requests (and drains the replies)
+for a fixed duration, the per worker counters are then read
+
+usage: python -m benchmarks.workers
+"""
+import os
+import socket
+import threading
+import time
+from multiprocessing import Process
+from typing import List
+
+from tcpy.arp import mac2b
+from tcpy.constants import ARP_IPV4
+from tcpy.netdev import SocketPairDevice
+from tcpy.stack import Stack
+from tcpy.tests.utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC, icmp_echo_frame
+
+WORKERS = [1, 2, 4]
+DURATION = 2.0
+PAYLOAD_SIZE = 56
+
+
+def flood(sock: socket.socket, duration: float) -> None:
+    """sends ICMP echo requests for duration seconds and drains the replies"""
+
+    def drain() -> None:
+        while True:
+            sock.recv(65535)
+
+    threading.Thread(target=drain, daemon=True).start()
+
+    frame = icmp_echo_frame(PAYLOAD_SIZE)
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        sock.send(frame)
+
+
+def run(workers: int) -> List[int]:
+    """returns the number of frames handled by each worker"""
+    devices = [SocketPairDevice() for _ in range(workers)]
+
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, mtu=1500, queues=workers)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+    stack.start_workers(list(devices))
+    for device in devices:
+        device.sock.close()
+
+    producers = [Process(target=flood, args=(device.peer, DURATION)) for device in devices]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+
+    counters = stack.worker_counters()
+    stack.stop()
+    for device in devices:
+        device.close()
+
+    print(f"{workers:>8} {sum(counters) / DURATION:>12.0f}   {' '.join(str(c) for c in counters)}")
+    return counters
+
+
+def main() -> None:
+    print(f"cpus: {os.cpu_count()}")
+    print(f"{'workers':>8} {'frames/s':>12}   frames per worker")
+    for workers in WORKERS:
+        run(workers)
+
+
+if __name__ == "__main__":
+    main()
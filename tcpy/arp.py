@@ -1,9 +1,10 @@
 import array
 import socket
-import struct
 from typing import Callable
 
 from .constants import ARP_ETHERNET, ARP_IPV4, ARP_REPLY, ARP_REQUEST
+from .header import Field, HeaderSpec, check_size
+from .ip_util import Buffer
 
 
 def _check_opcode_fn(opcode: int) -> Callable[["ARPHeader"], bool]:
@@ -17,7 +18,21 @@ class ARPHeader:
 
     """ARPHeader representation"""
 
-    fmt = "HHBBH"
+    # uint16_t hwtype;
+    # uint16_t protype;
+    # unsigned char hwsize;
+    # unsigned char prosize;
+    # uint16_t opcode;
+    # unsigned char data[];
+    spec = HeaderSpec(
+        Field("hwtype", "H"),
+        Field("protype", "H"),
+        Field("_hwsize", "B"),
+        Field("_prosize", "B"),
+        Field("opcode", "H"),
+    )
+
+    __slots__ = ("hwtype", "protype", "_hwsize", "_prosize", "opcode", "_data")
 
     # TODO enum for opcode
     def __init__(
@@ -27,7 +42,7 @@ class ARPHeader:
         hwsize: int,
         prosize: int,
         opcode: int,
-        data: bytes,
+        data: Buffer,
     ):
         """Creates a new ARPHeader
 
@@ -71,7 +86,7 @@ class ARPHeader:
 
         return ARPIPv4.decode(self._data)
 
-    def replace_data(self, data: bytes) -> None:
+    def replace_data(self, data: Buffer) -> None:
         """replaces the payload contained in the ARP message
 
         :data: raw bytes representing the new data
@@ -85,58 +100,37 @@ class ARPHeader:
         :returns: raw bytes
 
         """
-
-        # uint16_t hwtype;
-        # uint16_t protype;
-        # unsigned char hwsize;
-        # unsigned char prosize;
-        # uint16_t opcode;
-        # unsigned char data[];
-        raw = struct.pack(
-            ARPHeader.fmt,
-            socket.htons(self.hwtype),
-            socket.htons(self.protype),
-            self._hwsize,
-            self._prosize,
-            socket.htons(self.opcode),
-        )
-
-        return raw + self._data
+        return ARPHeader.spec.encode(self) + self._data
 
     @classmethod
-    def decode(cls, raw: bytes) -> "ARPHeader":
+    def decode(cls, raw: Buffer) -> "ARPHeader":
         """decodes the given raw bytes into an ARP Header
+        the data is a memoryview over raw (it isn't copied)
 
-        :raw: a list of bytes to decode
+        :raw: a list of bytes to decode (bytes, bytearray or memoryview)
         :returns: an instance of ARPHeader
 
         """
-        # uint16_t hwtype;
-        # uint16_t protype;
-        # unsigned char hwsize;
-        # unsigned char prosize;
-        # uint16_t opcode;
-        # unsigned char data[];
-        arp_hdr = struct.unpack(cls.fmt, raw[:8])
-        hwtype = socket.htons(arp_hdr[0])
-        protype = socket.htons(arp_hdr[1])
-        hwsize = arp_hdr[2]
-        prosize = arp_hdr[3]
-        opcode = socket.htons(arp_hdr[4])
-        return ARPHeader(
-            hwtype=hwtype,
-            protype=protype,
-            hwsize=hwsize,
-            prosize=prosize,
-            opcode=opcode,
-            data=raw[8:],
-        )
+        check_size(raw, ARPHeader.spec.size, "ARPHeader")
+        raw = memoryview(raw)
+        arp = ARPHeader.__new__(ARPHeader)
+        ARPHeader.spec.decode_into(arp, raw)
+        arp._data = raw[ARPHeader.spec.size :]
+        return arp
 
 
 class ARPIPv4:
 
     """ARPIPv4 data"""
 
+    # unsigned char smac[6];
+    # uint32_t sip;
+    # unsigned char dmac[6];
+    # uint32_t dip;
+    spec = HeaderSpec(Field("smac", "6s"), Field("sip", "4s"), Field("dmac", "6s"), Field("dip", "4s"))
+
+    __slots__ = ("smac", "sip", "dmac", "dip")
+
     def __init__(self, smac: bytes, sip: str, dmac: bytes, dip: str):
         """creates a new ARPIPv4 instance
 
@@ -158,39 +152,23 @@ class ARPIPv4:
         :returns: raw bytes representing a struct arp_ipv4
 
         """
-
-        # unsigned char smac[6];
-        # uint32_t sip;
-        # unsigned char dmac[6];
-        # uint32_t dip;
-
-        # TODO Improve this
-        return (
-            self.smac
-            + socket.inet_aton(self.sip)
-            + self.dmac
-            + socket.inet_aton(self.dip)
+        return ARPIPv4.spec.pack(
+            self.smac, socket.inet_aton(self.sip), self.dmac, socket.inet_aton(self.dip)
         )
 
     @classmethod
-    def decode(cls, raw: bytes) -> "ARPIPv4":
+    def decode(cls, raw: Buffer) -> "ARPIPv4":
         """decodes ARPIPv4 data from raw bytes of a struct arp_ipv4
 
-        :raw: A list of bytes
+        :raw: A list of bytes (bytes, bytearray or memoryview)
         :returns: an ARPIPv4 instance
 
         """
-
-        # unsigned char smac[6];
-        # uint32_t sip;
-        # unsigned char dmac[6];
-        # uint32_t dip;
-
-        smac = raw[:6]
-        dmac = raw[10:16]
-        sip = socket.inet_ntoa(raw[6:10])
-        dip = socket.inet_ntoa(raw[16:20])
-        return ARPIPv4(smac=smac, sip=sip, dmac=dmac, dip=dip)
+        check_size(raw, ARPIPv4.spec.size, "ARPIPv4")
+        (smac, sip, dmac, dip) = ARPIPv4.spec.unpack_from(raw)
+        return ARPIPv4(
+            smac=smac, sip=socket.inet_ntoa(sip), dmac=dmac, dip=socket.inet_ntoa(dip)
+        )
 
     def __repr__(self) -> str:
         return "Source: ({}, {}), Dest: ({}, {})".format(
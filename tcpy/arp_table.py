@@ -1,11 +1,17 @@
 import array
-from typing import Dict, Optional, Tuple
+import ctypes
+from multiprocessing import Queue
+from queue import Empty
+from typing import Dict, List, Optional, Tuple
 
-from .arp import ARPHeader, ARPIPv4
-from .constants import ARP_IPV4, ARP_REPLY, ETH_P_ARP
+from .arp import ARPHeader, ARPIPv4, mac2b
+from .constants import ARP_ETHERNET, ARP_IPV4, ARP_REPLY, ARP_REQUEST, ETH_P_ARP
 from .eth import EthernetHeader
 from .ip_util import int2ip
 
+# maximum time in seconds a replica waits for an entry published by another worker that isn't in its queue yet
+SYNC_TIMEOUT = 0.01
+
 
 class ARPTable:
 
@@ -18,9 +24,11 @@ class ARPTable:
         :ip: test ip string (str)
         :mac: test mac address (str)
         """
-        self._h: Dict[Tuple[int, str], str] = {}
+        self._h: Dict[Tuple[int, str], bytes] = {}
         self._ip = ip
         self._mac = mac
+        # incremented when an entry is added or changed (see version)
+        self._version = 0
 
     def process_arp(self, eth: EthernetHeader) -> Optional[EthernetHeader]:
         """processes the given ethernet packet (throws an exception if it's not an arp packet)
@@ -31,7 +39,7 @@ class ARPTable:
 
         arp = ARPHeader.decode(eth.payload)
         if not arp.is_supported():
-            print("Unsupported layer type")
+            raise ValueError(f"Unsupported ARP hardware / protocol type: {arp.hwtype} / {arp.protype}")
 
         ipv4 = arp.ipv4_data()
 
@@ -67,40 +75,200 @@ class ARPTable:
             dmac=data.dmac, smac=data.smac, typ=ETH_P_ARP, payload=arp.encode()
         )
 
-    def update(self, protype: int, pro_addr: str, mac: str) -> bool:
+    def request(self, ip: int) -> EthernetHeader:
+        """builds an ARP request (broadcasted) to resolve the given IP address
+
+        :ip: the IP address to resolve in int format
+        :return: An EthernetHeader containing the request
+
+        """
+        data = ARPIPv4(smac=mac2b(self._mac), sip=self._ip, dmac=bytes(6), dip=int2ip(ip))
+        arp = ARPHeader(
+            hwtype=ARP_ETHERNET, protype=ARP_IPV4, hwsize=6, prosize=4, opcode=ARP_REQUEST, data=data.encode()
+        )
+        return EthernetHeader(
+            dmac=b"\xff" * 6, smac=data.smac, typ=ETH_P_ARP, payload=arp.encode()
+        )
+
+    def update(self, protype: int, pro_addr: str, mac: bytes) -> bool:
         """updates the given entry only if it already exists
         it also returns a boolean indicating if yes or no the
         entry was updated
 
         :protype: the protocol type (int)
         :pro_addr: the protocol address (str)
-        :mac: the mac address (str)
+        :mac: the mac address (bytes)
         :returns: a boolean indicating if the entry was updated
 
         """
 
         key = (protype, pro_addr)
         if key in self._h:
-            self._h[key] = mac
+            if self._h[key] != mac:
+                self._h[key] = mac
+                self._version += 1
             return True
 
         return False
 
-    def insert(self, protype: int, pro_addr: str, mac: str) -> None:
+    def insert(self, protype: int, pro_addr: str, mac: bytes) -> None:
         """inserts the given entry in the table
 
         :protype: the protocol type (int)
         :pro_addr: the protocol address (str)
-        :mac: the mac address (str)
+        :mac: the mac address (bytes)
 
         """
-        self._h[(protype, pro_addr)] = mac
+        key = (protype, pro_addr)
+        if self._h.get(key) != mac:
+            self._h[key] = mac
+            self._version += 1
 
-    def get_mac_for_ip(self, ip: int) -> Optional[str]:
+    def get_mac_for_ip(self, ip: int) -> Optional[bytes]:
         """resolves an IP address to a mac address
 
         :ip: the IP address to resolve to a mac address in int format
-        :returns: a mac address in string format or None if not found
+        :returns: a mac address in bytes or None if not found
 
         """
         return self._h.get((ARP_IPV4, int2ip(ip)), None)
+
+    def version(self) -> int:
+        """returns the version of the table, it changes when an entry is added or changed (values
+        derived from the entries, like the headers of the connections, can be cached until it changes)
+
+        :returns: the version
+
+        """
+        return self._version
+
+    def snapshot(self) -> Dict[Tuple[int, str], bytes]:
+        """returns a copy of the entries of the table
+
+        :returns: a dict mapping (protocol type, protocol address) to the mac address
+
+        """
+        return dict(self._h)
+
+
+class ARPReplica(ARPTable):
+
+    """The ARP table of a worker of a multi queue stack
+
+    Every worker has its own replica (no lock on the RX path), entries learned by a worker are sent
+    to the other ones (an ARP reply may be received on another queue than the one sending the IP datagrams).
+    Each worker counts the entries it published in a shared array: a lookup compares the entries published
+    by the other workers with the ones already applied and only reads the queue when they differ (up to the
+    published count), so a changed mac address is picked up by the next lookup
+    """
+
+    def __init__(
+        self,
+        ip: str,
+        mac: str,
+        worker: int,
+        queues: List["Queue[Tuple[int, str, bytes]]"],
+        versions: "ctypes.Array[ctypes.c_uint64]",
+    ):
+        """Creates a new ARP Replica
+
+        :ip: test ip string (str)
+        :mac: test mac address (str)
+        :worker: index of the worker owning the replica
+        :queues: one queue of learned entries per worker
+        :versions: number of entries published by each worker (shared between the workers)
+
+        """
+        super().__init__(ip, mac)
+        self._worker = worker
+        self._queues = queues
+        self._versions = versions
+        # entries published by the other workers applied to this replica
+        self._synced = 0
+
+    @classmethod
+    def from_table(
+        cls,
+        table: ARPTable,
+        worker: int,
+        queues: List["Queue[Tuple[int, str, bytes]]"],
+        versions: "ctypes.Array[ctypes.c_uint64]",
+    ) -> "ARPReplica":
+        """creates a replica starting with the entries of a table (the entries inserted before the workers
+        were started), its version differs from the one of the table (the values cached with it are rebuilt)
+
+        :table: the table
+        :worker: index of the worker owning the replica
+        :queues: one queue of learned entries per worker
+        :versions: number of entries published by each worker (shared between the workers)
+        :returns: an ARPReplica
+
+        """
+        replica = cls(table._ip, table._mac, worker, queues, versions)
+        replica._h.update(table.snapshot())
+        replica._version = table.version() + 1
+        return replica
+
+    def update(self, protype: int, pro_addr: str, mac: bytes) -> bool:
+        key = (protype, pro_addr)
+        if key in self._h and self._h[key] != mac:
+            self._publish(protype, pro_addr, mac)
+
+        return super().update(protype, pro_addr, mac)
+
+    def insert(self, protype: int, pro_addr: str, mac: bytes) -> None:
+        super().insert(protype, pro_addr, mac)
+        self._publish(protype, pro_addr, mac)
+
+    def get_mac_for_ip(self, ip: int) -> Optional[bytes]:
+        if self.stale():
+            self.sync()
+
+        return super().get_mac_for_ip(ip)
+
+    def version(self) -> int:
+        if self.stale():
+            self.sync()
+
+        return super().version()
+
+    def stale(self) -> bool:
+        """checks if the other workers published entries that were not applied yet
+
+        :returns: True if the replica has to be synced
+
+        """
+        return self._published() != self._synced
+
+    def sync(self) -> int:
+        """applies the entries published by the other workers: the queue is drained up to the published
+        count, waiting for the entries not flushed yet by the feeder thread of the queue (at most
+        SYNC_TIMEOUT seconds per entry, the lookups don't poll the queue again and again meanwhile)
+
+        :returns: the number of entries applied
+
+        """
+        published = self._published()
+        count = 0
+        while self._synced < published:
+            try:
+                protype, pro_addr, mac = self._queues[self._worker].get(timeout=SYNC_TIMEOUT)
+            except Empty:
+                break
+
+            ARPTable.insert(self, protype, pro_addr, mac)
+            self._synced += 1
+            count += 1
+        return count
+
+    def _published(self) -> int:
+        """returns the number of entries published by the other workers"""
+        return sum(self._versions) - self._versions[self._worker]
+
+    def _publish(self, protype: int, pro_addr: str, mac: bytes) -> None:
+        for idx, queue in enumerate(self._queues):
+            if idx != self._worker:
+                queue.put((protype, pro_addr, mac))
+
+        # only written by the owner of the replica, no lock needed
+        self._versions[self._worker] += 1
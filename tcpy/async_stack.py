@@ -0,0 +1,96 @@
+import asyncio
+from typing import Any, Optional
+
+from .stack import Stack
+
+
+class AsyncStack(Stack):
+
+    """A TCP/IP Stack running on an asyncio event loop
+
+    The device fd is registered with loop.add_reader: every time it's readable a batch of
+    frames is handled (see Stack.rx_batch) from the loop, timers are scheduled on the loop too.
+    It lets a single process run the stack alongside application coroutines (no thread, no IPC).
+
+    usage:
+
+        async with AsyncStack() as stack:
+            ...
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        """creates an AsyncStack, takes the same arguments as Stack"""
+        super().__init__(*args, **kwargs)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closed: Optional["asyncio.Future[None]"] = None
+        # loop timer running the TCP timers (scheduled for the next expiration of the timer wheel)
+        self._timer_handle: Optional[asyncio.TimerHandle] = None
+
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """registers the device on the event loop, the tap interface is opened if the stack doesn't have a device
+
+        :loop: the event loop to use, defaults to the running loop
+
+        """
+        if self._loop is not None:
+            raise ValueError("Network stack is already attached to an event loop")
+
+        if self.device is None:
+            self.open_interface()
+
+        self._loop = loop or asyncio.get_running_loop()
+        self._closed = self._loop.create_future()
+        self._loop.add_reader(self._device().fileno(), self._readable)
+
+    def close(self) -> None:
+        """unregisters the interface from the event loop (serve_forever returns)"""
+        if self._loop is None:
+            return
+
+        self._loop.remove_reader(self._device().fileno())
+        if self._timer_handle is not None:
+            self._timer_handle.cancel()
+            self._timer_handle = None
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+        self._loop = None
+
+    async def serve_forever(self) -> None:
+        """attaches the stack to the running loop (if it isn't attached yet) and waits until it's closed"""
+        if self._loop is None:
+            self.attach()
+
+        assert self._closed is not None
+        await self._closed
+
+    def _readable(self) -> None:
+        self.rx_batch()
+        if self.device_eof:
+            # a closed device stays readable, the loop would call the reader again and again
+            self.close()
+
+    def _schedule_timers(self) -> None:
+        if self._loop is None:
+            return
+
+        timeout = self.tcp.timers.timeout()
+        if timeout is None:
+            return
+
+        when = self._loop.time() + timeout
+        if self._timer_handle is not None:
+            if self._timer_handle.when() <= when:
+                return
+            self._timer_handle.cancel()
+        self._timer_handle = self._loop.call_at(when, self._timers_expired)
+
+    def _timers_expired(self) -> None:
+        self._timer_handle = None
+        self.run_timers()
+
+    async def __aenter__(self) -> "AsyncStack":
+        self.attach()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,44 @@
+from typing import List
+
+
+class BufferPool:
+
+    """A pool of preallocated buffers of the same size (used to receive frames without allocating)"""
+
+    def __init__(self, count: int, size: int):
+        """creates a new BufferPool
+
+        :count: number of buffers preallocated (and kept) by the pool
+        :size: size of every buffer in bytes
+
+        """
+        self.size = size
+        self._count = count
+        self._free: List[memoryview] = [memoryview(bytearray(size)) for _ in range(count)]
+        # number of buffers allocated because the pool was empty
+        self.misses = 0
+
+    def acquire(self) -> memoryview:
+        """takes a buffer from the pool, a new one is allocated if the pool is empty
+        the buffer has to be given back with release once it's not used anymore
+
+        :returns: a writable memoryview over the whole buffer
+
+        """
+        if self._free:
+            return self._free.pop()
+
+        self.misses += 1
+        return memoryview(bytearray(self.size))
+
+    def release(self, buf: memoryview) -> None:
+        """gives a buffer back to the pool, views over it must not be used anymore
+
+        :buf: a buffer returned by acquire
+
+        """
+        if len(self._free) < self._count:
+            self._free.append(buf)
+
+    def __len__(self) -> int:
+        return len(self._free)
@@ -0,0 +1,220 @@
+from typing import Dict, Optional, Type
+
+from .constants import DEFAULT_MSS
+
+# ssthresh before the first loss (slow start until then)
+INFINITE_SSTHRESH = 1 << 62
+
+
+def initial_window(mss: int) -> int:
+    """returns the initial congestion window (RFC 6928)
+
+    :mss: the maximum segment size
+    :returns: a window in bytes
+
+    """
+    return min(10 * mss, max(2 * mss, 14600))
+
+
+class CongestionControl:
+
+    """Congestion control of a connection: the engine calls the hooks and limits the data in
+    flight to cwnd (and to the window of the peer)
+
+    - on_ack: new data was acknowledged (outside of a fast recovery)
+    - on_loss: 3 duplicate ACKs, the engine retransmits the first segment and starts a fast recovery
+    - on_dup_ack: a duplicate ACK during a fast recovery (a segment left the network)
+    - on_partial_ack: an ACK acknowledging part of the data sent before the loss, only if
+    partial_ack_recovery is True (the recovery goes on, the engine retransmits the next segment)
+    - on_recovery_end: the fast recovery is over
+    - on_timeout: the retransmission timer expired
+    - on_rtt_sample: a round trip time was measured
+
+    The hooks of the base class implement Reno (RFC 5681).
+    """
+
+    name = ""
+    # NewReno (RFC 6582): the recovery lasts until the data sent before the loss is acknowledged
+    partial_ack_recovery = False
+
+    def __init__(self) -> None:
+        """creates a new CongestionControl"""
+        self.mss = DEFAULT_MSS
+        self.cwnd = initial_window(self.mss)
+        self.ssthresh = INFINITE_SSTHRESH
+
+    def init(self, mss: int) -> None:
+        """sets the maximum segment size (once it's negotiated) and the initial window
+
+        :mss: the maximum segment size of the connection
+
+        """
+        self.mss = mss
+        self.cwnd = initial_window(mss)
+
+    def on_ack(self, acked: int, now: float) -> None:
+        """new data was acknowledged
+
+        :acked: number of bytes acknowledged
+        :now: current time in seconds
+
+        """
+        if self.cwnd < self.ssthresh:
+            # slow start (with appropriate byte counting, RFC 3465 with L = 2)
+            self.cwnd += min(acked, 2 * self.mss)
+        else:
+            # congestion avoidance: one segment per round trip
+            self.cwnd += max(1, self.mss * self.mss // self.cwnd)
+
+    def on_loss(self, in_flight: int, now: float) -> None:
+        """a loss was detected with duplicate ACKs
+
+        :in_flight: number of bytes in flight
+        :now: current time in seconds
+
+        """
+        self.ssthresh = max(in_flight // 2, 2 * self.mss)
+        # the 3 duplicate ACKs are 3 segments that left the network
+        self.cwnd = self.ssthresh + 3 * self.mss
+
+    def on_dup_ack(self) -> None:
+        """a duplicate ACK arrived during a fast recovery"""
+        self.cwnd += self.mss
+
+    def on_partial_ack(self, acked: int) -> None:
+        """an ACK acknowledged part of the data sent before the loss
+
+        :acked: number of bytes acknowledged
+
+        """
+
+    def on_recovery_end(self) -> None:
+        """the fast recovery is over"""
+        self.cwnd = self.ssthresh
+
+    def on_timeout(self, in_flight: int, now: float) -> None:
+        """the retransmission timer expired
+
+        :in_flight: number of bytes in flight
+        :now: current time in seconds
+
+        """
+        self.ssthresh = max(in_flight // 2, 2 * self.mss)
+        self.cwnd = self.mss
+
+    def on_rtt_sample(self, rtt: float, now: float) -> None:
+        """a round trip time was measured
+
+        :rtt: the round trip time in seconds
+        :now: current time in seconds
+
+        """
+
+
+class Reno(CongestionControl):
+
+    """Reno (RFC 5681): slow start, congestion avoidance, fast retransmit and fast recovery"""
+
+    name = "reno"
+
+
+class NewReno(Reno):
+
+    """NewReno (RFC 6582): a fast recovery repairs several losses of the same window"""
+
+    name = "newreno"
+    partial_ack_recovery = True
+
+    def on_partial_ack(self, acked: int) -> None:
+        # deflate the window by the acknowledged data, the retransmitted segment is added back
+        self.cwnd = max(self.cwnd - acked + self.mss, self.mss)
+
+
+class Cubic(NewReno):
+
+    """CUBIC (RFC 8312): the window grows as a cubic function of the time since the last loss
+    (independent of the round trip time), with the NewReno fast recovery"""
+
+    name = "cubic"
+
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self) -> None:
+        """creates a new Cubic"""
+        super().__init__()
+        # window before the last reduction, in segments
+        self.w_max = 0.0
+        # time at which the window reaches w_max again (from the start of the epoch)
+        self.k = 0.0
+        # start of the current congestion avoidance epoch
+        self.epoch: Optional[float] = None
+        # window of a Reno flow (in segments) used in the TCP friendly region
+        self.w_est = 0.0
+        self.min_rtt = 0.0
+
+    def on_ack(self, acked: int, now: float) -> None:
+        if self.cwnd < self.ssthresh:
+            self.cwnd += min(acked, 2 * self.mss)
+            return
+
+        cwnd = self.cwnd / self.mss
+        if self.epoch is None:
+            self.epoch = now
+            self.w_est = cwnd
+            if cwnd < self.w_max:
+                self.k = ((self.w_max - cwnd) / self.C) ** (1 / 3)
+            else:
+                self.k = 0.0
+                self.w_max = cwnd
+
+        t = now - self.epoch + self.min_rtt
+        target = self.C * (t - self.k) ** 3 + self.w_max
+        segments = acked / self.mss
+        self.w_est += 3 * (1 - self.BETA) / (1 + self.BETA) * segments / cwnd
+        target = max(target, self.w_est)
+
+        if target > cwnd:
+            # at most 1.5 times the window per round trip
+            growth = min(target - cwnd, cwnd / 2) * segments / cwnd
+        else:
+            growth = 0.01 * segments / cwnd
+        self.cwnd += max(1, int(growth * self.mss))
+
+    def on_loss(self, in_flight: int, now: float) -> None:
+        cwnd = self.cwnd / self.mss
+        # fast convergence: release bandwidth for the new flows
+        self.w_max = cwnd * (1 + self.BETA) / 2 if cwnd < self.w_max else cwnd
+        self.epoch = None
+        self.ssthresh = max(int(self.cwnd * self.BETA), 2 * self.mss)
+        self.cwnd = self.ssthresh + 3 * self.mss
+
+    def on_timeout(self, in_flight: int, now: float) -> None:
+        self.w_max = self.cwnd / self.mss
+        self.epoch = None
+        self.ssthresh = max(int(self.cwnd * self.BETA), 2 * self.mss)
+        self.cwnd = self.mss
+
+    def on_rtt_sample(self, rtt: float, now: float) -> None:
+        if not self.min_rtt or rtt < self.min_rtt:
+            self.min_rtt = rtt
+
+
+CONGESTION_CONTROLS: Dict[str, Type[CongestionControl]] = {
+    cls.name: cls for cls in (Reno, NewReno, Cubic)
+}
+
+DEFAULT_CONGESTION_CONTROL = NewReno.name
+
+
+def congestion_control(name: str) -> CongestionControl:
+    """creates a congestion control
+
+    :name: name of the algorithm (reno, newreno or cubic)
+    :returns: a CongestionControl
+
+    """
+    try:
+        return CONGESTION_CONTROLS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown congestion control {name} (available: {', '.join(CONGESTION_CONTROLS)})")
@@ -1,8 +1,14 @@
 IFF_TUN = 0x0001  # tunnel IP packets
 IFF_TAP = 0x0002  # tunnel ethernet frames
 IFF_NO_PI = 0x1000  # don't pass extra packet info
+IFF_MULTI_QUEUE = 0x0100  # several queues (fds) on the same interface
 IFF_ONE_QUEUE = 0x2000  # beats me ;)
 TUNSETIFF = 0x400454CA
+SIOCGIFMTU = 0x8921  # get the MTU of an interface
+SIOCSIFMTU = 0x8922  # set the MTU of an interface
+
+DEFAULT_MTU = 1500
+DEFAULT_MSS = 536  # RFC 1122 default when the peer doesn't send the MSS option
 
 ETH_P_ARP = 0x0806  # Address Resolution packet
 ETH_P_IP = 0x0800  # Internet Protocol packet
@@ -13,15 +19,31 @@ ARP_IPV4 = 0x0800
 ARP_REQUEST = 0x0001
 ARP_REPLY = 0x0002
 
+INADDR_ANY = 0x00000000  # wildcard address (listening on every local address)
+
+IP_MF = 0x01  # more fragments flag
+IP_DF = 0x02  # don't fragment flag
+
 ICMP = 0x01
 IPV4 = 0x04
 IP_TCP = 0x06
 
 ICMP_V4_REPLY = 0x00
+ICMP_V4_DST_UNREACHABLE = 0x03
 ICMP_V4_ECHO = 0x08
 
+ICMP_V4_FRAG_NEEDED = 0x04  # destination unreachable code: fragmentation needed and don't fragment set
+
 TCP_FIN = 0x01
 TCP_SYN = 0x02
 TCP_RST = 0x04
 TCP_PSH = 0x08
 TCP_ACK = 0x10
+
+TCP_OPT_EOL = 0x00  # end of option list
+TCP_OPT_NOP = 0x01  # no operation (padding)
+TCP_OPT_MSS = 0x02  # maximum segment size
+TCP_OPT_WSCALE = 0x03  # window scale
+TCP_OPT_SACK_PERMITTED = 0x04  # selective acknowledgments permitted
+TCP_OPT_SACK = 0x05  # selective acknowledgment blocks
+TCP_OPT_TIMESTAMPS = 0x08  # timestamps
@@ -1,21 +1,30 @@
-import socket
-import struct
-
 from .constants import ETH_P_ARP, ETH_P_IP
+from .header import Field, HeaderSpec, check_size, lazy_header, wrap
+from .ip_util import Buffer
+
+ETH_HEADER_SIZE = 14
 
 
 class EthernetHeader:
 
     """EthernetHeader representation"""
 
-    def __init__(self, dmac: bytes, smac: bytes, typ: int, payload: bytes):
+    # unsigned char dmac[6];
+    # unsigned char smac[6];
+    # uint16_t ethertype;
+    # unsigned char payload[];
+    spec = HeaderSpec(Field("dmac", "6s"), Field("smac", "6s"), Field("typ", "H"))
+
+    __slots__ = ("dmac", "smac", "typ", "payload")
+
+    def __init__(self, dmac: bytes, smac: bytes, typ: int, payload: Buffer):
         """creates a new EthernetHeader
 
         :dmac: the destination mac address (tuple of 6 ints)
         :smac: the source mac address (tuple of 6 ints)
         :typ: The ethertype for the header (2 octet int) that indicates the length or the type of the payload
         it's the type of the payload if greater or requal to 1536, otherwise it's the length of the payload)
-        :payload: raw bytes representing the payload
+        :payload: raw bytes representing the payload (bytes or a memoryview over the received frame)
 
         """
         self.dmac = dmac
@@ -28,32 +37,29 @@ class EthernetHeader:
 
         :returns: raw bytes
         """
-
-        # unsigned char dmac[6];
-        # unsigned char smac[6];
-        # uint16_t ethertype;
-        # unsigned char payload[];
-
-        t = struct.pack("H", socket.htons(self.typ))
-        return self.dmac + self.smac + t + self.payload
+        return EthernetHeader.spec.encode(self) + self.payload
 
     @classmethod
-    def decode(cls, raw: bytes) -> "EthernetHeader":
+    def decode(cls, raw: Buffer, lazy: bool = False) -> "EthernetHeader":
         """decodes an ethernet header from raw bytes
+        the payload is a memoryview over raw (it isn't copied), it has to be copied
+        if it's kept after the frame was handled
 
-        :raw: A list of bytes
+        :raw: A list of bytes (bytes, bytearray or memoryview)
+        :lazy: if True, fields are only decoded when they are read (see LazyEthernetHeader)
         :returns: An EthernetHeader instance
 
         """
-        # unsigned char dmac[6];
-        # unsigned char smac[6];
-        # uint16_t ethertype;
-        # unsigned char payload[];
-        dmac = raw[:6]
-        smac = raw[6:12]
-        typ = socket.htons(struct.unpack("H", raw[12:14])[0])
-        payload = raw[14:]
-        return EthernetHeader(dmac=dmac, smac=smac, typ=typ, payload=payload)
+        check_size(raw, ETH_HEADER_SIZE, "EthernetHeader")
+        if lazy:
+            return wrap(LazyEthernetHeader, memoryview(raw))
+
+        raw = memoryview(raw)
+        eth = EthernetHeader.__new__(EthernetHeader)
+        # mac addresses are small and may be stored (ARP table), they are copied
+        EthernetHeader.spec.decode_into(eth, raw)
+        eth.payload = raw[ETH_HEADER_SIZE:]
+        return eth
 
     def is_arp(self) -> bool:
         """checks if the current ethernet header contains an ARP header
@@ -70,3 +76,10 @@ class EthernetHeader:
 
         """
         return self.typ == ETH_P_IP
+
+
+LazyEthernetHeader = lazy_header(
+    EthernetHeader,
+    {**EthernetHeader.spec.decoders(), "payload": lambda raw: raw[ETH_HEADER_SIZE:]},
+    doc="EthernetHeader wrapping the raw frame, fields are decoded the first time they are read",
+)
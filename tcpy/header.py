@@ -0,0 +1,284 @@
+import struct
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type, TypeVar, Union
+
+T = TypeVar("T")
+
+Decoder = Callable[[memoryview], Any]
+
+
+class Field:
+
+    """A field of a header spec, stored in a single struct field"""
+
+    __slots__ = ("name", "fmt")
+
+    def __init__(self, name: str, fmt: str):
+        """creates a new Field
+
+        :name: name of the attribute storing the field in the header
+        :fmt: struct format character(s) of the field (for instance "H" or "6s")
+
+        """
+        self.name = name
+        self.fmt = fmt
+
+
+class Bits:
+
+    """Bit fields sharing a single struct field (for instance version and ihl in the IP header)"""
+
+    __slots__ = ("fmt", "fields")
+
+    def __init__(self, fmt: str, *fields: Tuple[Optional[str], int]):
+        """creates new Bits
+
+        :fmt: struct format character of the whole field (for instance "B" or "H")
+        :fields: (name, width in bits) tuples, most significant bits first, a None name
+        is used for reserved bits (ignored when decoding and zeroed when encoding)
+
+        """
+        if sum(width for _, width in fields) != 8 * struct.calcsize(fmt):
+            raise ValueError(f"Bit fields don't fill the whole '{fmt}' field")
+
+        self.fmt = fmt
+        self.fields = fields
+
+    def layout(self) -> List[Tuple[str, int, int]]:
+        """returns the named bit fields
+
+        :returns: A list of (name, shift, mask) tuples
+
+        """
+        res, shift = [], 8 * struct.calcsize(self.fmt)
+        for name, width in self.fields:
+            shift -= width
+            if name is not None:
+                res.append((name, shift, (1 << width) - 1))
+
+        return res
+
+
+class HeaderSpec:
+
+    """Declarative description of the fixed part of a header
+
+    Fields are declared once, the spec then provides a precompiled struct.Struct (in network
+    byte order) and functions generated for this specific layout to decode / encode the fields
+    without parsing a format or looping over the fields at each call:
+
+    - unpack_from(buffer, offset=0) -> tuple of the field values (in declaration order)
+    - pack(*values) -> bytes
+    - pack_into(buffer, offset, *values)
+    - decode_into(obj, buffer, offset=0): sets the fields as attributes of obj
+    - encode(obj) -> bytes: encodes the fields read from the attributes of obj
+    - encode_into(obj, buffer, offset): same as encode but packs them into buffer
+    """
+
+    def __init__(self, *items: Union[Field, Bits]):
+        """creates a new HeaderSpec
+
+        :items: the fields of the header, in order
+
+        """
+        self.items = items
+        self.struct = struct.Struct("!" + "".join(item.fmt for item in items))
+        self.size = self.struct.size
+        self.names: List[str] = []
+
+        # Python expressions decoding each field from the struct values (w0, w1, ...)
+        # and expressions building each struct value from the fields
+        decode_exprs: List[str] = []
+        encode_exprs: List[str] = []
+        for idx, item in enumerate(items):
+            if isinstance(item, Field):
+                self.names.append(item.name)
+                decode_exprs.append(f"w{idx}")
+                encode_exprs.append("{" + item.name + "}")
+                continue
+
+            parts = []
+            for name, shift, mask in item.layout():
+                self.names.append(name)
+                decode_exprs.append(f"(w{idx} >> {shift}) & {mask}")
+                parts.append(f"({{{name}}} & {mask}) << {shift}")
+            encode_exprs.append(" | ".join(parts) or "0")
+
+        words = ", ".join(f"w{idx}" for idx in range(len(items))) + ","
+        args = ", ".join(self.names)
+        values = ", ".join(expr.format(**{n: n for n in self.names}) for expr in encode_exprs)
+        attrs = ", ".join(expr.format(**{n: f"obj_.{n}" for n in self.names}) for expr in encode_exprs)
+        assign = "\n    ".join(f"obj_.{n} = {expr}" for n, expr in zip(self.names, decode_exprs))
+
+        # Parameters of the generated functions are suffixed to avoid clashing with field names
+        source = f"""
+def unpack_from(buffer_, offset_=0):
+    {words} = _unpack_from(buffer_, offset_)
+    return ({", ".join(decode_exprs)},)
+
+def pack({args}):
+    return _pack({values})
+
+def pack_into(buffer_, offset_, {args}):
+    _pack_into(buffer_, offset_, {values})
+
+def decode_into(obj_, buffer_, offset_=0):
+    {words} = _unpack_from(buffer_, offset_)
+    {assign}
+
+def encode(obj_):
+    return _pack({attrs})
+
+def encode_into(obj_, buffer_, offset_):
+    _pack_into(buffer_, offset_, {attrs})
+"""
+        namespace: Dict[str, Any] = {
+            "_unpack_from": self.struct.unpack_from,
+            "_pack": self.struct.pack,
+            "_pack_into": self.struct.pack_into,
+        }
+        exec(source, namespace)
+
+        self.unpack_from: Callable[..., Tuple[Any, ...]] = namespace["unpack_from"]
+        self.pack: Callable[..., bytes] = namespace["pack"]
+        self.pack_into: Callable[..., None] = namespace["pack_into"]
+        self.decode_into: Callable[..., None] = namespace["decode_into"]
+        self.encode: Callable[[Any], bytes] = namespace["encode"]
+        self.encode_into: Callable[[Any, Any, int], None] = namespace["encode_into"]
+
+    def offset(self, name: str) -> int:
+        """returns the offset in bytes of the struct field containing the given field
+
+        :name: the field name
+        :returns: an offset in bytes
+
+        """
+        offset = 0
+        for item in self.items:
+            names = [item.name] if isinstance(item, Field) else [n for n, _, _ in item.layout()]
+            if name in names:
+                return offset
+            offset += struct.calcsize("!" + item.fmt)
+
+        raise KeyError(name)
+
+    def decoders(self) -> Dict[str, Decoder]:
+        """returns functions decoding each field on its own (reading only the bytes it's stored in),
+        used to build lazy headers
+
+        :returns: A dict of field name -> function decoding the field from a raw buffer
+
+        """
+        res: Dict[str, Decoder] = {}
+        offset = 0
+        for item in self.items:
+            if isinstance(item, Field):
+                res[item.name] = _field_decoder(item.fmt, offset)
+            else:
+                word = _field_decoder(item.fmt, offset)
+                for name, shift, mask in item.layout():
+                    res[name] = _bits_decoder(word, shift, mask)
+            offset += struct.calcsize("!" + item.fmt)
+
+        return res
+
+
+def _field_decoder(fmt: str, offset: int) -> Decoder:
+    if fmt == "B":
+        return lambda raw: raw[offset]
+
+    unpack_from = struct.Struct("!" + fmt).unpack_from
+    return lambda raw: unpack_from(raw, offset)[0]
+
+
+def _bits_decoder(word: Decoder, shift: int, mask: int) -> Decoder:
+    return lambda raw: (word(raw) >> shift) & mask
+
+
+def check_size(raw: Any, size: int, name: str) -> None:
+    """checks that a received buffer is big enough to hold a header (decoding a truncated frame
+    must fail like any other invalid frame, with a ValueError)
+
+    :raw: the raw buffer
+    :size: the minimum size in bytes
+    :name: the name of the header (for the error message)
+    :raises ValueError: if the buffer is too small
+
+    """
+    if len(raw) < size:
+        raise ValueError(f"Truncated {name}: {len(raw)} bytes, expected at least {size}")
+
+
+def slots(obj: Any) -> Iterator[str]:
+    """iterates over the names of the slots of the given object (including the parent classes ones)
+
+    :obj: An instance of a class using __slots__
+    :returns: An iterator over the slot names
+
+    """
+    for klass in type(obj).__mro__:
+        yield from getattr(klass, "__slots__", ())
+
+
+def fields(obj: Any) -> Dict[str, Any]:
+    """returns the fields of a header using __slots__ (they don't have a __dict__)
+    fields that are not set (not decoded yet) are decoded
+
+    :obj: An instance of a header
+    :returns: A dict of field name -> value
+
+    """
+    return {name: getattr(obj, name) for name in slots(obj) if name not in ("_raw", "_decoded")}
+
+
+def lazy_header(cls: Type[T], decoders: Dict[str, Decoder], doc: str) -> Type[T]:
+    """creates a lazy version of the given header class: instances wrap the raw buffer and
+    each field is decoded the first time it's read (the value is then stored in the slot
+    of the parent class, following reads are plain slot reads)
+
+    :cls: The (eager) header class, it must use __slots__
+    :decoders: A dict of slot name -> function decoding the field from the raw buffer
+    :doc: docstring of the lazy class
+    :returns: A subclass of cls (use `wrap` to create instances)
+
+    """
+    namespace: Dict[str, Any] = {"__slots__": ("_raw", "_decoded"), "__doc__": doc}
+    for bit, (name, decode) in enumerate(decoders.items()):
+        namespace[name] = _lazy_field(vars(cls)[name], 1 << bit, decode)
+
+    return type(f"Lazy{cls.__name__}", (cls,), namespace)
+
+
+def _lazy_field(slot: Any, mask: int, decode: Decoder) -> property:
+    # _decoded is a bitmask of the fields already stored in their slot
+    # (checking it is cheaper than catching the AttributeError of an empty slot)
+    slot_get, slot_set = slot.__get__, slot.__set__
+
+    def getter(self: Any) -> Any:
+        if self._decoded & mask:
+            return slot_get(self)
+
+        value = decode(self._raw)
+        slot_set(self, value)
+        self._decoded |= mask
+        return value
+
+    def setter(self: Any, value: Any) -> None:
+        slot_set(self, value)
+        self._decoded |= mask
+
+    return property(getter, setter)
+
+
+def wrap(cls: Type[T], raw: memoryview) -> T:
+    """creates an instance of the given lazy header class wrapping the raw buffer
+    (no field is decoded)
+
+    :cls: A lazy header class (created by lazy_header)
+    :raw: The raw buffer (a memoryview)
+    :returns: An instance of cls
+
+    """
+    hdr = cls.__new__(cls)
+    hdr._raw = raw  # type: ignore
+    hdr._decoded = 0  # type: ignore
+    return hdr
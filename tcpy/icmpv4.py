@@ -1,17 +1,23 @@
-import socket
-import struct
+from typing import List
 
 from .constants import ICMP_V4_REPLY
-from .ip_util import ip_checksum
+from .header import Field, HeaderSpec, check_size
+from .ip_util import Buffer, checksum_update16, ip_checksum
 
 
 class ICMPv4Header:
 
     """ICMPv4Header representation"""
 
-    fmt = "BBH"
+    # uint8_t type;
+    # uint8_t code;
+    # uint16_t csum;
+    # uint8_t data[];
+    spec = HeaderSpec(Field("_typ", "B"), Field("_code", "B"), Field("_csum", "H"))
 
-    def __init__(self, typ: int, code: int, csum: int, data: bytes):
+    __slots__ = ("_typ", "_code", "_csum", "_data")
+
+    def __init__(self, typ: int, code: int, csum: int, data: Buffer):
         """Creates a new ICMPv4Header
 
         :typ: int for the purpose of the message (there are 42 different values, see: https://www.iana.org/assignments/icmp-parameters/icmp-parameters.xhtml)
@@ -29,8 +35,20 @@ class ICMPv4Header:
         """adjusts the checksum to make sure it's valid
         """
         self._csum = 0
-        # TODO improve that (it's not really efficient)
-        self._csum = socket.htons(ip_checksum(self.encode()))
+        self._csum = ip_checksum(self.encode())
+
+    def set_type(self, typ: int) -> None:
+        """changes the type of the message, the checksum is incrementally updated
+        (it doesn't need to go through the data again)
+
+        :typ: the new ICMP type
+
+        """
+        # type and code are the first 16 bits word of the message
+        self._csum = checksum_update16(
+            self._csum, self._typ << 8 | self._code, typ << 8 | self._code
+        )
+        self._typ = typ
 
     def encode(self) -> bytes:
         """encodes the given ICMPv4Header into raw bytes
@@ -38,33 +56,30 @@ class ICMPv4Header:
         :returns: raw bytes representing the ICMPv4Header encoded
 
         """
+        return ICMPv4Header.spec.encode(self) + self._data
 
-        # uint8_t type;
-        # uint8_t code;
-        # uint16_t csum;
-        # uint8_t data[];
+    def segments(self) -> List[Buffer]:
+        """returns the encoded message as a list of segments (the header and the data, which isn't copied)
 
-        return (
-            struct.pack(ICMPv4Header.fmt, self._typ, self._code, self._csum)
-            + self._data
-        )
+        :returns: a list of buffers
+
+        """
+        return [ICMPv4Header.spec.encode(self), self._data]
 
     @classmethod
-    def decode(cls, raw: bytes) -> "ICMPv4Header":
+    def decode(cls, raw: Buffer) -> "ICMPv4Header":
         """decodes the given raw bytes into an ICMPv4Header
+        the data is a memoryview over raw (it isn't copied)
 
-        :raw: a list of bytes to decode
+        :raw: a list of bytes to decode (bytes, bytearray or memoryview)
         :returns: an instance of ICMPv4Header
 
         """
-
-        # uint8_t type;
-        # uint8_t code;
-        # uint16_t csum;
-        # uint8_t data[];
-
-        (typ, code, csum) = struct.unpack(cls.fmt, raw[:4])
-        icmp = ICMPv4Header(typ=typ, code=code, csum=csum, data=raw[4:])
+        check_size(raw, ICMPv4Header.spec.size, "ICMPv4Header")
+        raw = memoryview(raw)
+        icmp = ICMPv4Header.__new__(ICMPv4Header)
+        ICMPv4Header.spec.decode_into(icmp, raw)
+        icmp._data = raw[ICMPv4Header.spec.size :]
 
         # TODO better way of checking the checksum
         computed_csum = ip_checksum(raw)
@@ -81,6 +96,5 @@ class ICMPv4Header:
         :returns: An ICMPv4Header containing the reply
 
         """
-        self.typ = ICMP_V4_REPLY
-        self.adjust_checksum()
+        self.set_type(ICMP_V4_REPLY)
         return self
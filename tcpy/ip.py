@@ -1,15 +1,63 @@
-import socket
 import struct
+from typing import List
 
-from .constants import ICMP, IP_TCP, IPV4
-from .ip_util import ip2int, ip_checksum
+from .constants import ICMP, IP_DF, IP_MF, IP_TCP, IPV4
+from .header import Bits, Field, HeaderSpec, check_size, fields, lazy_header, wrap
+from .ip_util import Buffer, ip2int, ip_checksum
+
+IP_HEADER_SIZE = 20
+# smallest MTU of a link (RFC 791: a datagram of 68 bytes is forwarded without further fragmentation,
+# the biggest header and a part of 8 bytes)
+MIN_MTU = 68
+
+# total length and identification, flags and fragment offset
+_H = struct.Struct("!H")
 
 
 class IPHeader:
 
     """IPHeader representation"""
 
-    fmt = "BBHHHBBHII"
+    # uint8_t version : 4;
+    # uint8_t ihl : 4;
+    # uint8_t tos;
+    # uint16_t len;
+    # uint16_t id;
+    # uint16_t flags : 3;
+    # uint16_t frag_offset : 13;
+    # uint8_t ttl;
+    # uint8_t proto;
+    # uint16_t csum;
+    # uint32_t saddr;
+    # uint32_t daddr;
+    spec = HeaderSpec(
+        Bits("B", ("_version", 4), ("_ihl", 4)),
+        Field("_tos", "B"),
+        Field("len", "H"),
+        Field("id", "H"),
+        Bits("H", ("_flags", 3), ("_frag_offset", 13)),
+        Field("_ttl", "B"),
+        Field("proto", "B"),
+        Field("_csum", "H"),
+        Field("saddr", "I"),
+        Field("daddr", "I"),
+    )
+
+    __slots__ = (
+        "_version",
+        "_ihl",
+        "_tos",
+        "len",
+        "id",
+        "_flags",
+        "_frag_offset",
+        "_ttl",
+        "proto",
+        "_csum",
+        "saddr",
+        "daddr",
+        "payload",
+    )
 
     def __init__(
         self,
@@ -25,14 +73,14 @@ class IPHeader:
         csum: int,
         saddr: int,
         daddr: int,
-        payload: bytes,
+        payload: Buffer,
     ):
         """Creates a new IP Header
 
         :version: 4 bit int to indicate the Internet Header format (=4 for IPv4)
         :ihl: 4 bit int that indicates the number of 32 bit words in the IP Header (max = 15 * 32 bits)
         :tos: type of service field (quality of service intended for the IP datagram)
-        :len: the total length of the whole IP datagram (max length is 65535), if the IP datagram is too big it will be fragmented (TODO: implement fragmentation)
+        :len: the total length of the whole IP datagram (max length is 65535), if the IP datagram is too big it will be fragmented (see fragment)
         :id: int used to index the datagram (used for reassembling fragmented IP datagrams), it's incremented by the sender (so the receiver can rebuild the datagram)
         :flags: defines control flags (whether fragmentation is allowed, if it's the last fragment, etc.)
         :frag_offset: Indicate the position of the fragment in the datagram (first has this set to 0)
@@ -75,12 +123,20 @@ class IPHeader:
         """
         return self.proto == ICMP
 
+    def is_fragment(self) -> bool:
+        """Checks if the datagram is a fragment (it's reassembled before being handled)
+
+        :returns: a boolean
+
+        """
+        return bool(self._flags & IP_MF or self._frag_offset)
+
     def adjust_checksum(self) -> None:
         """adjusts the checksum to make sure it's valid
         """
         self._csum = 0
-        # TODO improve that (it's not really efficient)
-        self._csum = socket.htons(ip_checksum(self.encode()[:20]))
+        # Only the header is covered by the checksum, no need to encode the payload
+        self._csum = ip_checksum(self._encode_header())
 
     def encode(self) -> bytes:
         """Encodes the given IPHeader into raw bytes
@@ -88,69 +144,43 @@ class IPHeader:
         :returns: raw bytes
 
         """
-        version_ihl = self._version << 4 | self._ihl
-        flags_fragoffset = self._flags << 13 | self._frag_offset
-
-        raw = struct.pack(
-            IPHeader.fmt,
-            version_ihl,
-            self._tos,
-            self.len,
-            self.id,
-            flags_fragoffset,
-            self._ttl,
-            self.proto,
-            self._csum,
-            self.saddr,
-            self.daddr,
-        )
-        return raw + self.payload
+        return self._encode_header() + self.payload
+
+    def _encode_header(self) -> bytes:
+        """Encodes the header (without the payload) into raw bytes
+
+        :returns: raw bytes
+
+        """
+        return IPHeader.spec.encode(self)
 
     @classmethod
-    def decode(cls, raw: bytes) -> "IPHeader":
+    def decode(cls, raw: Buffer, lazy: bool = False) -> "IPHeader":
         """decodes the given raw bytes into an IP Header
+        the payload is a memoryview over raw (it isn't copied)
 
-        :raw: a list of bytes to decode
+        :raw: a list of bytes to decode (bytes, bytearray or memoryview)
+        :lazy: if True, fields are only decoded when they are read (see LazyIPHeader) and the
+        checksum isn't verified: the caller checks it with check_checksum once it knows the
+        datagram is handled (dispatching on the protocol only reads one byte)
         :returns: an instance of IPHeader
 
         """
-
-        # uint8_t version : 4;
-        # uint8_t ihl : 4;
-        # uint8_t tos;
-        # uint16_t len;
-        # uint16_t id;
-        # uint16_t flags : 3;
-        # uint16_t frag_offset : 13;
-        # uint8_t ttl;
-        # uint8_t proto;
-        # uint16_t csum;
-        # uint32_t saddr;
-        # uint32_t daddr;
-
-        fields = struct.unpack(cls.fmt, raw[:20])
-        version_ihl = fields[0]
-        flags_fragoffset = fields[4]
-        vals = [
-            (version_ihl & 0xF0) >> 4,
-            version_ihl & 0x0F,
-            *fields[1:4],
-            (flags_fragoffset & 0xE000) >> 13,
-            flags_fragoffset & 0x1F00,
-            *fields[5:],
-            raw[20:],
-        ]
-        ip_hdr = IPHeader(*vals)
-
-        # TODO better way of checking the checksum
-
-        # We compute the checksum only on the header (and not the data) for IPHeaders
-        computed_csum = ip_checksum(raw[:20])
-        if computed_csum != 0:
-            raise ValueError(
-                f"Invalid checksum for IPHeader, got: {computed_csum}, expected 0"
-            )
-
+        raw = memoryview(raw)
+        check_size(raw, IP_HEADER_SIZE, "IPHeader")
+        ihl = raw[0] & 0x0F
+        if ihl < 5:
+            raise ValueError(f"Invalid IPHeader length: {ihl} words")
+        check_size(raw, 4 * ihl, "IPHeader options")
+        if lazy:
+            return wrap(LazyIPHeader, raw)
+
+        check_checksum(raw)
+        ip_hdr = IPHeader.__new__(IPHeader)
+        IPHeader.spec.decode_into(ip_hdr, raw)
+        # The payload starts after the options and stops at the end of the datagram
+        # (ethernet frames may be padded)
+        ip_hdr.payload = raw[4 * ihl : ip_hdr.len]
         return ip_hdr
 
     def is_supported(self) -> bool:
@@ -165,40 +195,128 @@ class IPHeader:
         return self._version == 4 and self._ihl >= 5 and self._ttl != 0
 
     def __repr__(self) -> str:
-        return f"{self.__dict__}"
+        return f"{fields(self)}"
 
-    def reply(self, src_ip: str, payload: bytes, proto: int) -> "IPHeader":
+    def reply(self, src_ip: str, payload: Buffer, proto: int, flags: int = IP_DF) -> "IPHeader":
         """Reply to an IP datagram
 
         :src_ip: the source IP as a string
         :payload: the payload to encode
         :proto: The protocol (ICMP, TCP)
+        :flags: the flags of the reply (IP_DF or 0 if the reply can be fragmented)
         :returns: an IPHeader containing the reply
 
+        """
+        ip_r = self.reply_header(src_ip, len(payload), proto, flags)
+        ip_r.payload = payload
+        return ip_r
+
+    def reply_header(self, src_ip: str, payload_len: int, proto: int, flags: int = IP_DF) -> "IPHeader":
+        """Reply to an IP datagram without attaching the payload (its encoding is only the header),
+        used to send the payload as separate segments (see Stack.ip_output)
+
+        :src_ip: the source IP as a string
+        :payload_len: the length of the payload in bytes
+        :proto: The protocol (ICMP, TCP)
+        :flags: the flags of the reply (IP_DF or 0 if the reply can be fragmented)
+        :returns: an IPHeader containing the reply (with an empty payload)
+
+        """
+
+        return IPHeader.build(ip2int(src_ip), self.saddr, proto, payload_len, self.id, flags)
+
+    @classmethod
+    def build(cls, saddr: int, daddr: int, proto: int, payload_len: int, id: int, flags: int = IP_DF) -> "IPHeader":
+        """builds the header of a datagram (without attaching the payload, its encoding is only the header)
+
+        :saddr: the source address
+        :daddr: the destination address
+        :proto: The protocol (ICMP, TCP)
+        :payload_len: the length of the payload in bytes
+        :id: the identification of the datagram
+        :flags: IP_DF (the default: the datagram isn't fragmented on its path, the routers that can't forward
+        it report their MTU, see tcpy.pmtu) or 0 if it can be fragmented
+        :returns: an IPHeader with a valid checksum (and an empty payload)
+
         """
 
         # TODO: don't hardcode header length
-        ip_r = IPHeader(
+        ip_hdr = IPHeader(
             # TODO don't hardcode the version
             version=IPV4,
             ihl=0x05,
             tos=0,
             # The length of the datagram is the length of the payload + the length of the header (20)
-            len=socket.htons(len(payload) + 20),
-            id=self.id,
-            # TODO allow flags
-            # For now flags are only used to indicate fragmentation / if there are more fragmented
-            # packets to come, for now let's ignore this
-            flags=0,
-            frag_offset=socket.htons(0x4000),
+            len=payload_len + IP_HEADER_SIZE,
+            id=id,
+            flags=flags,
+            frag_offset=0,
             ttl=64,
             proto=proto,
             # the checksum will be computed later on
             csum=0,
-            saddr=socket.htonl(ip2int(src_ip)),
-            daddr=self.saddr,
-            payload=payload,
+            saddr=saddr,
+            daddr=daddr,
+            payload=b"",
         )
-        ip_r.adjust_checksum()
+        ip_hdr.adjust_checksum()
 
-        return ip_r
+        return ip_hdr
+
+
+def fragment(header: Buffer, payload: Buffer, mtu: int) -> List[List[Buffer]]:
+    """splits a datagram into fragments (RFC 791, 3.2): the payload is cut in parts of a multiple of 8 bytes,
+    each fragment is a copy of the header (its length, more fragments flag, offset and checksum updated)
+    followed by a part of the payload (a view, it isn't copied)
+
+    :header: the header of the datagram (the datagram must not have the don't fragment flag, the options
+    are copied in every fragment, the stack sends none)
+    :payload: the payload of the datagram
+    :mtu: maximum size of a fragment (header included), at least MIN_MTU
+    :returns: the fragments as lists of segments (the header and the payload)
+    :raises ValueError: if the MTU is below MIN_MTU
+
+    """
+    if mtu < MIN_MTU:
+        raise ValueError(f"Invalid MTU to fragment a datagram: {mtu} (the minimum is {MIN_MTU})")
+
+    payload = memoryview(payload)
+    hl = len(header)
+    size = (mtu - hl) & ~7
+    # the fragments of a fragment are fragments too
+    flags_offset = _H.unpack_from(header, 6)[0]
+    frags: List[List[Buffer]] = []
+    for start in range(0, len(payload), size):
+        part = payload[start : start + size]
+        more = IP_MF << 13 if start + size < len(payload) else 0
+        raw = bytearray(header)
+        _H.pack_into(raw, 2, hl + len(part))
+        _H.pack_into(raw, 6, (flags_offset | more) + start // 8)
+        _H.pack_into(raw, 10, 0)
+        _H.pack_into(raw, 10, ip_checksum(raw))
+        frags.append([raw, part])
+    return frags
+
+
+def check_checksum(raw: Buffer) -> None:
+    """checks the checksum of a datagram (it only covers the header)
+
+    :raw: the raw datagram
+    :raises ValueError: if the checksum is invalid
+
+    """
+    computed_csum = ip_checksum(raw[: 4 * (raw[0] & 0x0F)])
+    if computed_csum != 0:
+        raise ValueError(f"Invalid checksum for IPHeader, got: {computed_csum}, expected 0")
+
+
+LazyIPHeader = lazy_header(
+    IPHeader,
+    {
+        **IPHeader.spec.decoders(),
+        # The payload starts after the options and stops at the end of the datagram
+        "payload": lambda raw: raw[4 * (raw[0] & 0x0F) : raw[2] << 8 | raw[3]],
+    },
+    doc="""IPHeader wrapping the raw datagram, fields are decoded the first time they are read
+    (for instance dispatching on the protocol only reads one byte)""",
+)
@@ -1,13 +1,16 @@
 import socket
 import struct
+from typing import Union
 
+Buffer = Union[bytes, bytearray, memoryview]
 
-def ip_checksum(hdr_raw: bytes, start: int = 0) -> int:
+
+def ip_checksum(hdr_raw: Buffer, start: int = 0) -> int:
     """Computes the IP checksum for the given raw IP header
 
     From: Taken from https://tools.ietf.org/html/rfc1071
 
-    :hdr_raw: Raw IP Header in bytes
+    :hdr_raw: Raw IP Header in bytes (bytes, bytearray or memoryview)
     :start: optional parameter to offset the start checksum
     :returns: an int representing the checksum value
 
@@ -21,26 +24,94 @@ def ip_checksum(hdr_raw: bytes, start: int = 0) -> int:
     return csum ^ 0xFFFF
 
 
-def sum_by_16bits(raw: bytes) -> int:
-    """sums the given raw bytes 16bits by 16bits and retun the results
+def sum_by_16bits(raw: Buffer) -> int:
+    """sums the given raw bytes 16bits by 16bits (one's complement sum) and return the result
 
-    :raw: Raw bytes
-    :returns: int for the sum 16 bits by 16 bits
+    The whole buffer is read as a single big endian integer: since 2^16 = 1 (mod 2^16 - 1)
+    the one's complement sum of its 16 bits words is the integer modulo 0xFFFF (a non zero sum
+    that is a multiple of 0xFFFF is 0xFFFF in one's complement arithmetic)
+    An odd trailing byte is padded with a zero byte as described in RFC 1071
 
-    """
-    csum, idx = 0, 0
-    length = len(raw)
+    int.from_bytes copies a bytearray or a memoryview into a temporary bytes object first (a memcpy of
+    less than 0.5 us for 9000 bytes, see benchmarks/checksum.py), it's still 3 to 4 times
+    faster than summing the words of memoryview.cast("H") that doesn't copy but creates an int per word
 
-    while idx + 1 < length:
-        csum += struct.unpack("!H", raw[idx : idx + 2])[0]
-        idx += 2
+    :raw: Raw bytes (bytes, bytearray or memoryview)
+    :returns: int for the sum 16 bits by 16 bits folded on 16 bits
+
+    """
+    value = int.from_bytes(raw, "big")
+    if len(raw) & 1:
+        value <<= 8
 
-    if idx < length:
-        csum += int(raw[idx])
+    csum = value % 0xFFFF
+    if csum == 0 and value != 0:
+        return 0xFFFF
 
     return csum
 
 
+def checksum_update(csum: int, old: Buffer, new: Buffer) -> int:
+    """Incrementally updates a checksum when some 16 bits aligned bytes of the
+    checksummed data change, without summing the whole data again
+
+    From: https://tools.ietf.org/html/rfc1624 (eqn. 3: HC' = ~(~HC + ~m + m'))
+    Removed data can be accounted for by passing empty bytes as new (and added data
+    by passing empty bytes as old)
+
+    :csum: the current checksum (host byte order)
+    :old: the old bytes (must start on a 16 bits boundary of the checksummed data)
+    :new: the new bytes (must start on a 16 bits boundary of the checksummed data)
+    :returns: an int representing the updated checksum value
+
+    """
+    return _update(csum, sum_by_16bits(old), sum_by_16bits(new))
+
+
+def checksum_update16(csum: int, old: int, new: int) -> int:
+    """Incrementally updates a checksum when a 16 bits word of the checksummed data changes
+
+    :csum: the current checksum (host byte order)
+    :old: the old 16 bits word (host byte order)
+    :new: the new 16 bits word (host byte order)
+    :returns: an int representing the updated checksum value
+
+    """
+    return _update(csum, old, new)
+
+
+def _update(csum: int, old_sum: int, new_sum: int) -> int:
+    csum = (~csum & 0xFFFF) + (~old_sum & 0xFFFF) + new_sum
+
+    while csum >> 16:
+        csum = (csum & 0xFFFF) + (csum >> 16)
+
+    # eqn. 3 gives 0x0000 when the sum of the data is 0xFFFF or 0 (-0 and +0 in one's complement):
+    # 0xFFFF is returned instead, it verifies in both cases while 0x0000 doesn't verify if all the
+    # data is zero (like an ICMP echo reply with id, sequence number and data zero)
+    return ~csum & 0xFFFF or 0xFFFF
+
+
+def pseudo_header_sum(saddr: int, daddr: int, proto: int, length: int) -> int:
+    """sums the 16 bits words of the pseudo IP header included in TCP (and UDP) checksums:
+    uint32_t saddr;
+    uint32_t daddr;
+    uint8_t zero;
+    uint8_t proto;
+    uint16_t len;
+
+    (the sum doesn't depend on the order of the addresses)
+
+    :saddr: the source address (int)
+    :daddr: the destination address (int)
+    :proto: the IP protocol
+    :length: the length of the TCP segment (header and payload)
+    :returns: an int for the sum 16 bits by 16 bits (not folded)
+
+    """
+    return (saddr >> 16) + (saddr & 0xFFFF) + (daddr >> 16) + (daddr & 0xFFFF) + proto + length
+
+
 def ip2int(addr: str) -> int:
     """convert an IP string to an int
     """
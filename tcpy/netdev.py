@@ -0,0 +1,217 @@
+import abc
+import os
+import socket
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple
+
+from .constants import DEFAULT_MTU
+from .ip_util import Buffer
+from .tuntap import get_mtu, open_tun, open_tun_queues, set_mtu
+
+
+class NetDevice(abc.ABC):
+
+    """A network device the stack receives frames from and sends frames on
+
+    Devices are non blocking: recv_into and send raise BlockingIOError when no frame can be
+    received / sent, fileno returns a file descriptor that can be polled (epoll, loop.add_reader)
+    to know when frames can be received.
+    """
+
+    @abc.abstractmethod
+    def fileno(self) -> int:
+        """returns a file descriptor that is readable when frames can be received"""
+
+    @abc.abstractmethod
+    def recv_into(self, buf: memoryview) -> int:
+        """receives a frame in place in buf (raises BlockingIOError if there is none)
+
+        :buf: a writable buffer large enough for a frame
+        :returns: the size of the frame
+
+        """
+
+    @abc.abstractmethod
+    def send(self, segments: List[Buffer]) -> None:
+        """sends a frame (raises BlockingIOError if it can't be sent without blocking)
+
+        :segments: the segments of the frame, in order
+
+        """
+
+    def configure_mtu(self, mtu: Optional[int]) -> int:
+        """sets the MTU of the device if given, otherwise reads it
+
+        :mtu: the MTU to set or None
+        :returns: the MTU of the device
+
+        """
+        return mtu or DEFAULT_MTU
+
+    def close(self) -> None:
+        """closes the device"""
+
+
+class FdDevice(NetDevice):
+
+    """A device reading / writing one frame per syscall on a file descriptor (readv / writev)"""
+
+    def __init__(self, fd: int):
+        """creates a new FdDevice, fd is put in non blocking mode
+
+        :fd: the file descriptor
+
+        """
+        self.fd = fd
+        os.set_blocking(fd, False)
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def recv_into(self, buf: memoryview) -> int:
+        return os.readv(self.fd, [buf])
+
+    def send(self, segments: List[Buffer]) -> None:
+        os.writev(self.fd, segments)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class TapDevice(FdDevice):
+
+    """A queue of a tun/tap interface (requires root)"""
+
+    def __init__(self, fd: int, name: str):
+        """creates a new TapDevice from an opened queue (see open / open_queues)
+
+        :fd: the file descriptor of the queue
+        :name: the name of the interface
+
+        """
+        super().__init__(fd)
+        self.name = name
+
+    @classmethod
+    def open(cls, interf: str) -> "TapDevice":
+        """opens a tap interface
+
+        :interf: the name of the interface (it may be a template like tap%d)
+        :returns: a TapDevice
+
+        """
+        fd, (name, mode) = open_tun(interf)
+        return cls(fd, name)
+
+    @classmethod
+    def open_queues(cls, interf: str, count: int) -> List["TapDevice"]:
+        """opens count queues of a multi queue tap interface
+
+        :interf: the name of the interface (it may be a template like tap%d)
+        :count: the number of queues
+        :returns: one TapDevice per queue
+
+        """
+        fds, (name, mode) = open_tun_queues(interf, count)
+        return [cls(fd, name) for fd in fds]
+
+    def configure_mtu(self, mtu: Optional[int]) -> int:
+        if mtu is None:
+            return get_mtu(self.name)
+
+        set_mtu(self.name, mtu)
+        return mtu
+
+
+class SocketDevice(FdDevice):
+
+    """A device backed by a datagram socket (one frame per datagram)"""
+
+    def __init__(self, sock: socket.socket):
+        """creates a new SocketDevice
+
+        :sock: a datagram socket (for instance one end of an AF_UNIX socketpair)
+
+        """
+        super().__init__(sock.fileno())
+        self.sock = sock
+
+    @classmethod
+    def pair(cls) -> Tuple["SocketDevice", "SocketDevice"]:
+        """creates two linked devices: frames sent on one are received on the other
+        (used to connect two stacks)
+
+        :returns: a tuple of two SocketDevice
+
+        """
+        a, b = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        return cls(a), cls(b)
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+class SocketPairDevice(SocketDevice):
+
+    """An in-memory device backed by a datagram socketpair, the other end (peer) is used to
+    send frames to the stack and receive the frames it sends (the stack runs without root)"""
+
+    def __init__(self) -> None:
+        sock, self.peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        super().__init__(sock)
+
+    def close(self) -> None:
+        super().close()
+        self.peer.close()
+
+
+class CallableDevice(NetDevice):
+
+    """A device calling a function for every frame sent, frames are received with inject
+    (no syscall on the data path besides waking up the poller, a pipe makes it pollable)"""
+
+    def __init__(self, output: Callable[[bytes], None]):
+        """creates a new CallableDevice
+
+        :output: function called with every frame sent by the stack
+
+        """
+        self._output = output
+        self._frames: Deque[Buffer] = deque()
+        # readable while frames are queued
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+
+    def inject(self, frame: Buffer) -> None:
+        """queues a frame received by the stack
+
+        :frame: the raw frame
+
+        """
+        if not self._frames:
+            os.write(self._wakeup_w, b"\x00")
+        self._frames.append(frame)
+
+    def fileno(self) -> int:
+        return self._wakeup_r
+
+    def recv_into(self, buf: memoryview) -> int:
+        if not self._frames:
+            raise BlockingIOError()
+
+        frame = self._frames.popleft()
+        if not self._frames:
+            os.read(self._wakeup_r, 1)
+
+        # like a read from a tap or a datagram socket, what doesn't fit in the buffer is lost (the truncated
+        # frame is dropped by the stack)
+        size = min(len(frame), len(buf))
+        buf[:size] = memoryview(frame)[:size]
+        return size
+
+    def send(self, segments: List[Buffer]) -> None:
+        self._output(b"".join(segments))
+
+    def close(self) -> None:
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
@@ -0,0 +1,78 @@
+import time
+from typing import Callable, Dict, Tuple
+
+# the path MTUs reported by ICMP are not lowered below it (smaller values are more likely to come from
+# forged messages degrading the connections than from real links, Linux uses the same bound)
+MIN_PMTU = 552
+# lifetime of a path MTU estimate in seconds, the MTU of the link is then tried again (RFC 1191, 6.3)
+PMTU_TIMEOUT = 600.0
+# maximum number of destinations in the cache, the oldest estimate is dropped beyond it
+MAX_ENTRIES = 4096
+# common MTUs (RFC 1191, 7): the estimate used when the router doesn't report the MTU of the next hop
+PLATEAUS = (32000, 17914, 8166, 4352, 2002, 1492, 1006, 508, 296, 68)
+
+
+class PMTUCache:
+
+    """Path MTU discovery (RFC 1191): the datagrams are sent with the don't fragment flag, the routers
+    that can't forward them answer with an ICMP fragmentation needed message carrying the MTU of the
+    next hop, it's recorded here as the path MTU of the destination
+
+    The estimates expire after timeout seconds (the path may have changed), the number of destinations
+    is bounded.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, timeout: float = PMTU_TIMEOUT):
+        """creates a new PMTUCache
+
+        :clock: function returning the current time in seconds
+        :timeout: lifetime of an estimate in seconds
+
+        """
+        self._clock = clock
+        self.timeout = timeout
+        # destination address -> (path MTU, expiration time), the oldest first
+        self._entries: Dict[int, Tuple[int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, daddr: int, mtu: int) -> int:
+        """returns the path MTU to a destination
+
+        :daddr: the destination address
+        :mtu: the MTU of the link (returned if there is no estimate for the destination)
+        :returns: the path MTU
+
+        """
+        entry = self._entries.get(daddr)
+        if entry is None:
+            return mtu
+
+        pmtu, expires = entry
+        if self._clock() >= expires:
+            del self._entries[daddr]
+            return mtu
+        return min(pmtu, mtu)
+
+    def update(self, daddr: int, mtu: int, size: int) -> bool:
+        """records a fragmentation needed message
+
+        :daddr: the destination of the datagram that couldn't be forwarded
+        :mtu: the MTU of the next hop reported by the router (0 if it doesn't report it)
+        :size: the total length of the datagram that couldn't be forwarded
+        :returns: True if the path MTU decreased
+
+        """
+        if not 0 < mtu < size:
+            # old routers don't report the MTU (RFC 1191, 5), the next plateau below the datagram is used
+            mtu = next((plateau for plateau in PLATEAUS if plateau < size), PLATEAUS[-1])
+        mtu = max(mtu, MIN_PMTU)
+        if mtu >= self.get(daddr, size):
+            return False
+
+        self._entries.pop(daddr, None)
+        if len(self._entries) >= MAX_ENTRIES:
+            del self._entries[next(iter(self._entries))]
+        self._entries[daddr] = (mtu, self._clock() + self.timeout)
+        return True
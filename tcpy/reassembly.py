@@ -0,0 +1,205 @@
+from typing import Dict, List, Optional, Tuple
+
+from .constants import IP_MF
+from .ip import IPHeader
+from .ip_util import Buffer, ip_checksum
+from .timer_wheel import Timer, TimerWheel
+
+# (source address, destination address, protocol, identification): the fragments of a datagram (RFC 791)
+FragmentKey = Tuple[int, int, int, int]
+
+# maximum memory used by the incomplete datagrams, the oldest ones are evicted beyond it
+DEFAULT_MAX_MEMORY = 4 * 1024 * 1024
+# lifetime of an incomplete datagram in seconds (RFC 1122, 3.3.2: between 60 seconds and 2 minutes,
+# Linux uses 30 seconds)
+REASSEMBLY_TIMEOUT = 30.0
+# memory charged per datagram besides its data (a flood of tiny fragments is bounded too)
+DATAGRAM_OVERHEAD = 256
+# maximum size of a datagram
+MAX_DATAGRAM_SIZE = 0xFFFF
+# end of the last hole while the last fragment wasn't received
+INFINITY = MAX_DATAGRAM_SIZE + 1
+
+
+class Datagram:
+
+    """A datagram being reassembled: the data received so far and the holes left (RFC 815)"""
+
+    __slots__ = ("key", "header", "data", "holes", "size", "timer")
+
+    def __init__(self, key: FragmentKey, timer: Timer):
+        """creates a new Datagram
+
+        :key: the key of its fragments
+        :timer: the timer dropping it once it expires
+
+        """
+        self.key = key
+        # header of the first fragment (the header of the reassembled datagram)
+        self.header = b""
+        self.data = bytearray()
+        # [first, last) ranges of payload not received yet, sorted
+        self.holes: List[Tuple[int, int]] = [(0, INFINITY)]
+        # size of the payload, known once the last fragment is received
+        self.size: Optional[int] = None
+        self.timer = timer
+
+    def memory(self) -> int:
+        return DATAGRAM_OVERHEAD + len(self.data)
+
+
+class Reassembler:
+
+    """Reassembles the fragmented IP datagrams
+
+    The holes of a datagram are tracked with hole descriptors (RFC 815): a fragment fills the holes
+    it overlaps and leaves the parts of them it doesn't cover, the datagram is complete once there is
+    no hole left. The memory used by the incomplete datagrams is bounded: they expire after timeout
+    seconds and the oldest ones are evicted to make room for a new fragment.
+    """
+
+    def __init__(self, timers: TimerWheel, max_memory: int = DEFAULT_MAX_MEMORY, timeout: float = REASSEMBLY_TIMEOUT):
+        """creates a new Reassembler
+
+        :timers: the timer wheel of the reassembly timeouts
+        :max_memory: maximum memory used by the incomplete datagrams in bytes
+        :timeout: lifetime of an incomplete datagram in seconds
+
+        """
+        self.timers = timers
+        self.max_memory = max_memory
+        self.timeout = timeout
+        # incomplete datagrams, the oldest first
+        self._datagrams: Dict[FragmentKey, Datagram] = {}
+        self.memory = 0
+        # datagrams reassembled, dropped because they expired or were evicted, invalid fragments
+        self.reassembled = 0
+        self.timeouts = 0
+        self.evicted = 0
+        self.invalid = 0
+
+    def __len__(self) -> int:
+        return len(self._datagrams)
+
+    def add(self, raw: Buffer) -> Optional[bytearray]:
+        """adds a fragment
+
+        :raw: the fragment (an IP datagram whose checksum was verified), it's copied
+        :returns: the reassembled datagram once its last missing fragment is added, None otherwise
+
+        """
+        _, ihl, _, length, id_, flags, offset, _, proto, _, saddr, daddr = IPHeader.spec.unpack_from(raw)
+        payload = memoryview(raw)[4 * ihl : length]
+        first = 8 * offset
+        last = first + len(payload)
+        more = flags & IP_MF
+        if last + 4 * ihl > MAX_DATAGRAM_SIZE or (more and len(payload) % 8) or not payload:
+            # only the last fragment can have a size that isn't a multiple of 8 bytes
+            self.invalid += 1
+            return None
+
+        key = (saddr, daddr, proto, id_)
+        datagram = self._datagrams.get(key)
+        if datagram is None:
+            # the timer refers to the key (not to the datagram, an evicted datagram is freed right away)
+            datagram = Datagram(key, Timer(self._expired, key))
+            self._datagrams[key] = datagram
+            self.memory += datagram.memory()
+            self.timers.schedule(datagram.timer, self.timeout)
+        elif not _consistent(datagram, last, more):
+            # the fragments don't agree on the size of the datagram
+            self.invalid += 1
+            self._remove(datagram)
+            return None
+
+        growth = max(last - len(datagram.data), 0)
+        if not self._reserve(datagram, growth):
+            return None
+
+        if growth:
+            datagram.data.extend(bytes(growth))
+            self.memory += growth
+        datagram.data[first:last] = payload
+        if first == 0:
+            datagram.header = bytes(raw[: 4 * ihl])
+        _fill(datagram, first, last, more)
+
+        if datagram.holes:
+            return None
+
+        self._remove(datagram)
+        self.reassembled += 1
+        return _rebuild(datagram)
+
+    def _reserve(self, datagram: Datagram, size: int) -> bool:
+        """evicts the oldest datagrams until size bytes can be added to datagram
+
+        :returns: False if it's not possible (datagram is dropped)
+
+        """
+        while self.memory + size > self.max_memory:
+            oldest = next(iter(self._datagrams.values()))
+            self.evicted += 1
+            self._remove(oldest)
+            if oldest is datagram:
+                return False
+
+        return True
+
+    def _expired(self, key: FragmentKey) -> None:
+        self.timeouts += 1
+        self._remove(self._datagrams[key])
+
+    def _remove(self, datagram: Datagram) -> None:
+        del self._datagrams[datagram.key]
+        self.memory -= datagram.memory()
+        self.timers.cancel(datagram.timer)
+
+
+def _consistent(datagram: Datagram, last: int, more: int) -> bool:
+    """checks that a fragment ending at last doesn't contradict the fragments received before: the last
+    fragment gives the size of the datagram, no data is received beyond it"""
+    if more:
+        return datagram.size is None or last <= datagram.size
+    if datagram.size is None:
+        return len(datagram.data) <= last
+    return last == datagram.size
+
+
+def _fill(datagram: Datagram, first: int, last: int, more: int) -> None:
+    """updates the holes of a datagram with the fragment [first, last) (RFC 815, 3)
+
+    :more: the more fragments flag of the fragment (it's the last fragment if not set)
+
+    """
+    holes = []
+    for hole_first, hole_last in datagram.holes:
+        if hole_last <= first or last <= hole_first:
+            holes.append((hole_first, hole_last))
+            continue
+        # the fragment fills the hole, what it doesn't cover is left
+        if hole_first < first:
+            holes.append((hole_first, first))
+        if last < hole_last and more:
+            holes.append((last, hole_last))
+
+    if not more:
+        # nothing follows the last fragment
+        datagram.size = last
+        holes = [(hole_first, min(hole_last, last)) for hole_first, hole_last in holes if hole_first < last]
+    datagram.holes = holes
+
+
+def _rebuild(datagram: Datagram) -> bytearray:
+    """returns the reassembled datagram: the header of the first fragment (its length, flags, offset
+    and checksum updated) followed by the data"""
+    raw = bytearray(datagram.header)
+    raw += datagram.data
+    length = len(raw)
+    raw[2:4] = length.to_bytes(2, "big")
+    # the datagram isn't a fragment anymore (the don't fragment flag is kept)
+    raw[6] &= 0x40
+    raw[7] = 0
+    raw[10:12] = b"\x00\x00"
+    raw[10:12] = ip_checksum(raw[: len(datagram.header)]).to_bytes(2, "big")
+    return raw
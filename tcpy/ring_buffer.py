@@ -0,0 +1,165 @@
+from typing import List
+
+from .ip_util import Buffer
+
+
+class RingBuffer:
+
+    """A fixed capacity byte queue stored in a circular bytearray (used for the send and receive
+    queues of the TCP connections)
+
+    Data is copied once when it's written, it's read through memoryviews over the storage
+    (see view), so segments can be sent without copying their payload. The storage is only
+    allocated when data is written and freed once the buffer is empty: idle connections don't use
+    memory for their queues.
+
+    Data can also be written ahead of the stored data (write_at) and added later (commit):
+    out of order segments are stored at their place in the receive buffer.
+    """
+
+    __slots__ = ("capacity", "_buf", "_view", "_start", "_len", "_ahead")
+
+    def __init__(self, capacity: int):
+        """creates a new RingBuffer
+
+        :capacity: maximum number of bytes stored
+
+        """
+        self.capacity = capacity
+        self._buf = bytearray()
+        self._view = memoryview(self._buf)
+        # offset of the first byte in the storage
+        self._start = 0
+        self._len = 0
+        # end of the data written ahead of the stored data (relative to its end)
+        self._ahead = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def free(self) -> int:
+        """returns the number of bytes that can be written"""
+        return self.capacity - self._len
+
+    def write(self, data: Buffer) -> int:
+        """appends data (up to the free space)
+
+        :data: the data to append
+        :returns: the number of bytes written
+
+        """
+        size = self.write_at(0, data)
+        self.commit(size)
+        return size
+
+    def write_at(self, offset: int, data: Buffer) -> int:
+        """writes data at offset after the end of the stored data (up to the capacity), it's not part
+        of the stored data until it's committed
+
+        :offset: offset from the end of the stored data
+        :data: the data to write
+        :returns: the number of bytes written
+
+        """
+        size = min(len(data), self.capacity - self._len - offset)
+        if size <= 0:
+            return 0
+
+        if not self._buf:
+            self._buf = bytearray(self.capacity)
+            self._view = memoryview(self._buf)
+
+        data = memoryview(data)
+        # the data is written in two parts when it wraps around the end of the storage
+        end = (self._start + self._len + offset) % self.capacity
+        first = min(size, self.capacity - end)
+        self._view[end : end + first] = data[:first]
+        if first < size:
+            self._view[: size - first] = data[first:size]
+
+        self._ahead = max(self._ahead, offset + size)
+        return size
+
+    def commit(self, size: int) -> None:
+        """appends size bytes written with write_at to the stored data
+
+        :size: number of bytes
+
+        """
+        size = min(size, self.capacity - self._len)
+        self._len += size
+        self._ahead = max(0, self._ahead - size)
+
+    def view(self, offset: int, size: int) -> memoryview:
+        """returns a view over the stored data starting at offset, it's shorter than size
+        if the data wraps around the end of the storage (call it again for the rest)
+        the view is valid until data is consumed and written again over it
+
+        :offset: offset in the stored data
+        :size: maximum size of the view
+        :returns: a memoryview (empty if there is no data at offset)
+
+        """
+        size = min(size, self._len - offset)
+        if size <= 0:
+            return self._view[:0]
+
+        start = (self._start + offset) % self.capacity
+        return self._view[start : start + min(size, self.capacity - start)]
+
+    def views(self, size: int) -> List[memoryview]:
+        """returns views over the first size bytes of the stored data
+
+        :size: maximum number of bytes
+        :returns: a list of one or two memoryviews (two if the data wraps around)
+
+        """
+        res: List[memoryview] = []
+        offset = 0
+        while offset < min(size, self._len):
+            part = self.view(offset, size - offset)
+            res.append(part)
+            offset += len(part)
+        return res
+
+    def consume(self, size: int) -> None:
+        """drops the first size bytes of the stored data
+
+        :size: number of bytes
+
+        """
+        size = min(size, self._len)
+        self._len -= size
+        if self._len or self._ahead:
+            self._start = (self._start + size) % self.capacity
+        elif self._buf:
+            # the storage of an empty buffer is freed (the views over it keep it alive while they are used),
+            # the next write allocates it again and starts from its beginning
+            self._start = 0
+            self._buf = bytearray()
+            self._view = memoryview(self._buf)
+
+    def read(self, size: int) -> bytes:
+        """reads and consumes the first size bytes of the stored data
+
+        :size: maximum number of bytes
+        :returns: the data
+
+        """
+        data = b"".join(self.views(size))
+        self.consume(len(data))
+        return data
+
+    def read_into(self, buffer: memoryview) -> int:
+        """reads and consumes the stored data into buffer
+
+        :buffer: a writable buffer
+        :returns: the number of bytes read
+
+        """
+        offset = 0
+        for part in self.views(len(buffer)):
+            buffer[offset : offset + len(part)] = part
+            offset += len(part)
+        self.consume(offset)
+        return offset
@@ -0,0 +1,117 @@
+import struct
+
+from .constants import ETH_P_IP, IP_TCP
+from .eth import ETH_HEADER_SIZE, EthernetHeader
+from .ip import IP_HEADER_SIZE, IPHeader
+from .ip_util import Buffer, pseudo_header_sum, sum_by_16bits
+from .tcp import TCP_HEADER_SIZE, TCPHeader
+from .tcp_options import TCPOptions
+
+# offsets of the IP and TCP headers in a frame
+IP_START = ETH_HEADER_SIZE
+TCP_START = ETH_HEADER_SIZE + IP_HEADER_SIZE
+
+_H = struct.Struct("!H")
+_HH = struct.Struct("!HH")
+# sequence number, acknowledgment number, header length, flags, window and checksum
+_TCP = struct.Struct("!IIBBHH")
+_II = struct.Struct("!II")
+
+
+class HeaderTemplate:
+
+    """The Ethernet, IP and TCP headers of the data segments of a connection, encoded once
+
+    The headers of a segment are a copy of the template in which only the sequence and acknowledgment
+    numbers, the flags, the window, the IP length and identification, the timestamps and the checksums
+    are patched: no header object is created and the payload (a view over the send buffer) is only
+    read to compute the TCP checksum. The sums of the constant fields are computed once, the patched
+    fields are added to them (a 32 bits field is congruent to the sum of its 16 bits words modulo 0xFFFF,
+    so the sums are only folded once).
+    """
+
+    __slots__ = ("raw", "version", "_hl", "_ip_sum", "_tcp_sum", "_ts")
+
+    def __init__(
+        self,
+        smac: bytes,
+        dmac: bytes,
+        saddr: int,
+        daddr: int,
+        sport: int,
+        dport: int,
+        timestamps: bool,
+        version: int,
+    ):
+        """creates a new HeaderTemplate
+
+        :smac: the source mac address
+        :dmac: the destination mac address
+        :saddr: the source address
+        :daddr: the destination address
+        :sport: the source port
+        :dport: the destination port
+        :timestamps: whether the segments carry the timestamps option
+        :version: version of the ARP table the destination mac address comes from
+
+        """
+        options = TCPOptions(timestamps=(0, 0)).encode() if timestamps else b""
+        tcp_hdr = TCPHeader(
+            src_port=sport,
+            dst_port=dport,
+            seq=0,
+            ack=0,
+            hl=(TCP_HEADER_SIZE + len(options)) // 4,
+            flags=0,
+            win_size=0,
+            csum=0,
+            uptr=0,
+            additional_fields=options,
+            payload=b"",
+        )
+        ip_hdr = IPHeader.build(saddr, daddr, IP_TCP, 0, 0)
+        # the patched fields are zero in the template
+        ip_hdr.len = ip_hdr._csum = 0
+        self.raw = EthernetHeader.spec.pack(dmac, smac, ETH_P_IP) + ip_hdr.encode() + tcp_hdr.encode()
+        self.version = version
+        self._hl = self.raw[TCP_START + 12]
+        # sums of the constant fields: the length, identification and checksum of the IP header are zero,
+        # so are the patched fields of the TCP header (the pseudo header is summed without the TCP length)
+        self._ip_sum = sum_by_16bits(self.raw[IP_START:TCP_START])
+        self._tcp_sum = pseudo_header_sum(saddr, daddr, IP_TCP, 0) + sum_by_16bits(self.raw[TCP_START:])
+        # offset of TSval in the frame (0 without timestamps)
+        self._ts = TCP_START + TCP_HEADER_SIZE + options.index(b"\x08\x0a") + 2 if timestamps else 0
+
+    def headers(
+        self, seq: int, ack: int, flags: int, wnd: int, ip_id: int, tsval: int, tsecr: int, payload: Buffer
+    ) -> bytearray:
+        """builds the headers of a segment (the frame is the headers followed by the payload)
+
+        :seq: the sequence number
+        :ack: the acknowledgment number
+        :flags: the TCP flags
+        :wnd: the window (already scaled)
+        :ip_id: the identification of the datagram
+        :tsval: the timestamp value (ignored without timestamps)
+        :tsecr: the timestamp echo reply (ignored without timestamps)
+        :payload: the payload of the segment
+        :returns: the Ethernet, IP and TCP headers
+
+        """
+        hdr = bytearray(self.raw)
+        tcp_len = len(hdr) - TCP_START + len(payload)
+        ip_len = IP_HEADER_SIZE + tcp_len
+        _HH.pack_into(hdr, IP_START + 2, ip_len, ip_id)
+        _H.pack_into(hdr, IP_START + 10, _checksum(self._ip_sum + ip_len + ip_id))
+
+        csum = self._tcp_sum + tcp_len + seq + ack + flags + wnd + sum_by_16bits(payload)
+        if self._ts:
+            _II.pack_into(hdr, self._ts, tsval, tsecr)
+            csum += tsval + tsecr
+        _TCP.pack_into(hdr, TCP_START + 4, seq, ack, self._hl, flags, wnd, _checksum(csum))
+        return hdr
+
+
+def _checksum(total: int) -> int:
+    """returns the checksum of data from the sum of its 16 bits words (or of fields congruent to it modulo 0xFFFF)"""
+    return (total % 0xFFFF or 0xFFFF) ^ 0xFFFF
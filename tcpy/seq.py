@@ -0,0 +1,170 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, Optional, Tuple
+
+SEQ_MOD = 1 << 32
+
+
+def seq_add(seq: int, n: int) -> int:
+    """adds n to a sequence number (modulo 2**32)"""
+    return (seq + n) % SEQ_MOD
+
+
+def seq_diff(a: int, b: int) -> int:
+    """returns a - b in sequence space (a signed distance, sequence numbers wrap around)"""
+    d = (a - b) % SEQ_MOD
+    return d - SEQ_MOD if d >= SEQ_MOD // 2 else d
+
+
+def seq_lt(a: int, b: int) -> bool:
+    """a < b in sequence space"""
+    return seq_diff(a, b) < 0
+
+
+def seq_le(a: int, b: int) -> bool:
+    """a <= b in sequence space"""
+    return seq_diff(a, b) <= 0
+
+
+class SeqRanges:
+
+    """A set of disjoint [start, end) ranges of sequence numbers (the out of order data of a connection,
+    the SACK scoreboard)
+
+    The ranges are sorted in two lists (their starts and their ends) searched with bisect: adding a range
+    (it's merged with the ranges it overlaps or touches), finding the range following a sequence number
+    and removing the ranges below a sequence number cost O(log n) comparisons. Sequence numbers wrap
+    around, so the lists hold positions (unbounded ints) relative to a reference sequence number that
+    follows the front of the ranges.
+    """
+
+    __slots__ = ("max_ranges", "size", "_starts", "_ends", "_head", "_ref_seq", "_ref_pos")
+
+    def __init__(self, max_ranges: int):
+        """creates an empty SeqRanges
+
+        :max_ranges: maximum number of ranges (the memory used is bounded), a range that
+        can't be merged is refused beyond it
+
+        """
+        self.max_ranges = max_ranges
+        # number of sequence numbers in the ranges
+        self.size = 0
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        # the ranges before _head were removed, they are deleted from the lists once they are half of them
+        self._head = 0
+        self._ref_seq = 0
+        self._ref_pos = 0
+
+    def __len__(self) -> int:
+        return len(self._starts) - self._head
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        for idx in range(self._head, len(self._starts)):
+            yield self._seq(self._starts[idx]), self._seq(self._ends[idx])
+
+    def __repr__(self) -> str:
+        return f"SeqRanges({list(self)})"
+
+    def add(self, start: int, end: int) -> bool:
+        """adds [start, end), it's merged with the ranges it overlaps or touches
+
+        :start: first sequence number of the range
+        :end: sequence number following the range
+        :returns: False if the range was refused (it's empty or there are already max_ranges ranges)
+
+        """
+        if not seq_lt(start, end):
+            return False
+        if not len(self):
+            self._rebase(start, 0)
+
+        lo, hi = self._pos(start), self._pos(end)
+        starts, ends = self._starts, self._ends
+        # the ranges from first to last (excluded) overlap or touch [lo, hi)
+        first = bisect_left(ends, lo, self._head)
+        last = bisect_right(starts, hi, first)
+        if first == last:
+            if len(self) >= self.max_ranges:
+                return False
+            starts.insert(first, lo)
+            ends.insert(first, hi)
+            self.size += hi - lo
+            return True
+
+        lo = min(lo, starts[first])
+        hi = max(hi, ends[last - 1])
+        self.size += hi - lo - sum(ends[idx] - starts[idx] for idx in range(first, last))
+        starts[first:last] = [lo]
+        ends[first:last] = [hi]
+        return True
+
+    def next_range(self, seq: int) -> Optional[Tuple[int, int]]:
+        """returns the first range ending after seq (it contains seq if it starts at or before it)
+
+        :seq: a sequence number
+        :returns: (start, end) or None
+
+        """
+        idx = bisect_right(self._ends, self._pos(seq), self._head)
+        if idx == len(self._starts):
+            return None
+        return self._seq(self._starts[idx]), self._seq(self._ends[idx])
+
+    def end(self) -> int:
+        """returns the end of the last range (the set must not be empty)"""
+        return self._seq(self._ends[-1])
+
+    def pop_front(self, seq: int) -> int:
+        """removes the ranges starting at or before seq (the data up to seq was received)
+
+        :seq: a sequence number
+        :returns: the end of the contiguous data from seq (seq if no range starts at or before it)
+
+        """
+        pos = self._pos(seq)
+        idx = bisect_right(self._starts, pos, self._head)
+        end = max(pos, self._ends[idx - 1]) if idx > self._head else pos
+        self._remove(idx)
+        end_seq = seq_add(seq, end - pos)
+        self._rebase(end_seq, end)
+        return end_seq
+
+    def trim(self, seq: int) -> None:
+        """removes the sequence numbers before seq (the range containing seq is cut)
+
+        :seq: a sequence number
+
+        """
+        pos = self._pos(seq)
+        idx = bisect_right(self._ends, pos, self._head)
+        self._remove(idx)
+        if self._head < len(self._starts) and self._starts[self._head] < pos:
+            self.size -= pos - self._starts[self._head]
+            self._starts[self._head] = pos
+        self._rebase(seq, pos)
+
+    def _remove(self, idx: int) -> None:
+        """removes the ranges before idx"""
+        starts, ends = self._starts, self._ends
+        self.size -= sum(ends[pos] - starts[pos] for pos in range(self._head, idx))
+        self._head = idx
+        if 2 * idx >= len(starts):
+            del starts[:idx]
+            del ends[:idx]
+            self._head = 0
+
+    def _rebase(self, seq: int, pos: int) -> None:
+        """moves the reference to the front of the ranges (to seq at position pos if there are none),
+        it stays close to the ranges so the distances in sequence space are valid"""
+        if self._head < len(self._starts):
+            pos = self._starts[self._head]
+            seq = self._seq(pos)
+        self._ref_seq = seq
+        self._ref_pos = pos
+
+    def _pos(self, seq: int) -> int:
+        return self._ref_pos + seq_diff(seq, self._ref_seq)
+
+    def _seq(self, pos: int) -> int:
+        return seq_add(self._ref_seq, pos - self._ref_pos)
@@ -0,0 +1,391 @@
+import asyncio
+import errno
+import os
+from typing import Callable, Optional, Tuple, TypeVar
+
+from .async_stack import AsyncStack
+from .congestion import congestion_control
+from .ip_util import Buffer, int2ip
+from .stack import Stack
+from .tcb import DEFAULT_BACKLOG, TCB, Listener, TCPInfo, TCPState
+
+T = TypeVar("T")
+
+Address = Tuple[str, int]
+
+
+class Socket:
+
+    """A BSD style TCP socket on top of a Stack
+
+    Blocking sockets wait on the stack condition (stack.cond) for the stack to process the
+    segments they're waiting for, the stack must run in another thread (see Stack.start_thread).
+    Non blocking sockets raise BlockingIOError instead, fileno() returns a fd that is readable
+    when accept or recv wouldn't block (or when a connection in progress is established or refused)
+    so they can be used with select / epoll.
+
+    usage:
+
+        stack.start_thread()
+        with Socket(stack) as server:
+            server.bind(("", 8080))
+            server.listen()
+            conn, addr = server.accept()
+            conn.sendall(conn.recv(1024))
+    """
+
+    def __init__(self, stack: Stack, blocking: bool = True):
+        """creates a new Socket
+
+        :stack: the stack running the connections
+        :blocking: whether the calls block (or raise BlockingIOError)
+
+        """
+        self._stack = stack
+        self._blocking = blocking
+        self._port: Optional[int] = None
+        self._listener: Optional[Listener] = None
+        self._tcb: Optional[TCB] = None
+        self._connecting = False
+        self._congestion: Optional[str] = None
+        # pipe signaling the readiness of the socket, created by fileno
+        self._pipe: Optional[Tuple[int, int]] = None
+        self._signaled = False
+
+    def setblocking(self, blocking: bool) -> None:
+        """sets the blocking mode of the socket
+
+        :blocking: whether the calls block (or raise BlockingIOError)
+
+        """
+        self._blocking = blocking
+
+    def set_congestion(self, congestion: str) -> None:
+        """sets the congestion control of the connection (of the accepted connections for a listening socket),
+        like the TCP_CONGESTION socket option
+
+        :congestion: name of the congestion control (reno, newreno or cubic)
+
+        """
+        congestion_control(congestion)
+        with self._stack.lock:
+            self._congestion = congestion
+            if self._listener is not None:
+                self._listener.congestion = congestion
+            if self._tcb is not None:
+                self._stack.tcp.set_congestion(self._tcb, congestion)
+
+    def info(self) -> TCPInfo:
+        """returns the state of the connection: round trip time estimates, congestion window, ...
+        (like the TCP_INFO socket option)"""
+        with self._stack.lock:
+            return self._connection().info()
+
+    def fileno(self) -> int:
+        """returns a fd readable when the socket is ready (accept or recv won't block, a connection in
+        progress is established or refused)"""
+        with self._stack.lock:
+            if self._pipe is None:
+                self._pipe = os.pipe()
+                for fd in self._pipe:
+                    os.set_blocking(fd, False)
+                self._update_fd()
+
+            return self._pipe[0]
+
+    def bind(self, address: Address) -> None:
+        """binds the socket to a local port
+
+        :address: (address, port), the address must be empty or the stack address
+
+        """
+        addr, port = address
+        if addr not in ("", self._stack._ip):
+            raise OSError(errno.EADDRNOTAVAIL, f"Cannot bind to {addr}")
+        self._port = port
+
+    def listen(self, backlog: int = DEFAULT_BACKLOG) -> None:
+        """listens for connections on the bound port
+
+        :backlog: maximum number of established connections waiting to be accepted
+
+        """
+        if self._port is None:
+            raise OSError(errno.EDESTADDRREQ, "Socket is not bound")
+
+        with self._stack.lock:
+            self._listener = self._stack.listen(self._port, backlog)
+            self._listener.waiter = self._wakeup
+            self._listener.congestion = self._congestion
+
+    def accept(self) -> Tuple["Socket", Address]:
+        """accepts a connection
+
+        :returns: (socket of the connection, (remote address, remote port))
+
+        """
+        with self._stack.lock:
+            if self._listener is None:
+                raise OSError(errno.EINVAL, "Socket is not listening")
+
+            listener = self._listener
+            self._wait(lambda: bool(listener.accept_queue))
+            tcb = self._stack.tcp.accept(listener)
+            assert tcb is not None
+
+            sock = self._new()
+            sock._tcb = tcb
+            tcb.waiter = sock._wakeup
+            self._update_fd()
+            return sock, (int2ip(tcb.raddr), tcb.rport)
+
+    def connect(self, address: Address) -> None:
+        """connects to a remote port, a non blocking socket raises BlockingIOError until the
+        connection is established (the fd is readable once it is)
+
+        :address: (remote address, remote port)
+
+        """
+        with self._stack.lock:
+            if self._tcb is None:
+                self._tcb = self._stack.connect(*address, congestion=self._congestion)
+                self._tcb.waiter = self._wakeup
+                self._connecting = True
+                self._stack.flush()
+
+            tcb = self._tcb
+            self._wait(lambda: tcb.state != TCPState.SYN_SENT)
+            self._connecting = False
+            self._update_fd()
+
+            if tcb.state == TCPState.CLOSED:
+                raise ConnectionRefusedError(errno.ECONNREFUSED, f"Connection to {address[0]}:{address[1]} refused")
+
+    def recv(self, size: int) -> bytes:
+        """reads received data
+
+        :size: maximum number of bytes to read
+        :returns: the data, empty once the peer closed the connection
+
+        """
+        with self._stack.lock:
+            data = self._stack.tcp.recv(self._readable(), size)
+            self._stack.flush()
+            self._update_fd()
+            return data
+
+    def recv_into(self, buffer: memoryview) -> int:
+        """reads received data into a buffer (the data is only copied from the receive buffer)
+
+        :buffer: a writable buffer
+        :returns: the number of bytes read, 0 once the peer closed the connection
+
+        """
+        with self._stack.lock:
+            size = self._stack.tcp.recv_into(self._readable(), buffer)
+            self._stack.flush()
+            self._update_fd()
+            return size
+
+    def send(self, data: Buffer) -> int:
+        """sends data
+
+        :data: the data to send
+        :returns: the number of bytes sent (queued in the send buffer)
+
+        """
+        with self._stack.lock:
+            tcb = self._connection()
+            while True:
+                if tcb.reset:
+                    raise ConnectionResetError(errno.ECONNRESET, "Connection reset by peer")
+
+                try:
+                    sent = self._stack.tcp.send(tcb, data)
+                except ConnectionError as e:
+                    raise BrokenPipeError(errno.EPIPE, str(e)) from e
+
+                if sent or not data:
+                    self._stack.flush()
+                    return sent
+                # the send buffer is full
+                self._block()
+
+    def sendall(self, data: Buffer) -> None:
+        """sends all the data (blocks until it's queued in the send buffer)
+
+        :data: the data to send
+
+        """
+        view = memoryview(data)
+        while view:
+            view = view[self.send(view) :]
+
+    def close(self) -> None:
+        """closes the socket: the connection is closed once the queued data was sent,
+        or the socket stops listening"""
+        with self._stack.lock:
+            if self._listener is not None:
+                self._listener.waiter = None
+                self._stack.tcp.close_listener(self._listener)
+                self._listener = None
+
+            if self._tcb is not None:
+                self._tcb.waiter = None
+                self._stack.tcp.close(self._tcb)
+                self._tcb = None
+
+            self._stack.flush()
+
+            if self._pipe is not None:
+                for fd in self._pipe:
+                    os.close(fd)
+                self._pipe = None
+
+    def _new(self) -> "Socket":
+        """creates the socket of an accepted connection"""
+        return Socket(self._stack, self._blocking)
+
+    def _connection(self) -> TCB:
+        if self._tcb is None:
+            raise OSError(errno.ENOTCONN, "Socket is not connected")
+        return self._tcb
+
+    def _readable(self) -> TCB:
+        """waits until there is something to read on the connection"""
+        tcb = self._connection()
+        self._wait(lambda: bool(tcb.rcv_buf) or tcb.fin_received or tcb.state == TCPState.CLOSED)
+        if not tcb.rcv_buf and tcb.reset:
+            raise ConnectionResetError(errno.ECONNRESET, "Connection reset by peer")
+        return tcb
+
+    def _wait(self, ready: Callable[[], bool]) -> None:
+        """waits until ready returns True (the stack lock is held)"""
+        while not ready():
+            self._block()
+
+    def _block(self) -> None:
+        if not self._blocking:
+            raise BlockingIOError(errno.EAGAIN, "Operation would block")
+        self._stack.cond.wait()
+
+    def _wakeup(self) -> None:
+        """waiter of the listener / TCB, called by the stack when something changes"""
+        self._stack.cond.notify_all()
+        self._update_fd()
+
+    def _ready(self) -> bool:
+        if self._listener is not None:
+            return bool(self._listener.accept_queue)
+
+        tcb = self._tcb
+        if tcb is None:
+            return False
+        if self._connecting:
+            return tcb.state != TCPState.SYN_SENT
+        return bool(tcb.rcv_buf) or tcb.fin_received or tcb.state == TCPState.CLOSED
+
+    def _update_fd(self) -> None:
+        """makes the fd readable if the socket is ready, not readable otherwise"""
+        if self._pipe is None:
+            return
+
+        ready = self._ready()
+        if ready and not self._signaled:
+            os.write(self._pipe[1], b"\x00")
+        elif not ready and self._signaled:
+            os.read(self._pipe[0], 1)
+        self._signaled = ready
+
+    def __enter__(self) -> "Socket":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+class AsyncSocket(Socket):
+
+    """A TCP socket for an AsyncStack: the calls are coroutines waiting for the stack (running
+    on the same event loop) to process the segments they're waiting for
+
+    usage:
+
+        async with AsyncStack() as stack:
+            sock = AsyncSocket(stack)
+            await sock.connect(("10.0.0.1", 80))
+            await sock.sendall(b"GET / HTTP/1.0\\r\\n\\r\\n")
+            print(await sock.recv(4096))
+    """
+
+    def __init__(self, stack: AsyncStack):
+        """creates a new AsyncSocket
+
+        :stack: the stack running the connections
+
+        """
+        super().__init__(stack, blocking=False)
+        self._event = asyncio.Event()
+
+    async def accept(self) -> Tuple["AsyncSocket", Address]:  # type: ignore
+        """accepts a connection
+
+        :returns: (socket of the connection, (remote address, remote port))
+
+        """
+        sock, addr = await self._retry(super().accept)
+        assert isinstance(sock, AsyncSocket)
+        return sock, addr
+
+    async def connect(self, address: Address) -> None:  # type: ignore
+        """connects to a remote port
+
+        :address: (remote address, remote port)
+
+        """
+        await self._retry(lambda: super(AsyncSocket, self).connect(address))
+
+    async def recv(self, size: int) -> bytes:  # type: ignore
+        """reads received data
+
+        :size: maximum number of bytes to read
+        :returns: the data, empty once the peer closed the connection
+
+        """
+        return await self._retry(lambda: super(AsyncSocket, self).recv(size))
+
+    async def send(self, data: Buffer) -> int:  # type: ignore
+        """sends data
+
+        :data: the data to send
+        :returns: the number of bytes sent (queued in the send buffer)
+
+        """
+        return await self._retry(lambda: super(AsyncSocket, self).send(data))
+
+    async def sendall(self, data: Buffer) -> None:  # type: ignore
+        """sends all the data
+
+        :data: the data to send
+
+        """
+        view = memoryview(data)
+        while view:
+            view = view[await self.send(view) :]
+
+    def _new(self) -> "AsyncSocket":
+        assert isinstance(self._stack, AsyncStack)
+        return AsyncSocket(self._stack)
+
+    def _wakeup(self) -> None:
+        super()._wakeup()
+        self._event.set()
+
+    async def _retry(self, call: Callable[[], T]) -> T:
+        """calls call until it doesn't raise BlockingIOError, waiting for the stack in between"""
+        while True:
+            try:
+                return call()
+            except BlockingIOError:
+                self._event.clear()
+                await self._event.wait()
@@ -1,16 +1,54 @@
+import ctypes
+import logging
+import multiprocessing
 import os
-import socket
-from multiprocessing import Process
-from typing import Optional
+import select
+import struct
+import threading
+import time
+from multiprocessing import Process, Queue
+from multiprocessing.process import BaseProcess
+from multiprocessing.sharedctypes import RawArray
+from typing import Dict, List, Optional, Tuple
 
 from .arp import mac2b
-from .arp_table import ARPTable
-from .constants import ETH_P_IP, ICMP, IP_TCP
-from .eth import EthernetHeader
+from .arp_table import ARPReplica, ARPTable
+from .buffer_pool import BufferPool
+from .congestion import DEFAULT_CONGESTION_CONTROL
+from .constants import (
+    DEFAULT_MTU,
+    ETH_P_IP,
+    ICMP,
+    ICMP_V4_DST_UNREACHABLE,
+    ICMP_V4_ECHO,
+    ICMP_V4_FRAG_NEEDED,
+    IP_DF,
+    IP_TCP,
+)
+from .eth import ETH_HEADER_SIZE, EthernetHeader
+from .header import check_size
 from .icmpv4 import ICMPv4Header
-from .ip import IPHeader
-from .tcp import TCPHeader
-from .tuntap import open_tun
+from .ip import IP_HEADER_SIZE, MIN_MTU, IPHeader, check_checksum, fragment
+from .ip_util import Buffer, int2ip, ip2int
+from .netdev import NetDevice, TapDevice
+from .pmtu import PMTUCache
+from .reassembly import Reassembler
+from .segmenter import HeaderTemplate
+from .tcb import DEFAULT_BACKLOG, DEFAULT_BUFFER_SIZE, DEFAULT_SYN_BACKLOG, TCB, Listener
+from .tcp import TCP_HEADER_SIZE, TCPHeader
+from .tcp_engine import DELAYED_ACK_TIMEOUT, TCPEngine
+from .tx_queue import TXQueue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 64
+# maximum number of datagrams waiting for the resolution of a mac address (per destination)
+ARP_PENDING_MAX = 16
+# range of the local ports of the connections opened by the stack (IANA dynamic ports)
+EPHEMERAL_PORTS = (49152, 65536)
+
+# ports and sequence number of a TCP segment
+_PORTS_SEQ = struct.Struct("!HHI")
 
 
 def to_run(name: str) -> str:
@@ -26,79 +64,450 @@ class Stack:
         ip: str = "10.0.0.4",
         mac: str = "aa:bb:cc:dd:ee:ff",
         interf: str = "tap%d",
+        mtu: Optional[int] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        queues: int = 1,
+        device: Optional[NetDevice] = None,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        congestion: str = DEFAULT_CONGESTION_CONTROL,
+        delayed_ack: float = DELAYED_ACK_TIMEOUT,
+        sack: bool = True,
+        timestamps: bool = True,
     ):
         """creates a TCP/IP Stack
 
         :ip: ip to use
         :mac: mac address to use
         :interf: name for the tun/tap interface
+        :mtu: MTU to set on the interface (jumbo frames are supported), defaults to the interface MTU
+        :batch_size: maximum number of frames read (and then handled) per wakeup of the RX loop
+        :queues: number of queues of the interface (IFF_MULTI_QUEUE), start runs one worker process per queue
+        :device: the device to use (for instance an in-memory one), defaults to a tap interface opened
+        when the stack is started
+        :buffer_size: capacity of the send and receive buffers of every TCP connection in bytes
+        :congestion: congestion control of the TCP connections (reno, newreno or cubic), it can be changed
+        per socket
+        :delayed_ack: maximum delay of the TCP ACKs in seconds (0 disables the delayed ACKs)
+        :sack: whether the TCP connections use selective acknowledgments (if the peer supports them)
+        :timestamps: whether the TCP connections use timestamps (if the peer supports them)
 
         """
 
+        if mtu is not None and mtu < MIN_MTU:
+            raise ValueError(f"Invalid MTU: {mtu} (the minimum is {MIN_MTU})")
+
         self._ip = ip
         self._mac = mac
         self._interf = interf
-        self.proc: Optional[Process] = None
-        self.fd = 0
+        self._mtu = mtu
+        self._batch_size = batch_size
+        self._queues = queues
+        self.workers: List[BaseProcess] = []
+        # frames received by each worker (shared with the worker processes)
+        self.counters: Optional["ctypes.Array[ctypes.c_uint64]"] = None
+        self._worker = 0
+        self.device = device
         self.table = ARPTable(self._ip, self._mac)
+        self._pool: Optional[BufferPool] = None
+        self.tx = TXQueue()
+        self.rx_frames = 0
+        # frames dropped because they were invalid or of an unsupported protocol
+        self.rx_dropped = 0
+        # errors reading from the device and end of file of the device (the other end was closed, the RX
+        # loop doesn't poll it anymore)
+        self.rx_errors = 0
+        self.device_eof = False
+        # datagrams dropped because they were bigger than the path MTU and couldn't be fragmented
+        self.tx_dropped = 0
+        # path MTU of the destinations (RFC 1191)
+        self.pmtu = PMTUCache()
+        self.tcp = TCPEngine(
+            self._tcp_output,
+            buffer_size=buffer_size,
+            mss=self.tcp_mss(),
+            congestion=congestion,
+            delayed_ack=delayed_ack,
+            sack=sack,
+            timestamps=timestamps,
+            data_output=self._tcp_data_output,
+            path_mtu=self.path_mtu,
+        )
+        # fragmented datagrams being reassembled (their timeouts run on the timer wheel of the engine)
+        self.reassembly = Reassembler(self.tcp.timers)
+        self._ip_id = 0
+        self._next_port = EPHEMERAL_PORTS[0]
+        # datagrams waiting for an ARP reply (keyed by destination address)
+        self._arp_pending: Dict[int, List[List[Buffer]]] = {}
+        # the stack state is protected by the lock when the stack runs in a thread (see start_thread),
+        # threads wait for events (data received, connection established, ...) with cond
+        self.lock = threading.RLock()
+        self.cond = threading.Condition(self.lock)
+        self._thread: Optional[threading.Thread] = None
+        # pipe waking up the RX loop of the thread (to stop it or when a timer is armed before its poll timeout)
+        self._wakeup_w: Optional[int] = None
+        self._stopping = False
+        # time at which the poll of the RX loop times out
+        self._poll_deadline = float("inf")
+
+    def listen(self, port: int, backlog: int = DEFAULT_BACKLOG, syn_backlog: int = DEFAULT_SYN_BACKLOG) -> Listener:
+        """listens for TCP connections on the given port (connections are accepted with self.tcp.accept)
+
+        :port: the local port
+        :backlog: maximum number of established connections waiting to be accepted
+        :syn_backlog: maximum number of half-open connections (see TCPEngine.listen)
+        :returns: a Listener
+
+        """
+        return self.tcp.listen(ip2int(self._ip), port, backlog, syn_backlog)
+
+    def connect(self, addr: str, port: int, congestion: Optional[str] = None) -> TCB:
+        """opens a TCP connection from an ephemeral port
+
+        :addr: the remote address
+        :port: the remote port
+        :congestion: congestion control of the connection (the stack default if None)
+        :returns: the TCB of the connection (in SYN_SENT)
+
+        """
+        laddr, raddr = ip2int(self._ip), ip2int(addr)
+        for _ in range(EPHEMERAL_PORTS[1] - EPHEMERAL_PORTS[0]):
+            lport = self._next_port
+            self._next_port = lport + 1 if lport + 1 < EPHEMERAL_PORTS[1] else EPHEMERAL_PORTS[0]
+            if self.tcp.table.get((raddr, port, laddr, lport)) is None and self.tcp.table.listener(laddr, lport) is None:
+                return self.tcp.connect(laddr, lport, raddr, port, congestion)
+
+        raise OSError(f"No ephemeral port available to connect to {addr}:{port}")
 
     def start(self) -> None:
-        """starts the stack in a separate process """
-        self.proc = Process(target=self.start_in_fg)
-        self.proc.start()
+        """starts the stack in separate processes (one worker per queue of the interface)"""
+        if self._queues == 1:
+            self.workers = [Process(target=self.start_in_fg)]
+            self.workers[0].start()
+            return
+
+        queues = self.open_queues()
+        self.start_workers(queues)
+        # The workers have their own copy of the queues
+        for queue in queues:
+            queue.close()
+
+    def start_workers(self, devices: List[NetDevice]) -> None:
+        """starts one worker process per device (queue), every worker has its own ARP table replica,
+        buffers and TX queue (the devices can be closed in the current process once the workers are started)
+
+        :devices: the devices (queues) handled by the workers
+
+        """
+        # Workers inherit the devices fds, they have to be forked
+        ctx = multiprocessing.get_context("fork")
+        arp_queues: List["Queue[Tuple[int, str, bytes]]"] = [ctx.Queue() for _ in devices]
+        self.counters = RawArray(ctypes.c_uint64, len(devices))
+        arp_versions = RawArray(ctypes.c_uint64, len(devices))
+
+        self.workers = [
+            ctx.Process(target=self._run_worker, args=(idx, device, arp_queues, arp_versions), daemon=True)
+            for idx, device in enumerate(devices)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def _run_worker(
+        self,
+        idx: int,
+        device: NetDevice,
+        arp_queues: List["Queue[Tuple[int, str, bytes]]"],
+        arp_versions: "ctypes.Array[ctypes.c_uint64]",
+    ) -> None:
+        """runs the RX loop of a worker (in the worker process)
+
+        :idx: index of the worker
+        :device: the device (queue) handled by the worker
+        :arp_queues: queues used to replicate the ARP table
+        :arp_versions: number of ARP entries published by each worker
+
+        """
+        self._worker = idx
+        self.device = device
+        # Entries inserted before starting the workers are kept
+        self.table = ARPReplica.from_table(self.table, idx, arp_queues, arp_versions)
+        self.run()
+
+    def start_thread(self) -> None:
+        """starts the stack in a thread of the current process (used by the socket API, see tcpy.socket),
+        the tap interface is opened if there is no device"""
+        if self.device is None:
+            self.open_interface()
+
+        wakeup_r, self._wakeup_w = os.pipe()
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run, args=(wakeup_r,), daemon=True)
+        self._thread.start()
 
     def stop(self) -> None:
-        """stops the stack if it was started in a separate process
+        """stops the stack if it was started in separate processes or in a thread
 
         throws an exception if it was not started
         """
-        if self.proc is None:
+        if self._thread is not None and self._wakeup_w is not None:
+            self._stopping = True
+            os.write(self._wakeup_w, b"\x00")
+            self._thread.join()
+            os.close(self._wakeup_w)
+            self._thread, self._wakeup_w = None, None
+            return
+
+        if not self.workers:
             raise ValueError("Network stack was not started in a separate process")
 
-        self.proc.terminate()
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def worker_counters(self) -> List[int]:
+        """returns the number of frames received by each worker (started with start_workers)"""
+        return list(self.counters) if self.counters is not None else []
 
     def start_in_fg(self) -> None:
-        """starts the stack on the foreground"""
-        (self.fd, (name, mode)) = open_tun(self._interf)
+        """starts the stack on the foreground (the tap interface is opened if there is no device)"""
+        if self.device is None:
+            self.open_interface()
+        self.run()
+
+    def open_interface(self) -> None:
+        """opens the tun/tap interface (self.device) and sets or reads its MTU"""
+        self.device = TapDevice.open(self._interf)
+        self._setup_interface(self.device)
+
+    def open_queues(self) -> List[NetDevice]:
+        """opens the queues of the multi queue tun/tap interface and sets or reads its MTU
+
+        :returns: one device per queue
+
+        """
+        queues = TapDevice.open_queues(self._interf, self._queues)
+        self._setup_interface(queues[0])
+        return list(queues)
+
+    def _setup_interface(self, tap: TapDevice) -> None:
+        mtu = tap.configure_mtu(self._mtu)
+        if mtu < MIN_MTU:
+            raise ValueError(f"Invalid MTU of {tap.name}: {mtu} (the minimum is {MIN_MTU})")
+        self._mtu = mtu
+        self.tcp.mss = self.tcp_mss()
+
+        print("Name: {name}".format(name=tap.name))
+        print(f"Please run:\n{to_run(tap.name)}")
+
+    def _device(self) -> NetDevice:
+        if self.device is None:
+            raise ValueError("Network stack doesn't have a device")
+
+        return self.device
+
+    def run(self, wakeup_fd: Optional[int] = None) -> None:
+        """runs the RX loop on the device: its fd is polled with epoll,
+        every wakeup drains up to batch_size frames that are then handled as a batch,
+        the poll times out when the next TCP timer expires, the loop returns once the device is closed
+        (in a thread it keeps running the timers until stop is called)
+
+        :wakeup_fd: fd waking up the loop when it's readable, the loop stops if stop was called
+
+        """
+        device_fd = self._device().fileno()
+        with select.epoll() as poller:
+            poller.register(device_fd, select.EPOLLIN)
+            if wakeup_fd is not None:
+                poller.register(wakeup_fd, select.EPOLLIN)
+
+            while True:
+                with self.lock:
+                    timeout = self.tcp.timers.timeout()
+                    self._poll_deadline = float("inf") if timeout is None else time.monotonic() + timeout
+
+                events = poller.poll(-1 if timeout is None else timeout)
+                for fd, _ in events:
+                    if fd == wakeup_fd:
+                        os.read(fd, 4096)
+                        if self._stopping:
+                            os.close(fd)
+                            return
+                    elif fd == device_fd:
+                        self.rx_batch()
+                        if self.device_eof:
+                            # a closed device stays readable, the loop would spin on it
+                            poller.unregister(device_fd)
+                            if wakeup_fd is None:
+                                return
+                self.run_timers()
+
+    def run_timers(self) -> int:
+        """runs the expired timers (TCP retransmissions, TIME_WAIT, reassembly timeouts, ...) and writes the
+        segments they sent
+
+        :returns: the number of expired timers
+
+        """
+        with self.lock:
+            count = self.tcp.timers.advance()
+            if count:
+                self.tx.flush(self._device())
+            self._schedule_timers()
+            return count
+
+    def _schedule_timers(self) -> None:
+        """called when timers may have been armed: the RX loop running in a thread is woken up
+        if the next timer expires before its poll times out"""
+        if self._wakeup_w is None or threading.current_thread() is self._thread:
+            return
+
+        timeout = self.tcp.timers.timeout()
+        if timeout is not None and time.monotonic() + timeout < self._poll_deadline:
+            # the loop computes its timeout again once it's woken up
+            self._poll_deadline = float("-inf")
+            os.write(self._wakeup_w, b"\x00")
+
+    def mtu(self) -> int:
+        """returns the MTU of the interface"""
+        return self._mtu or DEFAULT_MTU
+
+    def path_mtu(self, daddr: int) -> int:
+        """returns the MTU of the path to a destination (the MTU of the interface or less, see tcpy.pmtu)
+
+        :daddr: the destination address
+
+        """
+        return self.pmtu.get(daddr, self.mtu())
+
+    def tcp_mss(self) -> int:
+        """returns the maximum TCP segment size advertised by the stack (depends on the MTU)"""
+        return self.mtu() - IP_HEADER_SIZE - TCP_HEADER_SIZE
 
-        print("Name: {name}".format(name=name))
-        print(f"Please run:\n{to_run(name)}")
+    def frame_size(self) -> int:
+        """returns the maximum size of a frame received on the interface (depends on the MTU)"""
+        return ETH_HEADER_SIZE + self.mtu()
 
-        while True:
-            # TODO make this number configurable
-            raw = os.read(self.fd, 200)
-            # hex_debug(raw, desc="input")
-            eth = EthernetHeader.decode(raw)
+    def rx_batch(self) -> int:
+        """reads up to batch_size frames (without blocking) and handles them
+
+        frames are read in place in buffers of a preallocated pool, the buffers are given
+        back to the pool once the whole batch is handled (so the steady state doesn't allocate
+        frame buffers), replies are queued and written at the end of the batch (they may
+        reference the received frames)
+
+        :returns: the number of frames read
+
+        """
+        with self.lock:
+            count = self._rx_batch()
+            self._schedule_timers()
+            return count
+
+    def _rx_batch(self) -> int:
+        if self._pool is None or self._pool.size != self.frame_size():
+            self._pool = BufferPool(self._batch_size, self.frame_size())
+
+        pool, device = self._pool, self._device()
+        bufs: List[memoryview] = []
+        frames: List[memoryview] = []
+
+        try:
+            for _ in range(self._batch_size):
+                buf = pool.acquire()
+                bufs.append(buf)
+                try:
+                    size = device.recv_into(buf)
+                except BlockingIOError:
+                    break
+                except OSError as e:
+                    self.rx_errors += 1
+                    logger.warning("Error reading from the device: %s", e)
+                    break
+
+                if size == 0:
+                    # end of file: the other end of the device was closed
+                    self.device_eof = True
+                    break
+                frames.append(buf[:size])
+
+            self.rx_frames += len(frames)
+            if self.counters is not None:
+                self.counters[self._worker] = self.rx_frames
+
+            # the segments of a connection in the batch are acknowledged by a single ACK
+            self.tcp.start_batch()
+            try:
+                for raw in frames:
+                    self._handle_frame(raw)
+            finally:
+                self.tcp.end_batch()
+                self.tx.flush(device)
+        finally:
+            for buf in bufs:
+                pool.release(buf)
+
+        return len(frames)
+
+    def _handle_frame(self, raw: Buffer) -> None:
+        """handles a frame received on the interface
+
+        :raw: the raw frame
+        """
+        try:
+            eth = EthernetHeader.decode(raw, lazy=True)
 
             if eth.is_arp():
                 self._handle_arp(eth)
             elif eth.is_ip():
                 self._handle_ip(eth)
             else:
-                print(f"Unknown header type: {eth}, type: {eth.typ}")
+                self.rx_dropped += 1
+                logger.debug("Dropping frame of unknown type: %#06x", eth.typ)
+        except (ValueError, struct.error) as e:
+            # Invalid frames (truncated, bad checksums, etc.) are dropped
+            self.rx_dropped += 1
+            logger.warning("Dropping frame: %s", e)
 
     def _handle_arp(self, eth: EthernetHeader) -> None:
         """handles an ARP message
 
         :eth: an EthernetHeader instance
         """
-        print("ARP Header")
+        logger.debug("ARP Header")
         resp = self.table.process_arp(eth)
         if resp is not None:
-            os.write(self.fd, resp.encode())
+            self._write([resp.encode()])
+
+        # sends the datagrams that were waiting for this mac address
+        for daddr in [daddr for daddr in self._arp_pending if self.table.get_mac_for_ip(daddr) is not None]:
+            for payload in self._arp_pending.pop(daddr):
+                self.ip_output(daddr, payload)
 
     def _handle_ip(self, eth: EthernetHeader) -> None:
         """handles an IP message
 
         :eth: an EthernetHeader instance
         """
-        ip_hdr = IPHeader.decode(eth.payload)
+        # Lazy decoding, dispatching on the protocol only reads one byte
+        ip_hdr = IPHeader.decode(eth.payload, lazy=True)
+        if not ip_hdr.is_icmp() and not ip_hdr.is_tcp():
+            self.rx_dropped += 1
+            logger.debug("Dropping datagram of unknown protocol: %d", ip_hdr.proto)
+            return
+
+        # the checksum is only verified for the datagrams that are handled
+        check_checksum(eth.payload)
+        if ip_hdr.is_fragment():
+            datagram = self.reassembly.add(eth.payload)
+            if datagram is None:
+                return
+            ip_hdr = IPHeader.decode(datagram, lazy=True)
+
         if ip_hdr.is_icmp():
             self._handle_icmp(eth, ip_hdr)
-        elif ip_hdr.is_tcp():
-            self._handle_tcp(eth, ip_hdr)
         else:
-            print(f"Unknown IP/? Header, protocol: {ip_hdr.proto}")
+            self._handle_tcp(eth, ip_hdr)
 
     def _handle_icmp(self, eth: EthernetHeader, ip_hdr: IPHeader) -> None:
         """handles an ICMP message
@@ -106,13 +515,46 @@ class Stack:
         :eth: an EthernetHeader instance
         :ip_hdr: an IPHeader instance
         """
-        print("ICMP Header")
+        logger.debug("ICMP Header")
 
         icmp_hdr = ICMPv4Header.decode(ip_hdr.payload)
-        icmp_r = icmp_hdr.reply()
-        ip_r = ip_hdr.reply(self._ip, icmp_r.encode(), ICMP)
+        if icmp_hdr._typ == ICMP_V4_ECHO:
+            # The echoed data is a view over the received frame, it's not copied
+            payload = icmp_hdr.reply().segments()
+            # the reply is as big as the request (which may have been fragmented), it can be fragmented
+            ip_r = ip_hdr.reply_header(self._ip, sum(len(segment) for segment in payload), ICMP, flags=0)
+            self.ip_output(ip_hdr.saddr, [ip_r.encode(), *payload])
+        elif icmp_hdr._typ == ICMP_V4_DST_UNREACHABLE and icmp_hdr._code == ICMP_V4_FRAG_NEEDED:
+            self._frag_needed(icmp_hdr._data)
+        else:
+            self.rx_dropped += 1
+            logger.debug("Dropping ICMP message of unsupported type: %d", icmp_hdr._typ)
 
-        self.ip_output(ip_hdr.saddr, ip_r.encode())
+    def _frag_needed(self, data: Buffer) -> None:
+        """handles an ICMP fragmentation needed message (RFC 1191): the path MTU to the destination of the
+        quoted datagram is lowered, its TCP connection sends smaller segments
+
+        :data: the data of the message: 2 unused bytes, the MTU of the next hop and the header of the datagram
+        followed by its first 8 bytes
+
+        """
+        check_size(data, 4 + IP_HEADER_SIZE, "ICMP fragmentation needed")
+        quoted = IPHeader.decode(data[4:], lazy=True)
+        start = 4 + 4 * quoted._ihl
+        check_size(data, start + 8, "ICMP fragmentation needed")
+        if quoted.saddr != ip2int(self._ip):
+            return
+
+        tcb = None
+        if quoted.proto == IP_TCP:
+            sport, dport, seq = _PORTS_SEQ.unpack_from(data, start)
+            tcb = self.tcp.table.get((quoted.daddr, dport, quoted.saddr, sport))
+            if tcb is None or not self.tcp.in_flight(tcb, seq):
+                return
+
+        self.pmtu.update(quoted.daddr, data[2] << 8 | data[3], quoted.len)
+        if tcb is not None:
+            self.tcp.mtu_reduced(tcb, self.path_mtu(quoted.daddr))
 
     def _handle_tcp(self, eth: EthernetHeader, ip_hdr: IPHeader) -> None:
         """handles a TCP message
@@ -120,41 +562,136 @@ class Stack:
         :eth: an EthernetHeader instance
         :ip_hdr: an IPHeader instance
         """
-        print("TCP Header")
+        logger.debug("TCP Header")
 
         tcp_hdr = TCPHeader.decode(ip_hdr.payload)
-        tcp_r = tcp_hdr.reply(ip_hdr)
-        ip_r = ip_hdr.reply(self._ip, tcp_r.encode(), IP_TCP)
+        if tcp_hdr.checksum(ip_hdr) != 0:
+            raise ValueError("Invalid checksum for TCPHeader")
+
+        self.tcp.segment_arrives(ip_hdr.saddr, ip_hdr.daddr, tcp_hdr)
+
+    def _tcp_output(self, saddr: int, daddr: int, tcp_hdr: TCPHeader) -> None:
+        """sends a TCP segment (the checksum is computed here)
+
+        :saddr: the source address
+        :daddr: the destination address
+        :tcp_hdr: the segment
+
+        """
+        ip_hdr = IPHeader.build(saddr, daddr, IP_TCP, tcp_hdr._length(), self._next_ip_id())
+        tcp_hdr.adjust_checksum(ip_hdr)
+
+        self.ip_output(daddr, [ip_hdr.encode(), *tcp_hdr.segments()])
 
-        self.ip_output(ip_hdr.saddr, ip_r.encode())
+    def _tcp_data_output(self, tcb: TCB, seq: int, flags: int, wnd: int, tsval: int, payload: Buffer) -> bool:
+        """sends a data segment built from the header template of the connection (see tcpy.segmenter),
+        the template is rebuilt when the ARP table changes
 
-    def ip_output(self, daddr: int, payload: bytes) -> None:
-        """outputs the given payload through an ethernet eth_p_ip frame
+        :tcb: the connection
+        :seq: the sequence number
+        :flags: the TCP flags
+        :wnd: the window
+        :tsval: the timestamp value
+        :payload: the payload
+        :returns: False if the mac address of the destination is unknown (the segment isn't sent)
+
+        """
+        template = tcb.template
+        version = self.table.version()
+        if template is None or template.version != version:
+            dmac = self.table.get_mac_for_ip(tcb.raddr)
+            if dmac is None:
+                return False
+            template = tcb.template = HeaderTemplate(
+                mac2b(self._mac), dmac, tcb.laddr, tcb.raddr, tcb.lport, tcb.rport, tcb.ts_ok, version
+            )
+
+        headers = template.headers(seq, tcb.rcv_nxt, flags, wnd, self._next_ip_id(), tsval, tcb.ts_recent, payload)
+        self._write([headers, payload])
+        return True
+
+    def _next_ip_id(self) -> int:
+        self._ip_id = (self._ip_id + 1) & 0xFFFF
+        return self._ip_id
+
+    def ip_output(self, daddr: int, payload: List[Buffer]) -> None:
+        """outputs the given payload through an ethernet eth_p_ip frame, a datagram bigger than the path
+        MTU is fragmented (or dropped if it has the don't fragment flag)
 
         :daddr: destination address
-        :payload: payload in bytes
+        :payload: the IP datagram as a list of segments, the first one is the IP header (they are not
+        concatenated unless the datagram is fragmented)
 
         """
-        resp = self._build_eth_reply(ETH_P_IP, daddr, payload)
-        encoded = resp.encode()
+        header = payload[0]
+        mtu = self.path_mtu(daddr)
+        if header[2] << 8 | header[3] <= mtu:
+            self._ip_send(daddr, payload)
+        elif header[6] >> 5 & IP_DF:
+            self.tx_dropped += 1
+            logger.warning("Dropping datagram bigger than the path MTU to %s (%d bytes)", int2ip(daddr), mtu)
+        else:
+            for frag in fragment(header, b"".join(payload[1:]), mtu):
+                self._ip_send(daddr, frag)
 
-        # hex_debug(encoded, "output")
-        os.write(self.fd, encoded)
+    def _ip_send(self, daddr: int, payload: List[Buffer]) -> None:
+        """sends a datagram (no bigger than the MTU) in an ethernet frame
 
-    def _build_eth_reply(self, typ: int, daddr: int, payload: bytes) -> EthernetHeader:
-        dmac = self.table.get_mac_for_ip(socket.htonl(daddr))
-        return EthernetHeader(
-            typ=typ, smac=mac2b(self._mac), dmac=dmac, payload=payload
-        )
+        :daddr: destination address
+        :payload: the IP datagram as a list of segments
 
+        """
+        eth_hdr = self._eth_header(ETH_P_IP, daddr)
+        if eth_hdr is None:
+            self._arp_resolve(daddr, payload)
+            return
+
+        self._write([eth_hdr, *payload])
 
-def hex_debug(raw: bytes, desc: str = "") -> None:
-    """Prints the given bytes in hexadecimal with a description
+    def _arp_resolve(self, daddr: int, payload: List[Buffer]) -> None:
+        """queues a datagram until the mac address of its destination is resolved
+        (an ARP request is sent for the first one)
 
-    :raw: The bytes to print
-    :desc: A description (defaults to empty)
+        :daddr: destination address
+        :payload: the IP datagram as a list of segments
+
+        """
+        pending = self._arp_pending.setdefault(daddr, [])
+        if not pending:
+            self._write([self.table.request(daddr).encode()])
 
-    """
-    hexa = " ".join(["{:02x}".format(x) for x in raw])
+        if len(pending) >= ARP_PENDING_MAX:
+            logger.warning("No mac address found for %s, dropping frame", int2ip(daddr))
+            return
+
+        # the segments may be views over a received frame, they are copied
+        pending.append([bytes(segment) for segment in payload])
+
+    def flush(self) -> None:
+        """writes the queued frames (used after user calls sending segments)"""
+        with self.lock:
+            self.tx.flush(self._device())
+            self._schedule_timers()
+
+    def _write(self, frame: List[Buffer]) -> None:
+        """queues a frame on the TX queue, the queue is flushed at the end of the RX batch
+        or when it grows above its threshold
+
+        :frame: the frame as a list of segments
+        """
+        if self.tx.push(frame):
+            self.tx.flush(self._device())
+
+    def _eth_header(self, typ: int, daddr: int) -> Optional[bytes]:
+        """encodes the ethernet header of a frame sent to the given IP
+
+        :typ: the ethertype
+        :daddr: the destination IP
+        :returns: the raw ethernet header, None if the mac address of daddr is unknown
+
+        """
+        dmac = self.table.get_mac_for_ip(daddr)
+        if dmac is None:
+            return None
 
-    print(f"-----  Debug {desc} -----\n{hexa}\n{'-' * 20}")
+        return EthernetHeader.spec.pack(dmac, mac2b(self._mac), typ)
@@ -0,0 +1,350 @@
+from collections import deque
+from enum import IntEnum
+from typing import Callable, Deque, Optional, Tuple
+
+from .congestion import DEFAULT_CONGESTION_CONTROL, congestion_control
+from .constants import DEFAULT_MSS
+from .ring_buffer import RingBuffer
+from .segmenter import HeaderTemplate
+from .seq import SeqRanges, seq_add, seq_diff
+from .timer_wheel import Timer
+
+# (remote address, remote port, local address, local port): the fields of an incoming segment
+# (saddr, sport, daddr, dport) can be used as is to find its connection
+ConnKey = Tuple[int, int, int, int]
+
+# function called when something changes for the application (data received, connection
+# established, reset, accept queue, ...), set by the socket layer
+Waiter = Callable[[], None]
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+DEFAULT_BACKLOG = 128
+# maximum number of half-open connections (in SYN_RECEIVED) of a listener, the SYNs beyond it
+# are answered with SYN cookies
+DEFAULT_SYN_BACKLOG = 256
+# retransmission timeout before a round trip time is measured (RFC 6298, 2.1)
+INITIAL_RTO = 1.0
+
+
+class TCPState(IntEnum):
+
+    """States of a TCP connection (RFC 793)"""
+
+    CLOSED = 0
+    LISTEN = 1
+    SYN_SENT = 2
+    SYN_RECEIVED = 3
+    ESTABLISHED = 4
+    FIN_WAIT_1 = 5
+    FIN_WAIT_2 = 6
+    CLOSE_WAIT = 7
+    CLOSING = 8
+    LAST_ACK = 9
+    TIME_WAIT = 10
+
+
+# states in which our FIN was sent
+FIN_SENT_STATES = frozenset(
+    (TCPState.FIN_WAIT_1, TCPState.FIN_WAIT_2, TCPState.CLOSING, TCPState.LAST_ACK, TCPState.TIME_WAIT)
+)
+
+
+class Listener:
+
+    """A listening port, connections completing the handshake wait in the accept queue"""
+
+    __slots__ = (
+        "addr",
+        "port",
+        "backlog",
+        "syn_backlog",
+        "half_open",
+        "cookie_time",
+        "accept_queue",
+        "waiter",
+        "congestion",
+    )
+
+    def __init__(self, addr: int, port: int, backlog: int = DEFAULT_BACKLOG, syn_backlog: int = DEFAULT_SYN_BACKLOG):
+        """creates a new Listener
+
+        :addr: the local address
+        :port: the local port
+        :backlog: maximum number of established connections waiting to be accepted
+        :syn_backlog: maximum number of half-open connections (a TCB is only created for the SYNs
+        below it)
+
+        """
+        self.addr = addr
+        self.port = port
+        self.backlog = backlog
+        self.syn_backlog = syn_backlog
+        # number of connections of the listener in SYN_RECEIVED
+        self.half_open = 0
+        # time the last SYN cookie was sent, the ACKs without connection are only checked as cookies
+        # while one can still be valid (None if the half-open backlog never overflowed)
+        self.cookie_time: Optional[float] = None
+        self.accept_queue: Deque["TCB"] = deque()
+        self.waiter: Optional[Waiter] = None
+        # congestion control of the accepted connections (the engine default if None)
+        self.congestion: Optional[str] = None
+
+
+class TCB:
+
+    """Transmission Control Block: the state of a TCP connection (RFC 793, 3.2)
+
+    Send sequence space:
+
+         snd_una        snd_nxt        snd_una + snd_wnd
+            |  sent, unacked |   can be sent   |
+    --------+----------------+-----------------+--------
+
+    snd_buf holds the data from snd_una (sent but unacknowledged data and data not sent yet),
+    rcv_buf the in-order data received and not read by the application yet (the out of order data
+    is written ahead, at its place), both are bounded ring buffers (the memory used by a connection
+    doesn't depend on the traffic, an idle connection doesn't hold their storage).
+    """
+
+    __slots__ = (
+        "key",
+        "state",
+        "listener",
+        # send sequence variables
+        "iss",
+        "snd_una",
+        "snd_nxt",
+        "snd_wnd",
+        "snd_wl1",
+        "snd_wl2",
+        "snd_max",
+        "mss",
+        "snd_wscale",
+        "wscale_ok",
+        "sack_ok",
+        "ts_ok",
+        # receive sequence variables
+        "irs",
+        "rcv_nxt",
+        "rcv_wscale",
+        "rcv_acked",
+        "ack_pending",
+        "ooo",
+        "ooo_last",
+        "ooo_fin",
+        "ts_recent",
+        # buffers
+        "snd_buf",
+        "rcv_buf",
+        "fin_queued",
+        "fin_received",
+        "reset",
+        "waiter",
+        # congestion control and loss recovery
+        "cc",
+        "dupacks",
+        "in_recovery",
+        "recover",
+        "rtt_seq",
+        "rtt_time",
+        "ts_una",
+        "srtt",
+        "rttvar",
+        "sacked",
+        "high_rxt",
+        # timers (created on first use, see tcpy.timer_wheel)
+        "rto",
+        "retries",
+        "rtx_timer",
+        "persist_timer",
+        "keepalive",
+        "probes",
+        "keepalive_timer",
+        "time_wait_timer",
+        "delack_timer",
+        # headers of the data segments (built by the stack, see tcpy.segmenter)
+        "template",
+    )
+
+    def __init__(self, key: ConnKey, state: TCPState, iss: int, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        """creates a new TCB
+
+        :key: the connection key (remote address, remote port, local address, local port)
+        :state: the initial state
+        :iss: the initial send sequence number
+        :buffer_size: capacity of the send and receive buffers in bytes
+
+        """
+        self.key = key
+        self.state = state
+        self.listener: Optional[Listener] = None
+
+        self.iss = iss
+        self.snd_una = iss
+        # The SYN takes the first sequence number
+        self.snd_nxt = seq_add(iss, 1)
+        self.snd_wnd = 0
+        self.snd_wl1 = 0
+        self.snd_wl2 = 0
+        # highest sequence number sent (snd_nxt goes back to snd_una after a retransmission timeout)
+        self.snd_max = self.snd_nxt
+        self.mss = DEFAULT_MSS
+        # window scaling (RFC 7323) is used if both ends sent the option in their SYN,
+        # the windows of the peer are shifted by snd_wscale, ours by rcv_wscale
+        self.snd_wscale = 0
+        self.wscale_ok = False
+        # selective acknowledgments (RFC 2018) are used if both ends sent the SACK permitted option
+        self.sack_ok = False
+        # timestamps (RFC 7323) are sent in every segment if both ends sent the option in their SYN
+        self.ts_ok = False
+
+        self.irs = 0
+        self.rcv_nxt = 0
+        self.rcv_wscale = 0
+        # rcv_nxt in the last ACK sent and number of received segments not acknowledged yet (delayed ACKs)
+        self.rcv_acked = 0
+        self.ack_pending = 0
+        # out of order data (stored ahead in rcv_buf, so it's bounded by the buffer size): ranges of sequence
+        # numbers (see new_ranges), None while there is none, ooo_last is the start of the last segment
+        # received out of order (reported in the first SACK block)
+        self.ooo: Optional[SeqRanges] = None
+        self.ooo_last = 0
+        # sequence number of a FIN received out of order, it's processed once the data before it is received
+        self.ooo_fin: Optional[int] = None
+        # TSval of the peer echoed in our segments (the one of the oldest segment acknowledged by the last ACK)
+        self.ts_recent = 0
+
+        self.snd_buf = RingBuffer(buffer_size)
+        self.rcv_buf = RingBuffer(buffer_size)
+        # the application closed the connection, a FIN is sent once snd_buf is empty
+        self.fin_queued = False
+        self.fin_received = False
+        # the connection was reset by the peer (or aborted after too many retransmissions)
+        self.reset = False
+        self.waiter: Optional[Waiter] = None
+
+        self.cc = congestion_control(DEFAULT_CONGESTION_CONTROL)
+        self.dupacks = 0
+        # fast recovery: it ends when recover (snd_max when the loss was detected) is acknowledged
+        self.in_recovery = False
+        self.recover = iss
+        # sequence number whose acknowledgment gives a round trip time sample (sent at rtt_time)
+        self.rtt_seq: Optional[int] = None
+        self.rtt_time = 0.0
+        # TSval of the oldest unacknowledged segment: the TSecr of an ACK of new data isn't older
+        self.ts_una = 0
+        # smoothed round trip time and its variation in seconds (RFC 6298), None until the first sample
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        # SACK scoreboard: ranges above snd_una received by the peer (None while there is none),
+        # high_rxt is the end of the data retransmitted during the current fast recovery
+        self.sacked: Optional[SeqRanges] = None
+        self.high_rxt = iss
+
+        # retransmission timeout (computed from srtt and rttvar) and number of consecutive expirations of the
+        # retransmission timer (or of the persist timer, the two are never armed at the same time)
+        self.rto = INITIAL_RTO
+        self.retries = 0
+        self.rtx_timer: Optional[Timer] = None
+        self.persist_timer: Optional[Timer] = None
+        # keepalives (RFC 1122, 4.2.3.6) are only sent if the application enabled them
+        self.keepalive = False
+        self.probes = 0
+        self.keepalive_timer: Optional[Timer] = None
+        self.time_wait_timer: Optional[Timer] = None
+        self.delack_timer: Optional[Timer] = None
+
+        self.template: Optional[HeaderTemplate] = None
+
+    @property
+    def raddr(self) -> int:
+        return self.key[0]
+
+    @property
+    def rport(self) -> int:
+        return self.key[1]
+
+    @property
+    def laddr(self) -> int:
+        return self.key[2]
+
+    @property
+    def lport(self) -> int:
+        return self.key[3]
+
+    def rcv_wnd(self) -> int:
+        """returns the receive window: the free space of the receive buffer"""
+        return self.rcv_buf.free()
+
+    def new_ranges(self) -> SeqRanges:
+        """returns an empty SeqRanges for the out of order data or the SACK scoreboard (they are only
+        allocated when the first out of order segment or SACK block arrives): a peer sending tiny segments
+        separated by holes can't make their number grow beyond one per DEFAULT_MSS bytes of buffer, the
+        segments creating more are dropped"""
+        return SeqRanges(self.rcv_buf.capacity // DEFAULT_MSS + 1)
+
+    def in_flight(self) -> int:
+        """returns the number of data bytes sent and not acknowledged yet"""
+        return min(seq_diff(self.snd_nxt, self.snd_una), len(self.snd_buf))
+
+    def fin_sent(self) -> bool:
+        """checks if our FIN was sent"""
+        return self.state in FIN_SENT_STATES
+
+    def info(self) -> "TCPInfo":
+        """returns a snapshot of the state of the connection (like the TCP_INFO socket option)"""
+        return TCPInfo(self)
+
+    def __repr__(self) -> str:
+        return f"TCB({self.key}, {self.state.name}, snd_una={self.snd_una}, snd_nxt={self.snd_nxt}, rcv_nxt={self.rcv_nxt})"
+
+
+class TCPInfo:
+
+    """A snapshot of the state of a connection: round trip time estimates, congestion control
+    and negotiated options (times in seconds, sizes in bytes)"""
+
+    __slots__ = (
+        "state",
+        "rtt",
+        "rttvar",
+        "rto",
+        "mss",
+        "cwnd",
+        "ssthresh",
+        "snd_wnd",
+        "rcv_wnd",
+        "in_flight",
+        "retries",
+        "wscale",
+        "sack",
+        "timestamps",
+    )
+
+    def __init__(self, tcb: TCB):
+        """creates a new TCPInfo
+
+        :tcb: the connection
+
+        """
+        self.state = tcb.state
+        # 0 until a round trip time is measured
+        self.rtt = tcb.srtt or 0.0
+        self.rttvar = tcb.rttvar
+        self.rto = tcb.rto
+        self.mss = tcb.mss
+        self.cwnd = tcb.cc.cwnd
+        self.ssthresh = tcb.cc.ssthresh
+        self.snd_wnd = tcb.snd_wnd
+        self.rcv_wnd = tcb.rcv_wnd()
+        self.in_flight = tcb.in_flight()
+        self.retries = tcb.retries
+        self.wscale = tcb.wscale_ok
+        self.sack = tcb.sack_ok
+        self.timestamps = tcb.ts_ok
+
+    def __repr__(self) -> str:
+        return (
+            f"TCPInfo({self.state.name}, rtt={self.rtt:.6f}, rttvar={self.rttvar:.6f}, rto={self.rto:.3f}, "
+            f"cwnd={self.cwnd}, ssthresh={self.ssthresh}, mss={self.mss})"
+        )
@@ -1,9 +1,9 @@
-import socket
-import struct
+from typing import List
 
-from .constants import TCP_ACK, TCP_SYN
+from .header import Bits, Field, HeaderSpec, check_size, lazy_header, wrap
 from .ip import IPHeader
-from .ip_util import ip_checksum, sum_by_16bits
+from .ip_util import Buffer, ip_checksum, pseudo_header_sum, sum_by_16bits
+from .tcp_options import TCPOptions
 
 TCP_HEADER_SIZE = 20
 
@@ -12,7 +12,43 @@ class TCPHeader:
 
     """TCPHeader representation"""
 
-    fmt = "!HHIIBBHHH"
+    # 0                              15                              31
+    # -----------------------------------------------------------------
+    # |          source port          |       destination port        |
+    # -----------------------------------------------------------------
+    # |                        sequence number                        |
+    # -----------------------------------------------------------------
+    # |                     acknowledgment number                     |
+    # -----------------------------------------------------------------
+    # |  HL   | rsvd  |C|E|U|A|P|R|S|F|        window size            |
+    # -----------------------------------------------------------------
+    # |         TCP checksum          |       urgent pointer          |
+    # -----------------------------------------------------------------
+    spec = HeaderSpec(
+        Field("src_port", "H"),
+        Field("dst_port", "H"),
+        Field("_seq", "I"),
+        Field("_ack", "I"),
+        Bits("B", ("_hl", 4), (None, 4)),
+        Field("_flags", "B"),
+        Field("_win_size", "H"),
+        Field("_csum", "H"),
+        Field("_uptr", "H"),
+    )
+
+    __slots__ = (
+        "src_port",
+        "dst_port",
+        "_seq",
+        "_ack",
+        "_hl",
+        "_flags",
+        "_win_size",
+        "_csum",
+        "_uptr",
+        "_additional_fields",
+        "_payload",
+    )
 
     def __init__(
         self,
@@ -25,8 +61,8 @@ class TCPHeader:
         win_size: int,
         csum: int,
         uptr: int,
-        additional_fields: bytes,
-        payload: bytes,
+        additional_fields: Buffer,
+        payload: Buffer,
     ):
         """creates a TCPHeader instance
 
@@ -39,7 +75,7 @@ class TCPHeader:
         :win_size: number of bytes the receiver is willing to accept (max value is 65535 since it's supposed to be encoded in a 2 bytes field)
         :csum: checksum of the TCP segment (uses the same algorithm as the ip_checksum but also includes a pseudo-header from the IP datagram)
         :uptr: used when the U-flag is set, it indicates the position of the urgent data in the stream
-        :additional_fields: additional_fields in the header not yet supported (in form of bytes)
+        :additional_fields: the raw options (see options and set_options)
         :payload: payload contained in the TCP datagram
 
         """
@@ -56,50 +92,32 @@ class TCPHeader:
         self._payload = payload
 
     @classmethod
-    def decode(cls, raw: bytes) -> "TCPHeader":
+    def decode(cls, raw: Buffer, lazy: bool = False) -> "TCPHeader":
         """decodes the given raw bytes into an TCPHeader
+        the options and the payload are memoryviews over raw (they aren't copied)
 
-        :raw: a list of bytes to decode
+        :raw: a list of bytes to decode (bytes, bytearray or memoryview)
+        :lazy: if True, fields are only decoded when they are read (see LazyTCPHeader)
         :returns: an instance of TCPHeader
 
         """
 
-        # 0                              15                              31
-        # -----------------------------------------------------------------
-        # |          source port          |       destination port        |
-        # -----------------------------------------------------------------
-        # |                        sequence number                        |
-        # -----------------------------------------------------------------
-        # |                     acknowledgment number                     |
-        # -----------------------------------------------------------------
-        # |  HL   | rsvd  |C|E|U|A|P|R|S|F|        window size            |
-        # -----------------------------------------------------------------
-        # |         TCP checksum          |       urgent pointer          |
-        # -----------------------------------------------------------------
-
-        # TODO decode additional fields such as mss
-
-        # TODO verify checksum
-
-        (src_port, dst_port, seq, ack, hl, flags, win_size, csum, uptr) = struct.unpack(
-            cls.fmt, raw[:TCP_HEADER_SIZE]
-        )
-        hl = hl >> 4
-        additional_fields = raw[TCP_HEADER_SIZE : 4 * hl]
-        payload = raw[4 * hl :]
-        return TCPHeader(
-            src_port=src_port,
-            dst_port=dst_port,
-            seq=seq,
-            ack=ack,
-            hl=hl,
-            flags=flags,
-            win_size=win_size,
-            csum=csum,
-            uptr=uptr,
-            additional_fields=additional_fields,
-            payload=payload,
-        )
+        # The checksum covers the IP pseudo header, it is verified by the caller once the segment is
+        # known to be handled (see checksum)
+        check_size(raw, TCP_HEADER_SIZE, "TCPHeader")
+        hl = raw[12] >> 4
+        if hl < 5:
+            raise ValueError(f"Invalid TCPHeader length: {hl} words")
+        check_size(raw, 4 * hl, "TCPHeader options")
+        if lazy:
+            return wrap(LazyTCPHeader, memoryview(raw))
+
+        raw = memoryview(raw)
+        tcp_hdr = TCPHeader.__new__(TCPHeader)
+        TCPHeader.spec.decode_into(tcp_hdr, raw)
+        tcp_hdr._additional_fields = raw[TCP_HEADER_SIZE : 4 * tcp_hdr._hl]
+        tcp_hdr._payload = raw[4 * tcp_hdr._hl :]
+        return tcp_hdr
 
     def encode(self) -> bytes:
         """encodes the given TCPHeader into raw bytes
@@ -107,87 +125,77 @@ class TCPHeader:
         :returns: a raw bytes representation of the given TCPHeader
 
         """
-        return (
-            struct.pack(
-                TCPHeader.fmt,
-                self.src_port,
-                self.dst_port,
-                self._seq,
-                self._ack,
-                self._hl << 4,
-                self._flags,
-                self._win_size,
-                self._csum,
-                self._uptr,
-            )
-            + self._additional_fields
-            + self._payload
-        )
+        return self._encode_header() + self._additional_fields + self._payload
 
-    def adjust_checksum(self, ip_hdr: IPHeader) -> None:
-        """adjusts the checksum to make sure it's valid
+    def options(self) -> TCPOptions:
+        """decodes the options of the segment (they are only parsed when needed, for instance in SYN segments)
+
+        :returns: the options
 
-        :ip_hdr: IPHeader required to generate th pseudo header
         """
-        self._csum = 0
-        # TODO improve that (it's not really efficient)
-        self._csum = self.checksum(ip_hdr)
+        return TCPOptions.decode(self._additional_fields)
 
-    def checksum(self, ip_hdr: IPHeader) -> int:
-        """computes the TCP checksum for the given TCP datagram and given IPHeader
+    def set_options(self, options: TCPOptions) -> None:
+        """encodes the options in the segment (the header length is updated)
 
-        :ip_hdr: the IPHeader to use when computing the checksum
-        :returns: An integer representing the checksum
+        :options: the options
 
         """
+        self._additional_fields = options.encode()
+        self._hl = 5 + len(self._additional_fields) // 4
 
-        # The TCP checksum includes a pseudo IP Header with the following data:
-        # uint32_t saddr;
-        # uint32_t daddr;
-        # uint8_t zero;
-        # uint8_t proto;
-        # uint16_t len;
+    def segments(self) -> List[Buffer]:
+        """returns the encoded segment as a list of buffers (the header, the options and the payload,
+        which aren't copied)
 
-        iphdr_fmt = "IIBBH"
+        :returns: a list of buffers
 
-        # TODO Find a better way to figure out length and change this when adding new fields
-        length = socket.htons(
-            TCP_HEADER_SIZE + len(self._additional_fields) + len(self._payload)
-        )
+        """
+        return [self._encode_header(), self._additional_fields, self._payload]
 
-        pseudo_hdr = struct.pack(
-            # Swap source / dest addresses
-            iphdr_fmt,
-            ip_hdr.daddr,
-            ip_hdr.saddr,
-            0,
-            ip_hdr.proto,
-            length,
-        )
+    def _encode_header(self) -> bytes:
+        """encodes the fixed part of the header (without the options and the payload)
 
-        return ip_checksum(self.encode(), start=sum_by_16bits(pseudo_hdr))
+        :returns: raw bytes
 
-    def reply(self, ip_hdr: IPHeader) -> "TCPHeader":
-        """Reply to the given TCP datagram
-        warning: it modifies the current TCPHeader in place
-        it returns the current one for convenience
+        """
+        return TCPHeader.spec.encode(self)
 
-        :ip_hdr:  the original IP header
-        :returns: a new TCPHeader (built from the old one)
+    def _length(self) -> int:
+        """returns the length of the TCP segment (header, options and payload) in bytes"""
+        return TCP_HEADER_SIZE + len(self._additional_fields) + len(self._payload)
 
+    def adjust_checksum(self, ip_hdr: IPHeader) -> None:
+        """adjusts the checksum to make sure it's valid
+
+        :ip_hdr: IPHeader required to generate th pseudo header
         """
-        # Swap ports
-        self.src_port, self.dst_port = self.dst_port, self.src_port
+        self._csum = 0
+        self._csum = self.checksum(ip_hdr)
 
-        if self._flags & TCP_SYN:
-            self._flags |= TCP_ACK
-            self._ack = self._seq + 1
-            # TODO change this sequence number
-            self._seq = socket.htonl(1234)
+    def checksum(self, ip_hdr: IPHeader) -> int:
+        """computes the TCP checksum for the given TCP datagram and given IPHeader
 
-        # TODO support more TCP options
-        self._hl = 5
-        self._additional_fields = b""
+        :ip_hdr: the IPHeader to use when computing the checksum
+        :returns: An integer representing the checksum
 
-        self.adjust_checksum(ip_hdr)
-        return self
+        """
+        # The header and options are 32 bits aligned so every part can be summed separately
+        # (no need to concatenate the whole segment)
+        start = (
+            pseudo_header_sum(ip_hdr.saddr, ip_hdr.daddr, ip_hdr.proto, self._length())
+            + sum_by_16bits(self._encode_header())
+            + sum_by_16bits(self._additional_fields)
+        )
+        return ip_checksum(self._payload, start=start)
+
+
+LazyTCPHeader = lazy_header(
+    TCPHeader,
+    {
+        **TCPHeader.spec.decoders(),
+        "_additional_fields": lambda raw: raw[TCP_HEADER_SIZE : 4 * (raw[12] >> 4)],
+        "_payload": lambda raw: raw[4 * (raw[12] >> 4) :],
+    },
+    doc="TCPHeader wrapping the raw segment, fields are decoded the first time they are read",
+)
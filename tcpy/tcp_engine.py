@@ -0,0 +1,1359 @@
+import hashlib
+import os
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .congestion import DEFAULT_CONGESTION_CONTROL, congestion_control
+from .constants import DEFAULT_MSS, DEFAULT_MTU, TCP_ACK, TCP_FIN, TCP_PSH, TCP_RST, TCP_SYN
+from .ip import IP_HEADER_SIZE
+from .ip_util import Buffer
+from .seq import SEQ_MOD, seq_add, seq_diff, seq_le, seq_lt
+from .tcb import DEFAULT_BACKLOG, DEFAULT_BUFFER_SIZE, DEFAULT_SYN_BACKLOG, TCB, ConnKey, Listener, TCPState
+from .tcp import TCP_HEADER_SIZE, TCPHeader
+from .tcp_options import MAX_SACK_BLOCKS, MAX_WSCALE, TIMESTAMPS_SIZE, SACKBlock, TCPOptions
+from .tcp_table import ConnectionTable
+from .timer_wheel import Timer, TimerWheel
+
+# Maximum segment lifetime, connections stay 2 * MSL in TIME_WAIT
+MSL = 30.0
+# bounds of the retransmission timeout computed from the round trip time (RFC 6298, 2.4 recommends
+# a 1 second lower bound, 200 ms like most stacks keeps the recovery of a loss on a short path fast)
+MIN_RTO = 0.2
+MAX_RTO = 60.0
+# frequency of the timestamps clock (RFC 7323, 5.4: between 1 ms and 1 s per tick)
+TS_HZ = 1000
+# number of retransmissions before the connection is aborted (RFC 1122, 4.2.3.5: R2 of at least 100 seconds,
+# 3 minutes for the SYN)
+MAX_RETRIES = 15
+MAX_SYN_RETRIES = 6
+# keepalives: idle time before the first probe, interval between the probes, unanswered probes before
+# the connection is aborted
+KEEPALIVE_IDLE = 7200.0
+KEEPALIVE_INTERVAL = 75.0
+KEEPALIVE_PROBES = 9
+# maximum delay of an ACK (RFC 1122, 4.2.3.2: less than 0.5 seconds)
+DELAYED_ACK_TIMEOUT = 0.04
+
+# function sending a segment: output(saddr, daddr, tcp_hdr), the checksum is computed by the caller
+Output = Callable[[int, int, TCPHeader], None]
+# function sending a data segment of a connection without building a TCPHeader:
+# data_output(tcb, seq, flags, window, tsval, payload), the acknowledgment number and TSecr come from the TCB,
+# it returns False if the segment wasn't sent (it's then sent with output)
+DataOutput = Callable[[TCB, int, int, int, int, Buffer], bool]
+
+# states in which the connection is synchronized and data can be received
+RECEIVING_STATES = frozenset((TCPState.ESTABLISHED, TCPState.FIN_WAIT_1, TCPState.FIN_WAIT_2))
+# states in which the application can queue data
+SENDING_STATES = frozenset((TCPState.SYN_SENT, TCPState.SYN_RECEIVED, TCPState.ESTABLISHED, TCPState.CLOSE_WAIT))
+# states in which the handshake isn't complete
+SYNCHRONIZING_STATES = frozenset((TCPState.SYN_SENT, TCPState.SYN_RECEIVED))
+# states in which data (or the FIN) can be sent or retransmitted
+PUSH_STATES = frozenset(
+    (TCPState.ESTABLISHED, TCPState.CLOSE_WAIT, TCPState.FIN_WAIT_1, TCPState.CLOSING, TCPState.LAST_ACK)
+)
+
+# states in which keepalives are sent
+KEEPALIVE_STATES = PUSH_STATES | RECEIVING_STATES
+
+# number of duplicate ACKs triggering a fast retransmit
+DUPACK_THRESHOLD = 3
+
+# SYN cookies: the counter of the cookie advances every 2**COOKIE_PERIOD_BITS seconds, a cookie is
+# valid during COOKIE_MAX_AGE periods, the MSS of the peer is encoded as an index in COOKIE_MSS
+COOKIE_PERIOD_BITS = 6
+COOKIE_MAX_AGE = 2
+COOKIE_MSS = (536, 1220, 1300, 1380, 1440, 1460, 4312, 8960)
+
+
+class TCPEngine:
+
+    """TCP protocol processing: runs the RFC 793 state machine (section 3.9, event processing)
+    of every connection of a ConnectionTable
+
+    Segments are given to segment_arrives, segments to send are given to the output function,
+    the user calls (listen, connect, send, recv, close, abort) are methods of the engine.
+
+    The timers of the connections (retransmission, persist, keepalive and TIME_WAIT) are armed on
+    the timer wheel self.timers, the owner of the engine advances it (see TimerWheel.advance) and
+    uses TimerWheel.timeout as the timeout of its poll.
+    """
+
+    def __init__(
+        self,
+        output: Output,
+        clock: Callable[[], float] = time.monotonic,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        secret: Optional[bytes] = None,
+        mss: int = DEFAULT_MTU - IP_HEADER_SIZE - TCP_HEADER_SIZE,
+        congestion: str = DEFAULT_CONGESTION_CONTROL,
+        timers: Optional[TimerWheel] = None,
+        delayed_ack: float = DELAYED_ACK_TIMEOUT,
+        sack: bool = True,
+        timestamps: bool = True,
+        data_output: Optional[DataOutput] = None,
+        path_mtu: Optional[Callable[[int], int]] = None,
+    ):
+        """creates a new TCPEngine
+
+        :output: function sending a segment (see Output)
+        :clock: function returning the current time in seconds (used for the ISN and the timers)
+        :buffer_size: capacity of the send and receive buffers of every connection in bytes
+        :secret: secret key used to generate the initial sequence numbers (random by default)
+        :mss: maximum segment size advertised in the SYN segments (the MTU minus the IP and TCP headers)
+        :congestion: default congestion control of the connections (see tcpy.congestion)
+        :timers: the timer wheel of the connection timers, by default a new one driven by clock
+        :delayed_ack: maximum delay of an ACK in seconds (0 disables the delayed ACKs)
+        :sack: whether selective acknowledgments are offered in the SYN segments
+        :timestamps: whether timestamps are offered in the SYN segments (they give a round trip time
+        sample per ACK)
+        :data_output: function sending the data segments (see DataOutput), output is used if None
+        :path_mtu: function returning the path MTU to an address (see tcpy.pmtu), the segments of the
+        connections fit in it (only the mss limits them if None)
+
+        """
+        self.table = ConnectionTable()
+        self._output = output
+        self._data_output = data_output
+        self._path_mtu = path_mtu
+        self._clock = clock
+        self._buffer_size = buffer_size
+        self._secret = secret or os.urandom(16)
+        self.mss = mss
+        # smallest window scale letting the whole receive buffer be advertised
+        self._wscale = 0
+        while buffer_size >> self._wscale > 0xFFFF and self._wscale < MAX_WSCALE:
+            self._wscale += 1
+        congestion_control(congestion)
+        self.congestion = congestion
+        # loss recovery counters
+        self.retransmits = 0
+        self.fast_retransmits = 0
+        self.timeouts = 0
+        self.retransmitted_bytes = 0
+        self.timers = timers or TimerWheel(clock)
+        self.delayed_ack = delayed_ack
+        self.sack = sack
+        self.timestamps = timestamps
+        # connections to acknowledge at the end of the current batch of segments (see start_batch)
+        self._batch: Optional[Dict[TCB, None]] = None
+        # ACKs not sent thanks to the delayed ACKs (cumulative or piggybacked on data) and ACKs sent
+        # when the delayed ACK timer expired
+        self.acks_saved = 0
+        self.delayed_acks = 0
+        # the SYNs beyond the half-open backlog of a listener are answered with a SYN cookie (they are
+        # dropped if False)
+        self.syn_cookies = True
+        # SYN-ACKs sent with a SYN cookie (the half-open backlog of the listener was full), connections
+        # established from a valid cookie, handshakes dropped (the accept queue or the half-open
+        # backlog was full) and valid cookies dropped because the accept queue was full
+        self.syn_cookies_sent = 0
+        self.syn_cookies_accepted = 0
+        self.listen_drops = 0
+        self.cookie_drops = 0
+
+    def isn(self, key: ConnKey) -> int:
+        """generates an initial sequence number for a connection (RFC 6528): a 4 microseconds
+        clock plus a keyed hash of the connection 4-tuple (ISNs can't be guessed by an off-path
+        attacker and successive connections with the same 4-tuple use increasing ISNs)
+
+        :key: the connection key
+        :returns: the ISN
+
+        """
+        digest = hashlib.blake2b(struct.pack("!IHIH", *key), key=self._secret, digest_size=4).digest()
+        return (int(self._clock() * 250_000) + int.from_bytes(digest, "big")) % (1 << 32)
+
+    # User calls
+
+    def listen(
+        self, addr: int, port: int, backlog: int = DEFAULT_BACKLOG, syn_backlog: int = DEFAULT_SYN_BACKLOG
+    ) -> Listener:
+        """listens on the given port
+
+        :addr: the local address (INADDR_ANY to accept the connections to any local address)
+        :port: the local port
+        :backlog: maximum number of established connections waiting to be accepted
+        :syn_backlog: maximum number of half-open connections, the SYNs beyond it are answered
+        with SYN cookies
+        :returns: a Listener
+
+        """
+        listener = Listener(addr, port, backlog, syn_backlog)
+        self.table.listen(listener)
+        return listener
+
+    def accept(self, listener: Listener) -> Optional[TCB]:
+        """returns an established connection of the listener
+
+        :listener: the listener
+        :returns: a TCB or None if there is no connection to accept
+
+        """
+        if listener.accept_queue:
+            return listener.accept_queue.popleft()
+
+        return None
+
+    def close_listener(self, listener: Listener) -> None:
+        """stops listening, the connections that were not accepted are reset
+
+        :listener: the listener
+
+        """
+        self.table.unlisten(listener)
+        while listener.accept_queue:
+            self.abort(listener.accept_queue.popleft())
+
+    def connect(self, laddr: int, lport: int, raddr: int, rport: int, congestion: Optional[str] = None) -> TCB:
+        """opens a connection (active open), a SYN is sent
+
+        :laddr: the local address
+        :lport: the local port
+        :raddr: the remote address
+        :rport: the remote port
+        :congestion: congestion control of the connection (the engine default if None)
+        :returns: the TCB of the connection (in SYN_SENT)
+
+        """
+        key = (raddr, rport, laddr, lport)
+        tcb = self._new_tcb(key, TCPState.SYN_SENT, congestion)
+        self.table.insert(tcb)
+        self._send(tcb, TCP_SYN, seq=tcb.iss, options=self._syn_options(tcb))
+        self._time_syn(tcb)
+        self._arm_rtx(tcb)
+        return tcb
+
+    def set_congestion(self, tcb: TCB, congestion: str) -> None:
+        """changes the congestion control of a connection (it starts from the initial window)
+
+        :tcb: the connection
+        :congestion: name of the congestion control
+
+        """
+        tcb.cc = congestion_control(congestion)
+        tcb.cc.init(tcb.mss)
+
+    def set_keepalive(self, tcb: TCB, enabled: bool) -> None:
+        """enables or disables the keepalives of a connection: once it's idle for KEEPALIVE_IDLE seconds
+        probes are sent every KEEPALIVE_INTERVAL seconds, the connection is aborted if KEEPALIVE_PROBES
+        probes are not answered
+
+        :tcb: the connection
+        :enabled: whether keepalives are sent
+
+        """
+        tcb.keepalive = enabled
+        if enabled:
+            self._idle(tcb)
+        elif tcb.keepalive_timer is not None:
+            self.timers.cancel(tcb.keepalive_timer)
+
+    def send(self, tcb: TCB, data: Buffer) -> int:
+        """queues data on the connection, it's sent as soon as the windows allow it
+
+        :tcb: the connection
+        :data: the data to send
+        :returns: the number of bytes queued (the send buffer is bounded)
+
+        """
+        if tcb.state not in SENDING_STATES or tcb.fin_queued:
+            raise ConnectionError(f"Connection is closing ({tcb.state.name})")
+
+        size = tcb.snd_buf.write(data)
+        self._push(tcb)
+        return size
+
+    def recv(self, tcb: TCB, size: int) -> bytes:
+        """reads received data
+
+        :tcb: the connection
+        :size: maximum number of bytes to read
+        :returns: the data (empty if there is nothing to read)
+
+        """
+        before = tcb.rcv_wnd()
+        data = tcb.rcv_buf.read(size)
+        self._window_update(tcb, before)
+        return data
+
+    def recv_into(self, tcb: TCB, buffer: memoryview) -> int:
+        """reads received data into a buffer
+
+        :tcb: the connection
+        :buffer: a writable buffer
+        :returns: the number of bytes read (0 if there is nothing to read)
+
+        """
+        before = tcb.rcv_wnd()
+        size = tcb.rcv_buf.read_into(buffer)
+        self._window_update(tcb, before)
+        return size
+
+    def _window_update(self, tcb: TCB, before: int) -> None:
+        # Window update once half of the buffer is free again (avoids the silly window syndrome)
+        half = tcb.rcv_buf.capacity // 2
+        if before < half <= tcb.rcv_wnd() and tcb.state in RECEIVING_STATES:
+            self._send(tcb, TCP_ACK)
+
+    def close(self, tcb: TCB) -> None:
+        """closes the connection: a FIN is sent once all the queued data was sent
+
+        :tcb: the connection
+
+        """
+        if tcb.state in (TCPState.CLOSED, TCPState.SYN_SENT):
+            self._drop(tcb)
+        elif tcb.state in SENDING_STATES:
+            tcb.fin_queued = True
+            self._push(tcb)
+
+    def abort(self, tcb: TCB) -> None:
+        """resets the connection
+
+        :tcb: the connection
+
+        """
+        if tcb.state not in (TCPState.CLOSED, TCPState.SYN_SENT, TCPState.TIME_WAIT):
+            self._send(tcb, TCP_RST, seq=tcb.snd_nxt)
+        self._drop(tcb)
+
+    def retransmit_timeout(self, tcb: TCB) -> None:
+        """the retransmission timer of the connection expired: the unacknowledged data is sent again
+        from snd_una (the SYN in the synchronizing states), the timer calls it after backing off the
+        retransmission timeout
+
+        :tcb: the connection
+
+        """
+        if tcb.state == TCPState.SYN_SENT:
+            self._send(tcb, TCP_SYN, seq=tcb.iss, options=self._syn_options(tcb))
+            tcb.rtt_seq = None
+        elif tcb.state == TCPState.SYN_RECEIVED:
+            self._send(tcb, TCP_SYN | TCP_ACK, seq=tcb.iss, options=self._syn_options(tcb))
+            tcb.rtt_seq = None
+        elif tcb.snd_una != tcb.snd_max and tcb.state in PUSH_STATES:
+            tcb.cc.on_timeout(seq_diff(tcb.snd_max, tcb.snd_una), self._clock())
+            tcb.in_recovery = False
+            tcb.dupacks = 0
+            # the duplicate ACKs of the data sent before the timeout don't start a fast retransmit (RFC 6582)
+            tcb.recover = tcb.snd_max
+            tcb.rtt_seq = None
+            tcb.snd_nxt = tcb.snd_una
+            self._push(tcb)
+        else:
+            return
+
+        self.timeouts += 1
+        self.retransmits += 1
+
+    # Segment arrives
+
+    def start_batch(self) -> None:
+        """starts a batch of segments (the frames read by a wakeup of the RX loop): the ACKs are
+        sent by end_batch, once per connection"""
+        self._batch = {}
+
+    def end_batch(self) -> None:
+        """ends a batch of segments: a cumulative ACK is sent to the connections that need one
+        (if no segment sent since carried it)"""
+        batch, self._batch = self._batch, None
+        for tcb in batch or ():
+            if tcb.ack_pending and tcb.state != TCPState.CLOSED:
+                self._send(tcb, TCP_ACK)
+
+    def segment_arrives(self, saddr: int, daddr: int, seg: TCPHeader) -> None:
+        """processes an incoming segment
+
+        :saddr: source address of the segment
+        :daddr: destination address of the segment
+        :seg: the segment (its checksum was verified)
+
+        """
+        tcb = self.table.get((saddr, seg.src_port, daddr, seg.dst_port))
+        if tcb is None:
+            listener = self.table.listener(daddr, seg.dst_port)
+            if listener is None:
+                self._reset(daddr, saddr, seg)
+            else:
+                self._listen_arrives(listener, (saddr, seg.src_port, daddr, seg.dst_port), seg)
+        else:
+            if tcb.state == TCPState.SYN_SENT:
+                self._syn_sent_arrives(tcb, seg)
+            else:
+                self._synchronized_arrives(tcb, seg)
+
+            if tcb.keepalive:
+                self._idle(tcb)
+            if tcb.waiter is not None:
+                tcb.waiter()
+
+    def in_flight(self, tcb: TCB, seq: int) -> bool:
+        """checks if a sequence number quoted by an ICMP error belongs to a segment in flight (a blind
+        attacker can't guess it, RFC 5927, 4.1)
+
+        :tcb: the connection
+        :seq: the sequence number
+        :returns: a boolean
+
+        """
+        return seq_le(tcb.snd_una, seq) and seq_lt(seq, tcb.snd_max)
+
+    def mtu_reduced(self, tcb: TCB, mtu: int) -> None:
+        """the segments of the connection are too big for the path (an ICMP fragmentation needed message
+        was received, RFC 1191, 6.1): the segment size is reduced and the data in flight is sent again
+
+        :tcb: the connection
+        :mtu: the new path MTU
+
+        """
+        mss = mtu - IP_HEADER_SIZE - TCP_HEADER_SIZE - (TIMESTAMPS_SIZE if tcb.ts_ok else 0)
+        if mss >= tcb.mss or tcb.state not in PUSH_STATES:
+            return
+
+        tcb.mss = tcb.cc.mss = mss
+        # the segments were lost because of their size, not because of congestion: the window isn't reduced
+        tcb.rtt_seq = None
+        tcb.snd_nxt = tcb.snd_una
+        self._push(tcb)
+
+    def _listen_arrives(self, listener: Listener, key: ConnKey, seg: TCPHeader) -> None:
+        flags = seg._flags
+        if flags & TCP_RST:
+            return
+        if flags & TCP_ACK:
+            if flags & TCP_SYN or not self._cookie_expected(listener) or not self._cookie_arrives(listener, key, seg):
+                self._reset(key[2], key[0], seg)
+            return
+        if not flags & TCP_SYN:
+            return
+
+        if len(listener.accept_queue) >= listener.backlog:
+            # the handshake couldn't complete, the peer will retransmit its SYN
+            self.listen_drops += 1
+            return
+        if listener.half_open >= listener.syn_backlog:
+            if self.syn_cookies:
+                self._send_cookie(listener, key, seg)
+            else:
+                self.listen_drops += 1
+            return
+
+        tcb = self._new_tcb(key, TCPState.SYN_RECEIVED, listener.congestion)
+        tcb.listener = listener
+        listener.half_open += 1
+        tcb.irs = seg._seq
+        tcb.rcv_nxt = seq_add(seg._seq, 1)
+        self._negotiate(tcb, seg.options())
+        self._update_window(tcb, seg)
+        self.table.insert(tcb)
+        self._send(tcb, TCP_SYN | TCP_ACK, seq=tcb.iss, options=self._syn_options(tcb))
+        self._time_syn(tcb)
+        self._arm_rtx(tcb)
+
+    def _syn_sent_arrives(self, tcb: TCB, seg: TCPHeader) -> None:
+        flags = seg._flags
+        if flags & TCP_ACK and (seq_le(seg._ack, tcb.iss) or seq_lt(tcb.snd_nxt, seg._ack)):
+            if not flags & TCP_RST:
+                self._reset(tcb.laddr, tcb.raddr, seg)
+            return
+
+        if flags & TCP_RST:
+            # connection refused
+            if flags & TCP_ACK:
+                tcb.reset = True
+                self._drop(tcb)
+            return
+
+        if not flags & TCP_SYN:
+            return
+
+        tcb.irs = seg._seq
+        tcb.rcv_nxt = seq_add(seg._seq, 1)
+        options = seg.options()
+        self._negotiate(tcb, options)
+        if flags & TCP_ACK:
+            tcb.snd_una = seg._ack
+
+        if seq_lt(tcb.iss, tcb.snd_una):
+            tcb.state = TCPState.ESTABLISHED
+            self._measure_rtt(tcb, tcb.snd_una, options)
+            self._acked(tcb)
+            self._update_window(tcb, seg)
+            self._send(tcb, TCP_ACK)
+            self._push(tcb)
+        else:
+            # simultaneous open
+            tcb.state = TCPState.SYN_RECEIVED
+            self._send(tcb, TCP_SYN | TCP_ACK, seq=tcb.iss, options=self._syn_options(tcb))
+
+    def _synchronized_arrives(self, tcb: TCB, seg: TCPHeader) -> None:
+        seq, flags, payload = seg._seq, seg._flags, seg._payload
+
+        # first, check the sequence number
+        rcv_wnd = tcb.rcv_wnd()
+        seg_len = len(payload) + (1 if flags & TCP_SYN else 0) + (1 if flags & TCP_FIN else 0)
+        if not _acceptable(tcb.rcv_nxt, rcv_wnd, seq, seg_len):
+            if not flags & TCP_RST:
+                self._send(tcb, TCP_ACK)
+                if tcb.state == TCPState.TIME_WAIT and flags & TCP_FIN:
+                    # the peer retransmits its FIN (our ACK was lost), the 2 MSL timeout restarts (RFC 793, p. 73)
+                    self._time_wait(tcb)
+            return
+
+        # trim the segment to the window (duplicate bytes at the start, bytes beyond the window at the end)
+        skip = seq_diff(tcb.rcv_nxt, seq)
+        if skip > 0:
+            if flags & TCP_SYN:
+                flags &= ~TCP_SYN
+                skip -= 1
+            payload = payload[skip:]
+            seq = tcb.rcv_nxt
+        if len(payload) > rcv_wnd:
+            payload = payload[:rcv_wnd]
+            flags &= ~TCP_FIN
+
+        options = seg.options() if seg._hl > 5 else None
+
+        # second, check the RST bit
+        if flags & TCP_RST:
+            tcb.reset = True
+            self._drop(tcb)
+            return
+
+        # fourth, check the SYN bit (a SYN in the window is an error)
+        if flags & TCP_SYN:
+            self.abort(tcb)
+            return
+
+        # fifth, check the ACK field
+        if not flags & TCP_ACK or not self._process_ack(tcb, seg, seq, options):
+            return
+
+        # seventh and eighth, process the segment text and the FIN bit
+        ack_now = self._process_text(tcb, seq, flags, payload)
+
+        # the ACK can be piggybacked on the data sent
+        self._push(tcb)
+        if tcb.ack_pending:
+            self._acknowledge(tcb, ack_now)
+
+    def _process_ack(self, tcb: TCB, seg: TCPHeader, seq: int, options: Optional[TCPOptions]) -> bool:
+        """processes the ACK field of a segment
+
+        :options: the options of the segment (None if it has none)
+
+        :returns: False if the processing of the segment stops there
+
+        """
+        ack = seg._ack
+        if tcb.state == TCPState.SYN_RECEIVED:
+            if not (seq_le(tcb.snd_una, ack) and seq_le(ack, tcb.snd_nxt)):
+                self._reset(tcb.laddr, tcb.raddr, seg)
+                return False
+
+            listener = tcb.listener
+            if listener is not None and len(listener.accept_queue) >= listener.backlog:
+                # the accept queue is full, the peer will retransmit its ACK
+                self.listen_drops += 1
+                return False
+
+            tcb.state = TCPState.ESTABLISHED
+            if listener is not None:
+                listener.half_open -= 1
+            tcb.snd_una = ack
+            self._measure_rtt(tcb, ack, options)
+            self._acked(tcb)
+            self._update_window(tcb, seg)
+
+            if listener is not None:
+                listener.accept_queue.append(tcb)
+                if listener.waiter is not None:
+                    listener.waiter()
+
+        if seq_lt(tcb.snd_max, ack):
+            # acknowledges something not sent yet
+            self._send(tcb, TCP_ACK)
+            return False
+
+        # the segment is acceptable, its timestamp can be echoed (RFC 7323, 4.3)
+        if tcb.ts_ok and options is not None and options.timestamps is not None:
+            self._update_ts_recent(tcb, seg._seq, options.timestamps[0])
+
+        if tcb.sack_ok and options is not None and options.sack:
+            self._update_scoreboard(tcb, options.sack)
+
+        if seq_lt(tcb.snd_una, ack):
+            self._new_ack(tcb, ack, options)
+        elif self._duplicate_ack(tcb, seg):
+            self._dup_ack(tcb)
+
+        if seq_lt(tcb.snd_wl1, seq) or (tcb.snd_wl1 == seq and seq_le(tcb.snd_wl2, ack)):
+            self._update_window(tcb, seg)
+
+        if tcb.fin_sent() and tcb.snd_una == tcb.snd_max:
+            # our FIN is acknowledged
+            if tcb.state == TCPState.FIN_WAIT_1:
+                tcb.state = TCPState.FIN_WAIT_2
+            elif tcb.state == TCPState.CLOSING:
+                self._time_wait(tcb)
+            elif tcb.state == TCPState.LAST_ACK:
+                self._drop(tcb)
+                return False
+
+        return True
+
+    def _new_ack(self, tcb: TCB, ack: int, options: Optional[TCPOptions]) -> None:
+        """processes an ACK acknowledging new data (round trip time, congestion control and loss recovery)"""
+        acked = seq_diff(ack, tcb.snd_una)
+        tcb.snd_buf.consume(acked)
+        tcb.snd_una = ack
+        if seq_lt(tcb.snd_nxt, ack):
+            # data sent before a retransmission timeout was received
+            tcb.snd_nxt = ack
+        tcb.dupacks = 0
+        if tcb.sacked:
+            tcb.sacked.trim(ack)
+            if not tcb.sacked:
+                tcb.sacked = None
+
+        now = self._measure_rtt(tcb, ack, options)
+        if not tcb.in_recovery:
+            tcb.cc.on_ack(acked, now)
+        elif tcb.sack_ok and seq_lt(ack, tcb.recover):
+            # the recovery goes on, the holes are retransmitted by _push
+            pass
+        elif tcb.cc.partial_ack_recovery and seq_lt(ack, tcb.recover):
+            # partial ACK: the next hole is retransmitted right away
+            tcb.cc.on_partial_ack(acked)
+            self._retransmit(tcb)
+        else:
+            tcb.in_recovery = False
+            tcb.cc.on_recovery_end()
+        self._acked(tcb)
+
+    def _measure_rtt(self, tcb: TCB, ack: int, options: Optional[TCPOptions]) -> float:
+        """takes a round trip time sample from an ACK acknowledging new data: from the echoed timestamp
+        (RFC 7323, 4.2) or if the timed segment is acknowledged
+
+        :returns: the current time
+
+        """
+        now = self._clock()
+        rtt = self._ts_rtt(tcb, options)
+        if rtt is None:
+            if tcb.rtt_seq is None or not seq_le(tcb.rtt_seq, ack):
+                return now
+            rtt = now - tcb.rtt_time
+
+        tcb.rtt_seq = None
+        # RFC 6298, 2: the first sample initializes srtt and rttvar, the next ones are smoothed
+        if tcb.srtt is None:
+            tcb.srtt = rtt
+            tcb.rttvar = rtt / 2
+        else:
+            tcb.rttvar = 0.75 * tcb.rttvar + 0.25 * abs(tcb.srtt - rtt)
+            tcb.srtt = 0.875 * tcb.srtt + 0.125 * rtt
+        tcb.rto = min(max(tcb.srtt + max(self.timers.tick, 4 * tcb.rttvar), MIN_RTO), MAX_RTO)
+        tcb.cc.on_rtt_sample(rtt, now)
+        return now
+
+    def _ts_rtt(self, tcb: TCB, options: Optional[TCPOptions]) -> Optional[float]:
+        """returns the round trip time given by the TSecr of an ACK of new data, None if it doesn't echo
+        a timestamp we sent between the one of the oldest unacknowledged segment and now (a TSecr of 0
+        or a bogus one would give a wrapped around round trip time)"""
+        if not tcb.ts_ok or options is None or options.timestamps is None:
+            return None
+        tsecr, tsval = options.timestamps[1], self._tsval()
+        if tsecr == 0 or not seq_le(tcb.ts_una, tsecr) or not seq_le(tsecr, tsval):
+            return None
+        return seq_diff(tsval, tsecr) / TS_HZ
+
+    def _time_syn(self, tcb: TCB) -> None:
+        # the handshake gives the first round trip time sample (if the SYN isn't retransmitted)
+        tcb.rtt_seq = tcb.snd_max
+        tcb.rtt_time = self._clock()
+        tcb.ts_una = self._tsval()
+
+    def _update_ts_recent(self, tcb: TCB, seq: int, tsval: int) -> None:
+        """records the TSval of a segment to echo it (RFC 7323, 4.3): the TSval of the oldest segment
+        acknowledged by an ACK is echoed, so a delayed ACK still gives the round trip time to the sender"""
+        if seq_le(seq, tcb.rcv_acked) and seq_le(tcb.ts_recent, tsval):
+            tcb.ts_recent = tsval
+
+    def _tsval(self) -> int:
+        return int(self._clock() * TS_HZ) % SEQ_MOD
+
+    def _duplicate_ack(self, tcb: TCB, seg: TCPHeader) -> bool:
+        """checks if a segment is a duplicate ACK (RFC 5681, 2): it acknowledges snd_una while there is
+        data in flight, doesn't carry data, a SYN or a FIN and doesn't change the window"""
+        return (
+            seg._ack == tcb.snd_una
+            and tcb.snd_una != tcb.snd_max
+            and not seg._payload
+            and not seg._flags & (TCP_SYN | TCP_FIN)
+            and seg._win_size << tcb.snd_wscale == tcb.snd_wnd
+        )
+
+    def _dup_ack(self, tcb: TCB) -> None:
+        tcb.dupacks += 1
+        if tcb.in_recovery:
+            # with SACK the data in flight is estimated from the scoreboard instead of inflating the window
+            if not tcb.sack_ok:
+                tcb.cc.on_dup_ack()
+        elif tcb.dupacks == DUPACK_THRESHOLD and seq_le(tcb.recover, tcb.snd_una):
+            # fast retransmit, then fast recovery until recover is acknowledged
+            tcb.in_recovery = True
+            tcb.recover = tcb.snd_max
+            tcb.cc.on_loss(seq_diff(tcb.snd_max, tcb.snd_una), self._clock())
+            self._retransmit(tcb)
+            self.fast_retransmits += 1
+
+    def _retransmit(self, tcb: TCB) -> None:
+        """sends the first unacknowledged segment again"""
+        payload = tcb.snd_buf.view(0, tcb.mss)
+        if payload:
+            self._send(tcb, TCP_ACK | TCP_PSH, seq=tcb.snd_una, payload=payload)
+        elif tcb.fin_sent():
+            self._send(tcb, TCP_FIN | TCP_ACK, seq=tcb.snd_una)
+        tcb.high_rxt = seq_add(tcb.snd_una, max(len(payload), 1))
+        # Karn's algorithm: no round trip time sample from a retransmitted segment
+        tcb.rtt_seq = None
+        self.retransmits += 1
+        self.retransmitted_bytes += max(len(payload), 1)
+
+    def _update_scoreboard(self, tcb: TCB, blocks: List[SACKBlock]) -> None:
+        """adds the SACK blocks of an ACK to the scoreboard"""
+        for start, end in blocks:
+            # blocks below snd_una (D-SACK, RFC 2883) or beyond what was sent are ignored
+            if seq_lt(tcb.snd_una, start) and seq_lt(start, end) and seq_le(end, tcb.snd_max):
+                if tcb.sacked is None:
+                    tcb.sacked = tcb.new_ranges()
+                tcb.sacked.add(start, end)
+
+    def _process_text(self, tcb: TCB, seq: int, flags: int, payload: Buffer) -> bool:
+        """processes the data and the FIN bit of a segment, tcb.ack_pending counts the segments to acknowledge
+
+        :returns: True if the segment has to be acknowledged right away (it's out of order)
+
+        """
+        need_ack = ack_now = False
+        if payload and tcb.state in RECEIVING_STATES:
+            need_ack = True
+            if seq == tcb.rcv_nxt:
+                # the payload is copied once (from the received frame), what exceeds the window is dropped
+                tcb.rcv_nxt = seq_add(tcb.rcv_nxt, tcb.rcv_buf.write(payload))
+                if tcb.ooo:
+                    # the segment fills a hole: the ACK is sent right away (RFC 5681, 4.2)
+                    self._reassemble(tcb)
+                    ack_now = True
+            else:
+                self._queue_ooo(tcb, seq, payload)
+                ack_now = True
+
+        # the FIN is only processed once all the data before it was received, an out of order FIN is kept
+        # with the out of order data
+        fin = False
+        if flags & TCP_FIN:
+            fin_seq = seq_add(seq, len(payload))
+            if fin_seq == tcb.rcv_nxt:
+                fin = True
+            elif tcb.state in RECEIVING_STATES and not tcb.fin_received:
+                tcb.ooo_fin = fin_seq
+                need_ack = ack_now = True
+        if tcb.ooo_fin is not None and tcb.ooo_fin == tcb.rcv_nxt:
+            # the data before the out of order FIN was received
+            tcb.ooo_fin = None
+            fin = True
+
+        if fin:
+            need_ack = True
+            if not tcb.fin_received:
+                tcb.fin_received = True
+                tcb.rcv_nxt = seq_add(tcb.rcv_nxt, 1)
+
+            if tcb.state == TCPState.ESTABLISHED:
+                tcb.state = TCPState.CLOSE_WAIT
+            elif tcb.state == TCPState.FIN_WAIT_1:
+                tcb.state = TCPState.CLOSING
+            elif tcb.state in (TCPState.FIN_WAIT_2, TCPState.TIME_WAIT):
+                self._time_wait(tcb)
+
+        if need_ack:
+            tcb.ack_pending += 1
+        return ack_now
+
+    def _queue_ooo(self, tcb: TCB, seq: int, payload: Buffer) -> None:
+        """stores an out of order segment at its place in the receive buffer"""
+        offset = seq_diff(seq, tcb.rcv_nxt)
+        size = min(len(payload), tcb.rcv_buf.free() - offset)
+        if size <= 0:
+            return
+        if tcb.ooo is None:
+            tcb.ooo = tcb.new_ranges()
+        # a segment that would exceed the maximum number of ranges is dropped before it's written (it will
+        # be retransmitted)
+        if tcb.ooo.add(seq, seq_add(seq, size)):
+            tcb.rcv_buf.write_at(offset, payload[:size])
+            tcb.ooo_last = seq
+
+    def _reassemble(self, tcb: TCB) -> None:
+        """delivers the out of order data that became contiguous"""
+        assert tcb.ooo is not None
+        end = tcb.ooo.pop_front(tcb.rcv_nxt)
+        if end != tcb.rcv_nxt:
+            tcb.rcv_buf.commit(seq_diff(end, tcb.rcv_nxt))
+            tcb.rcv_nxt = end
+        if not tcb.ooo:
+            tcb.ooo = None
+
+    def _sack_blocks(self, tcb: TCB) -> List[SACKBlock]:
+        """returns the SACK blocks reporting the out of order data, the first one contains the last
+        segment received (RFC 2018, 4)"""
+        blocks: List[SACKBlock] = []
+        if tcb.ooo is None:
+            return blocks
+        last = tcb.ooo.next_range(tcb.ooo_last)
+        if last is not None and seq_le(last[0], tcb.ooo_last):
+            blocks.append(last)
+        for block in tcb.ooo:
+            if len(blocks) == MAX_SACK_BLOCKS:
+                break
+            if not blocks or block != blocks[0]:
+                blocks.append(block)
+        return blocks
+
+    def _acknowledge(self, tcb: TCB, now: bool) -> None:
+        """acknowledges the received segments (RFC 1122, 4.2.3.2): the ACK is delayed until a second full
+        sized segment is received (or the FIN), for at most delayed_ack seconds, and is only sent at the
+        end of the batch of segments
+
+        :tcb: the connection
+        :now: the ACK is sent right away (out of order segments get duplicate ACKs, RFC 5681, 4.2)
+
+        """
+        if now:
+            self._send(tcb, TCP_ACK)
+        elif not self.delayed_ack or tcb.fin_received or seq_diff(tcb.rcv_nxt, tcb.rcv_acked) >= 2 * tcb.mss:
+            if self._batch is not None:
+                self._batch[tcb] = None
+            else:
+                self._send(tcb, TCP_ACK)
+        else:
+            if tcb.delack_timer is None:
+                tcb.delack_timer = Timer(self._delack_expired, tcb)
+            if not tcb.delack_timer.active():
+                self.timers.schedule(tcb.delack_timer, self.delayed_ack)
+
+    # Output
+
+    def _push(self, tcb: TCB) -> None:
+        """sends the queued data allowed by the send window, then the FIN if the connection is closed"""
+        if tcb.state not in PUSH_STATES:
+            return
+
+        if tcb.in_recovery and tcb.sack_ok:
+            self._sack_recovery(tcb)
+        else:
+            self._send_data(tcb, min(tcb.snd_wnd, tcb.cc.cwnd))
+
+        if tcb.fin_queued and seq_diff(tcb.snd_nxt, tcb.snd_una) == len(tcb.snd_buf):
+            self._send(tcb, TCP_FIN | TCP_ACK)
+            self._sent(tcb, 1)
+            if tcb.state == TCPState.ESTABLISHED:
+                tcb.state = TCPState.FIN_WAIT_1
+            elif tcb.state == TCPState.CLOSE_WAIT:
+                tcb.state = TCPState.LAST_ACK
+
+        self._persist(tcb)
+
+    def _send_data(self, tcb: TCB, wnd: int) -> None:
+        """sends data from snd_nxt while the data in flight is below wnd (the data SACKed by the peer
+        isn't sent again after a timeout)"""
+        if self._data_output is not None and tcb.snd_nxt == tcb.snd_max and self._burst(tcb, wnd):
+            return
+
+        while True:
+            offset = seq_diff(tcb.snd_nxt, tcb.snd_una)
+            size = min(len(tcb.snd_buf) - offset, wnd - offset, tcb.mss)
+            if size <= 0:
+                break
+
+            if tcb.sacked and seq_lt(tcb.snd_nxt, tcb.snd_max):
+                seq, size = self._hole(tcb, tcb.snd_nxt, size)
+                if seq != tcb.snd_nxt:
+                    tcb.snd_nxt = seq
+                    continue
+
+            # the payload is a view over the send buffer (a segment is cut where the buffer wraps around),
+            # the data stays in the buffer until it's acknowledged
+            payload = tcb.snd_buf.view(offset, size)
+            self._send(tcb, TCP_ACK | TCP_PSH, payload=payload)
+            self._sent(tcb, len(payload))
+
+    def _sack_recovery(self, tcb: TCB) -> None:
+        """fast recovery with SACK (RFC 6675, simplified): the data below the highest SACKed sequence
+        number that wasn't SACKed is considered lost and retransmitted once, then new data is sent,
+        while the data in flight (the pipe) stays below ssthresh"""
+        while self._pipe(tcb) + tcb.mss <= tcb.cc.ssthresh:
+            seq, size = self._next_hole(tcb)
+            if not size:
+                self._send_data(tcb, min(tcb.snd_wnd, seq_diff(tcb.snd_nxt, tcb.snd_una) + tcb.mss))
+                return
+
+            payload = tcb.snd_buf.view(seq_diff(seq, tcb.snd_una), size)
+            self._send(tcb, TCP_ACK | TCP_PSH, seq=seq, payload=payload)
+            tcb.high_rxt = seq_add(seq, len(payload))
+            tcb.rtt_seq = None
+            self.retransmits += 1
+            self.retransmitted_bytes += len(payload)
+
+    def _pipe(self, tcb: TCB) -> int:
+        """estimates the data in flight during a SACK recovery: what was sent beyond the highest SACKed
+        sequence number plus what was retransmitted and not SACKed yet"""
+        if not tcb.sacked:
+            return seq_diff(tcb.snd_max, tcb.snd_una)
+
+        pipe = seq_diff(tcb.snd_max, tcb.sacked.end()) + max(0, seq_diff(tcb.high_rxt, tcb.snd_una))
+        for start, end in tcb.sacked:
+            if seq_le(tcb.high_rxt, start):
+                break
+            pipe -= seq_diff(end if seq_lt(end, tcb.high_rxt) else tcb.high_rxt, start)
+        return pipe
+
+    def _next_hole(self, tcb: TCB) -> Tuple[int, int]:
+        """returns the next range to retransmit during a SACK recovery (its size is 0 if there is none)"""
+        seq = tcb.high_rxt if seq_lt(tcb.snd_una, tcb.high_rxt) else tcb.snd_una
+        while tcb.sacked and seq_lt(seq, tcb.sacked.end()):
+            start, size = self._hole(tcb, seq, tcb.mss)
+            if start == seq:
+                return seq, size
+            seq = start
+        return seq, 0
+
+    def _hole(self, tcb: TCB, seq: int, size: int) -> Tuple[int, int]:
+        """returns the first sequence number at or after seq that wasn't SACKed and the size of the range
+        to send from there (at most size, it stops before the next SACKed range)"""
+        sacked = tcb.sacked.next_range(seq) if tcb.sacked else None
+        if sacked is None:
+            return seq, size
+        start, end = sacked
+        if seq_le(start, seq):
+            return end, 0
+        return seq, min(size, seq_diff(start, seq))
+
+    def _persist(self, tcb: TCB) -> None:
+        # zero window: the persist timer probes it in case the window update of the peer is lost
+        if tcb.snd_wnd == 0 and tcb.snd_una == tcb.snd_max and len(tcb.snd_buf):
+            if tcb.persist_timer is None:
+                tcb.persist_timer = Timer(self._persist_expired, tcb)
+            if not tcb.persist_timer.active():
+                self.timers.schedule(tcb.persist_timer, self._backoff(tcb))
+        elif tcb.persist_timer is not None and tcb.persist_timer.active():
+            self.timers.cancel(tcb.persist_timer)
+            tcb.retries = 0
+
+    def _sent(self, tcb: TCB, size: int) -> None:
+        """advances snd_nxt after sending size sequence numbers"""
+        if tcb.snd_una == tcb.snd_max:
+            # nothing was in flight, the segment is the oldest unacknowledged one
+            tcb.ts_una = self._tsval()
+        if tcb.snd_nxt == tcb.snd_max:
+            # new data: it's timed if no segment is (one round trip time sample per window)
+            tcb.snd_max = seq_add(tcb.snd_max, size)
+            if tcb.rtt_seq is None:
+                tcb.rtt_seq = tcb.snd_max
+                tcb.rtt_time = self._clock()
+        else:
+            self.retransmitted_bytes += size
+        tcb.snd_nxt = seq_add(tcb.snd_nxt, size)
+        if seq_lt(tcb.snd_max, tcb.snd_nxt):
+            tcb.snd_max = tcb.snd_nxt
+        if tcb.rtx_timer is None or not tcb.rtx_timer.active():
+            self._arm_rtx(tcb)
+
+    def _burst(self, tcb: TCB, wnd: int) -> bool:
+        """sends the new data allowed by wnd with data_output in a single pass: the segments share their
+        acknowledgment number, window and timestamps, only the sequence number and the payload change
+
+        :returns: False if a segment wasn't sent by data_output (the rest is sent segment by segment)
+
+        """
+        offset = seq_diff(tcb.snd_nxt, tcb.snd_una)
+        end = min(len(tcb.snd_buf), wnd)
+        if offset >= end:
+            return True
+
+        output, view, mss = self._data_output, tcb.snd_buf.view, tcb.mss
+        assert output is not None
+        wnd = min(tcb.rcv_wnd() >> tcb.rcv_wscale, 0xFFFF)
+        tsval = self._tsval() if tcb.ts_ok else 0
+        self._acknowledged(tcb, pure=False)
+        seq, start = tcb.snd_nxt, offset
+        while offset < end:
+            # the payload is a view over the send buffer (a segment is cut where the buffer wraps around)
+            payload = view(offset, min(end - offset, mss))
+            if not output(tcb, seq, TCP_ACK | TCP_PSH, wnd, tsval, payload):
+                break
+            offset += len(payload)
+            seq = seq_add(seq, len(payload))
+
+        if offset != start:
+            self._sent(tcb, offset - start)
+        return offset == end
+
+    def _acknowledged(self, tcb: TCB, pure: bool) -> None:
+        """accounts for a segment acknowledging rcv_nxt (it replaces the ACKs due)
+
+        :pure: the segment is a pure ACK (no data, SYN or FIN)
+
+        """
+        if tcb.ack_pending:
+            # a pure ACK replaces one of the ACKs due, the other ones are saved
+            self.acks_saved += tcb.ack_pending - pure
+            tcb.ack_pending = 0
+            if tcb.delack_timer is not None:
+                self.timers.cancel(tcb.delack_timer)
+        tcb.rcv_acked = tcb.rcv_nxt
+
+    def _send(
+        self,
+        tcb: TCB,
+        flags: int,
+        seq: Optional[int] = None,
+        payload: Buffer = b"",
+        options: Optional[TCPOptions] = None,
+    ) -> None:
+        # the window of a SYN segment is never scaled
+        wnd = min(tcb.rcv_wnd() if flags & TCP_SYN else tcb.rcv_wnd() >> tcb.rcv_wscale, 0xFFFF)
+        if seq is None:
+            seq = tcb.snd_nxt
+        if flags & TCP_ACK:
+            self._acknowledged(tcb, pure=not payload and not flags & (TCP_SYN | TCP_FIN))
+
+        # the data segments (the bulk of a transfer) are built from the header template of the connection
+        if payload and options is None and flags & TCP_ACK and not flags & TCP_SYN and self._data_output is not None:
+            tsval = self._tsval() if tcb.ts_ok else 0
+            if self._data_output(tcb, seq, flags, wnd, tsval, payload):
+                return
+
+        seg = TCPHeader(
+            src_port=tcb.lport,
+            dst_port=tcb.rport,
+            seq=seq,
+            ack=tcb.rcv_nxt if flags & TCP_ACK else 0,
+            hl=5,
+            flags=flags,
+            win_size=wnd,
+            csum=0,
+            uptr=0,
+            additional_fields=b"",
+            payload=payload,
+        )
+        if options is None and tcb.ooo and tcb.sack_ok and not payload and not flags & (TCP_SYN | TCP_FIN):
+            # the SACK blocks are only sent in the pure ACKs (the data segments don't have room for them)
+            options = TCPOptions(sack=self._sack_blocks(tcb))
+        if tcb.ts_ok and not flags & TCP_SYN:
+            if options is None:
+                options = TCPOptions()
+            options.timestamps = (self._tsval(), tcb.ts_recent)
+        if options is not None:
+            seg.set_options(options)
+        self._output(tcb.laddr, tcb.raddr, seg)
+
+    def _reset(self, laddr: int, raddr: int, seg: TCPHeader) -> None:
+        """answers a segment that doesn't belong to a connection with a RST (RFC 793, reset generation)"""
+        if seg._flags & TCP_RST:
+            return
+
+        if seg._flags & TCP_ACK:
+            seq, ack, flags = seg._ack, 0, TCP_RST
+        else:
+            seg_len = len(seg._payload) + (1 if seg._flags & TCP_SYN else 0) + (1 if seg._flags & TCP_FIN else 0)
+            seq, ack, flags = 0, seq_add(seg._seq, seg_len), TCP_RST | TCP_ACK
+
+        rst = TCPHeader(
+            src_port=seg.dst_port,
+            dst_port=seg.src_port,
+            seq=seq,
+            ack=ack,
+            hl=5,
+            flags=flags,
+            win_size=0,
+            csum=0,
+            uptr=0,
+            additional_fields=b"",
+            payload=b"",
+        )
+        self._output(laddr, raddr, rst)
+
+    # SYN cookies
+
+    def _cookie(self, key: ConnKey, irs: int, count: int, mss_idx: int) -> int:
+        """computes a SYN cookie: the low 5 bits of the counter, the index of the MSS (3 bits) and
+        a keyed hash of the 4-tuple, the ISN of the peer, the counter and the MSS index (24 bits)
+
+        :key: the connection key
+        :irs: the initial sequence number of the peer
+        :count: the counter of the cookie (the clock in periods of 2**COOKIE_PERIOD_BITS seconds)
+        :mss_idx: index of the MSS of the connection in COOKIE_MSS
+        :returns: the cookie, used as our ISN
+
+        """
+        data = struct.pack("!IHIHIIB", *key, irs, count, mss_idx)
+        digest = hashlib.blake2b(data, key=self._secret, digest_size=3).digest()
+        return (count % 32) << 27 | mss_idx << 24 | int.from_bytes(digest, "big")
+
+    def _cookie_expected(self, listener: Listener) -> bool:
+        """checks if the listener sent a SYN cookie that can still be valid: the other ACKs without
+        connection are reset right away (no hash is computed, and a listener that never overflowed
+        doesn't accept a guessed cookie)"""
+        if listener.cookie_time is None:
+            return False
+        return self._clock() - listener.cookie_time < COOKIE_MAX_AGE << COOKIE_PERIOD_BITS
+
+    def _send_cookie(self, listener: Listener, key: ConnKey, seg: TCPHeader) -> None:
+        """answers a SYN with a SYN-ACK whose ISN is a SYN cookie, no TCB is created: the connection
+        is created when the ACK of the handshake brings the cookie back (see _cookie_arrives)
+
+        Only the MSS is encoded in the cookie, the connection is established without window scaling,
+        selective acknowledgments and timestamps.
+        """
+        mss = self._peer_mss(key[0], seg.options().mss)
+        mss_idx = max(sum(1 for size in COOKIE_MSS if size <= mss) - 1, 0)
+        count = int(self._clock()) >> COOKIE_PERIOD_BITS
+        syn_ack = TCPHeader(
+            src_port=seg.dst_port,
+            dst_port=seg.src_port,
+            seq=self._cookie(key, seg._seq, count, mss_idx),
+            ack=seq_add(seg._seq, 1),
+            hl=5,
+            flags=TCP_SYN | TCP_ACK,
+            win_size=min(self._buffer_size, 0xFFFF),
+            csum=0,
+            uptr=0,
+            additional_fields=b"",
+            payload=b"",
+        )
+        syn_ack.set_options(TCPOptions(mss=self.mss))
+        listener.cookie_time = self._clock()
+        self.syn_cookies_sent += 1
+        self._output(key[2], key[0], syn_ack)
+
+    def _cookie_arrives(self, listener: Listener, key: ConnKey, seg: TCPHeader) -> bool:
+        """checks if a segment without connection acknowledges a SYN cookie, the connection is then
+        established (the segment is processed by it)
+
+        :listener: the listener of the segment
+        :key: the connection key
+        :seg: the segment, it carries an ACK
+        :returns: False if the segment doesn't bring a valid cookie back
+
+        """
+        iss = seq_add(seg._ack, -1)
+        irs = seq_add(seg._seq, -1)
+        mss_idx = iss >> 24 & 0x7
+        now = int(self._clock()) >> COOKIE_PERIOD_BITS
+        count = now - ((now - (iss >> 27)) % 32)
+        if now - count >= COOKIE_MAX_AGE or self._cookie(key, irs, count, mss_idx) != iss:
+            return False
+
+        if len(listener.accept_queue) >= listener.backlog:
+            # the peer considers the connection established, it will retransmit its data (or time out)
+            self.cookie_drops += 1
+            return True
+
+        tcb = self._new_tcb(key, TCPState.ESTABLISHED, listener.congestion, iss)
+        tcb.listener = listener
+        tcb.irs = irs
+        tcb.rcv_nxt = tcb.rcv_acked = seg._seq
+        tcb.snd_una = seg._ack
+        tcb.mss = min(COOKIE_MSS[mss_idx], self.mss)
+        tcb.cc.init(tcb.mss)
+        self._update_window(tcb, seg)
+        self.table.insert(tcb)
+        self.syn_cookies_accepted += 1
+        listener.accept_queue.append(tcb)
+        if listener.waiter is not None:
+            listener.waiter()
+
+        if seg._payload or seg._flags & TCP_FIN:
+            self._synchronized_arrives(tcb, seg)
+        return True
+
+    # Timers
+
+    def _arm_rtx(self, tcb: TCB) -> None:
+        """(re)starts the retransmission timer"""
+        if tcb.rtx_timer is None:
+            tcb.rtx_timer = Timer(self._rtx_expired, tcb)
+        self.timers.schedule(tcb.rtx_timer, self._backoff(tcb))
+
+    def _backoff(self, tcb: TCB) -> float:
+        """returns the retransmission timeout backed off by the number of retries"""
+        return min(tcb.rto * (1 << tcb.retries), MAX_RTO)
+
+    def _acked(self, tcb: TCB) -> None:
+        """new data was acknowledged: the retransmission timer restarts if data is still in flight (RFC 6298, 5)"""
+        tcb.retries = 0
+        if tcb.snd_una != tcb.snd_max:
+            self._arm_rtx(tcb)
+        elif tcb.rtx_timer is not None:
+            self.timers.cancel(tcb.rtx_timer)
+
+    def _rtx_expired(self, tcb: TCB) -> None:
+        if tcb.state not in SYNCHRONIZING_STATES and (tcb.snd_una == tcb.snd_max or tcb.state not in PUSH_STATES):
+            return
+
+        tcb.retries += 1
+        if tcb.retries > (MAX_SYN_RETRIES if tcb.state in SYNCHRONIZING_STATES else MAX_RETRIES):
+            self._timed_out(tcb)
+            return
+
+        self.retransmit_timeout(tcb)
+        self._arm_rtx(tcb)
+
+    def _persist_expired(self, tcb: TCB) -> None:
+        if tcb.snd_wnd or tcb.snd_una != tcb.snd_max or tcb.state not in PUSH_STATES:
+            return
+
+        # window probe: an old sequence number, the peer answers with an ACK carrying its window
+        self._send(tcb, TCP_ACK, seq=seq_add(tcb.snd_una, -1))
+        tcb.retries += 1
+        self.timers.schedule(tcb.persist_timer, self._backoff(tcb))  # type: ignore
+
+    def _delack_expired(self, tcb: TCB) -> None:
+        if tcb.ack_pending and tcb.state != TCPState.CLOSED:
+            self._send(tcb, TCP_ACK)
+            self.delayed_acks += 1
+
+    def _idle(self, tcb: TCB) -> None:
+        """restarts the keepalive timer (something was received)"""
+        if tcb.keepalive_timer is None:
+            tcb.keepalive_timer = Timer(self._keepalive_expired, tcb)
+        tcb.probes = 0
+        if tcb.state in KEEPALIVE_STATES:
+            self.timers.schedule(tcb.keepalive_timer, KEEPALIVE_IDLE)
+
+    def _keepalive_expired(self, tcb: TCB) -> None:
+        if tcb.state not in KEEPALIVE_STATES:
+            return
+        if tcb.snd_una != tcb.snd_max:
+            # the retransmission timer detects a dead peer
+            self._idle(tcb)
+            return
+
+        if tcb.probes >= KEEPALIVE_PROBES:
+            self._timed_out(tcb)
+            return
+
+        # the probe has an old sequence number (no data), the peer answers with an ACK
+        self._send(tcb, TCP_ACK, seq=seq_add(tcb.snd_una, -1))
+        tcb.probes += 1
+        self.timers.schedule(tcb.keepalive_timer, KEEPALIVE_INTERVAL)  # type: ignore
+
+    def _timed_out(self, tcb: TCB) -> None:
+        """aborts a connection whose peer doesn't answer"""
+        self.abort(tcb)
+        tcb.reset = True
+        if tcb.waiter is not None:
+            tcb.waiter()
+
+    # State helpers
+
+    def _negotiate(self, tcb: TCB, options: TCPOptions) -> None:
+        """applies the options of the SYN of the peer
+
+        :tcb: the connection
+        :options: the options of the SYN
+
+        """
+        tcb.mss = self._peer_mss(tcb.raddr, options.mss)
+        tcb.wscale_ok = options.wscale is not None
+        tcb.sack_ok = self.sack and options.sack_permitted
+        tcb.ts_ok = self.timestamps and options.timestamps is not None
+        if tcb.ts_ok:
+            # the payload of the segments leaves room for the timestamps (RFC 6691)
+            tcb.ts_recent = options.timestamps[0]  # type: ignore
+            tcb.mss -= TIMESTAMPS_SIZE
+        tcb.cc.init(tcb.mss)
+        if options.wscale is not None:
+            tcb.snd_wscale = options.wscale
+            tcb.rcv_wscale = self._wscale
+
+    def _peer_mss(self, raddr: int, mss: Optional[int]) -> int:
+        """returns the maximum segment size to a peer: the MSS option of its SYN, bounded by ours and by the
+        path MTU"""
+        mss = min(mss or DEFAULT_MSS, self.mss)
+        if self._path_mtu is not None:
+            mss = min(mss, self._path_mtu(raddr) - IP_HEADER_SIZE - TCP_HEADER_SIZE)
+        return mss
+
+    def _syn_options(self, tcb: TCB) -> TCPOptions:
+        """returns the options of a SYN or a SYN-ACK (the window scale is only sent in a SYN-ACK
+        if the peer sent it)"""
+        if tcb.state == TCPState.SYN_SENT:
+            return TCPOptions(
+                mss=self.mss,
+                wscale=self._wscale,
+                sack_permitted=self.sack,
+                timestamps=(self._tsval(), 0) if self.timestamps else None,
+            )
+        return TCPOptions(
+            mss=self.mss,
+            wscale=tcb.rcv_wscale if tcb.wscale_ok else None,
+            sack_permitted=tcb.sack_ok,
+            timestamps=(self._tsval(), tcb.ts_recent) if tcb.ts_ok else None,
+        )
+
+    def _new_tcb(self, key: ConnKey, state: TCPState, congestion: Optional[str], iss: Optional[int] = None) -> TCB:
+        tcb = TCB(key, state, self.isn(key) if iss is None else iss, self._buffer_size)
+        tcb.cc = congestion_control(congestion or self.congestion)
+        return tcb
+
+    def _update_window(self, tcb: TCB, seg: TCPHeader) -> None:
+        # the window of a SYN segment is never scaled
+        tcb.snd_wnd = seg._win_size if seg._flags & TCP_SYN else seg._win_size << tcb.snd_wscale
+        tcb.snd_wl1 = seg._seq
+        tcb.snd_wl2 = seg._ack
+
+    def _time_wait(self, tcb: TCB) -> None:
+        """enters TIME_WAIT (or restarts its timer when the FIN is retransmitted)"""
+        tcb.state = TCPState.TIME_WAIT
+        self._cancel_timers(tcb)
+        if tcb.time_wait_timer is None:
+            tcb.time_wait_timer = Timer(self._drop, tcb)
+        self.timers.schedule(tcb.time_wait_timer, 2 * MSL)
+
+    def _drop(self, tcb: TCB) -> None:
+        if tcb.state == TCPState.SYN_RECEIVED and tcb.listener is not None:
+            tcb.listener.half_open -= 1
+        tcb.state = TCPState.CLOSED
+        self._cancel_timers(tcb)
+        if tcb.time_wait_timer is not None:
+            self.timers.cancel(tcb.time_wait_timer)
+        self.table.remove(tcb)
+
+    def _cancel_timers(self, tcb: TCB) -> None:
+        """cancels the retransmission, persist, keepalive and delayed ACK timers"""
+        for timer in (tcb.rtx_timer, tcb.persist_timer, tcb.keepalive_timer, tcb.delack_timer):
+            if timer is not None:
+                self.timers.cancel(timer)
+
+
+def _acceptable(rcv_nxt: int, rcv_wnd: int, seq: int, seg_len: int) -> bool:
+    """checks if a segment is acceptable (RFC 793, 3.3: the four cases of the segment
+    and window lengths)"""
+    if seg_len == 0:
+        if rcv_wnd == 0:
+            return seq == rcv_nxt
+        return _in_window(rcv_nxt, rcv_wnd, seq)
+
+    if rcv_wnd == 0:
+        return False
+
+    return _in_window(rcv_nxt, rcv_wnd, seq) or _in_window(rcv_nxt, rcv_wnd, seq_add(seq, seg_len - 1))
+
+
+def _in_window(rcv_nxt: int, rcv_wnd: int, seq: int) -> bool:
+    return seq_le(rcv_nxt, seq) and seq_lt(seq, seq_add(rcv_nxt, rcv_wnd))
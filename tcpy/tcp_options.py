@@ -0,0 +1,198 @@
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from .constants import (
+    TCP_OPT_EOL,
+    TCP_OPT_MSS,
+    TCP_OPT_NOP,
+    TCP_OPT_SACK,
+    TCP_OPT_SACK_PERMITTED,
+    TCP_OPT_TIMESTAMPS,
+    TCP_OPT_WSCALE,
+)
+from .ip_util import Buffer
+
+# maximum window scale shift (RFC 7323, 2.3)
+MAX_WSCALE = 14
+# maximum number of SACK blocks in a segment (3 if it also has timestamps, RFC 2018, 3)
+MAX_SACK_BLOCKS = 4
+# maximum size of the options (the header length is at most 15 words)
+MAX_OPTIONS_SIZE = 40
+# size of the timestamps option in the segments (aligned with two NOPs), the payload is reduced by as much
+TIMESTAMPS_SIZE = 12
+
+_H = struct.Struct("!H")
+_II = struct.Struct("!II")
+
+# (kind, length) prefix of each option, the layouts are padded with NOPs so the values are aligned
+# the same way as most stacks do (MSS, SACK permitted + timestamps, window scale)
+_MSS = bytes((TCP_OPT_MSS, 4))
+_SACK_PERMITTED = bytes((TCP_OPT_SACK_PERMITTED, 2))
+_TIMESTAMPS = bytes((TCP_OPT_TIMESTAMPS, 10))
+_NOP = bytes((TCP_OPT_NOP,))
+_WSCALE = bytes((TCP_OPT_WSCALE, 3))
+
+# a SACK block: (left edge, right edge) of a received range of sequence numbers
+SACKBlock = Tuple[int, int]
+
+# a template: the encoded options with zeroed values and the offsets of the values
+Template = Tuple[bytes, Optional[int], Optional[int], Optional[int]]
+
+
+class TCPOptions:
+
+    """The TCP options used by the stack: MSS (RFC 793), window scale (RFC 7323),
+    SACK permitted and SACK blocks (RFC 2018) and timestamps (RFC 7323)
+
+    They are decoded from the raw options of a segment on demand (see TCPHeader.options) and
+    encoded from a template precomputed for each combination of options (only the values are packed),
+    the SACK blocks are appended after the template.
+    """
+
+    __slots__ = ("mss", "wscale", "sack_permitted", "timestamps", "sack")
+
+    _templates: Dict[Tuple[bool, bool, bool, bool], Template] = {}
+
+    def __init__(
+        self,
+        mss: Optional[int] = None,
+        wscale: Optional[int] = None,
+        sack_permitted: bool = False,
+        timestamps: Optional[Tuple[int, int]] = None,
+        sack: Optional[List[SACKBlock]] = None,
+    ):
+        """creates new TCPOptions
+
+        :mss: maximum segment size (only in SYN segments)
+        :wscale: window scale shift (only in SYN segments)
+        :sack_permitted: whether selective acknowledgments can be used (only in SYN segments)
+        :timestamps: (TSval, TSecr)
+        :sack: SACK blocks (the first one contains the most recently received segment)
+
+        """
+        self.mss = mss
+        self.wscale = wscale
+        self.sack_permitted = sack_permitted
+        self.timestamps = timestamps
+        self.sack = sack
+
+    @classmethod
+    def decode(cls, raw: Buffer) -> "TCPOptions":
+        """decodes the options of a segment, unknown options are skipped
+
+        :raw: the options (the bytes between the fixed header and the payload)
+        :returns: an instance of TCPOptions
+
+        """
+        opts = cls()
+        idx, end = 0, len(raw)
+        while idx < end:
+            kind = raw[idx]
+            if kind == TCP_OPT_EOL:
+                break
+            if kind == TCP_OPT_NOP:
+                idx += 1
+                continue
+            if idx + 1 >= end or raw[idx + 1] < 2 or idx + raw[idx + 1] > end:
+                # malformed option, the following ones can't be found
+                break
+
+            length = raw[idx + 1]
+            if kind == TCP_OPT_MSS and length == 4:
+                opts.mss = _H.unpack_from(raw, idx + 2)[0]
+            elif kind == TCP_OPT_WSCALE and length == 3:
+                opts.wscale = min(raw[idx + 2], MAX_WSCALE)
+            elif kind == TCP_OPT_SACK_PERMITTED and length == 2:
+                opts.sack_permitted = True
+            elif kind == TCP_OPT_TIMESTAMPS and length == 10:
+                opts.timestamps = _II.unpack_from(raw, idx + 2)
+            elif kind == TCP_OPT_SACK and length % 8 == 2:
+                opts.sack = [_II.unpack_from(raw, off) for off in range(idx + 2, idx + length, 8)]
+            idx += length
+
+        return opts
+
+    def encode(self) -> bytes:
+        """encodes the options (padded to a multiple of 4 bytes)
+
+        :returns: raw bytes
+
+        """
+        key = (self.mss is not None, self.wscale is not None, self.sack_permitted, self.timestamps is not None)
+        template = TCPOptions._templates.get(key)
+        if template is None:
+            template = TCPOptions._templates[key] = _template(*key)
+
+        raw, mss_off, wscale_off, ts_off = template
+        if self.sack:
+            raw += _sack(self.sack, (MAX_OPTIONS_SIZE - len(raw) - 4) // 8)
+        if mss_off is None and wscale_off is None and ts_off is None:
+            return raw
+
+        buf = bytearray(raw)
+        if mss_off is not None:
+            _H.pack_into(buf, mss_off, self.mss)
+        if wscale_off is not None:
+            buf[wscale_off] = self.wscale  # type: ignore
+        if ts_off is not None:
+            _II.pack_into(buf, ts_off, *self.timestamps)  # type: ignore
+        return bytes(buf)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, TCPOptions):
+            return NotImplemented
+        return (self.mss, self.wscale, self.sack_permitted, self.timestamps, self.sack) == (
+            other.mss,
+            other.wscale,
+            other.sack_permitted,
+            other.timestamps,
+            other.sack,
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"TCPOptions(mss={self.mss}, wscale={self.wscale}, sack_permitted={self.sack_permitted}, "
+            f"timestamps={self.timestamps}, sack={self.sack})"
+        )
+
+
+def _sack(blocks: List[SACKBlock], room: int) -> bytes:
+    """encodes SACK blocks (aligned with two NOPs), at most room blocks are kept"""
+    blocks = blocks[: min(room, MAX_SACK_BLOCKS)]
+    buf = bytearray(_NOP + _NOP + bytes((TCP_OPT_SACK, 2 + 8 * len(blocks))) + bytes(8 * len(blocks)))
+    for idx, block in enumerate(blocks):
+        _II.pack_into(buf, 4 + 8 * idx, *block)
+    return bytes(buf)
+
+
+def _template(mss: bool, wscale: bool, sack_permitted: bool, timestamps: bool) -> Template:
+    """builds the template of a combination of options
+
+    :returns: (raw options with zeroed values, offset of the MSS, of the window scale, of the timestamps)
+
+    """
+    parts: List[bytes] = []
+    mss_off = wscale_off = ts_off = None
+
+    def add(*items: bytes) -> int:
+        parts.extend(items)
+        return sum(len(part) for part in parts)
+
+    if mss:
+        mss_off = add(_MSS)
+        add(bytes(2))
+
+    if sack_permitted and timestamps:
+        ts_off = add(_SACK_PERMITTED, _TIMESTAMPS)
+        add(bytes(8))
+    elif timestamps:
+        ts_off = add(_NOP, _NOP, _TIMESTAMPS)
+        add(bytes(8))
+    elif sack_permitted:
+        add(_NOP, _NOP, _SACK_PERMITTED)
+
+    if wscale:
+        wscale_off = add(_NOP, _WSCALE)
+        add(bytes(1))
+
+    return b"".join(parts), mss_off, wscale_off, ts_off
@@ -0,0 +1,86 @@
+from typing import Dict, Iterator, Optional, Tuple
+
+from .constants import INADDR_ANY
+from .tcb import TCB, ConnKey, Listener
+
+
+class ConnectionTable:
+
+    """A TCP connection table: connections are stored in a dict keyed by their 4-tuple
+    (the lookup of the connection of a segment is O(1) whatever the number of connections)
+    and listeners in a dict keyed by their local address and port (a listener on INADDR_ANY
+    accepts the connections to any local address that has no listener of its own)"""
+
+    def __init__(self) -> None:
+        self._conns: Dict[ConnKey, TCB] = {}
+        self._listeners: Dict[Tuple[int, int], Listener] = {}
+
+    def get(self, key: ConnKey) -> Optional[TCB]:
+        """returns the connection with the given key
+
+        :key: (remote address, remote port, local address, local port)
+        :returns: a TCB or None
+
+        """
+        return self._conns.get(key)
+
+    def insert(self, tcb: TCB) -> None:
+        """inserts a connection, throws an exception if there is already one with the same key
+
+        :tcb: the TCB of the connection
+
+        """
+        if tcb.key in self._conns:
+            raise ValueError(f"Connection {tcb.key} already exists")
+
+        self._conns[tcb.key] = tcb
+
+    def remove(self, tcb: TCB) -> None:
+        """removes a connection (nothing is done if it's not in the table)
+
+        :tcb: the TCB of the connection
+
+        """
+        if self._conns.get(tcb.key) is tcb:
+            del self._conns[tcb.key]
+
+    def listener(self, addr: int, port: int) -> Optional[Listener]:
+        """returns the listener of the given local address and port (falls back to the wildcard listener of the port)
+
+        :addr: the local address
+        :port: the local port
+        :returns: a Listener or None
+
+        """
+        listener = self._listeners.get((addr, port))
+        if listener is None:
+            listener = self._listeners.get((INADDR_ANY, port))
+        return listener
+
+    def listen(self, listener: Listener) -> None:
+        """registers a listener, throws an exception if the address and port are already used by a listener
+
+        :listener: the listener
+
+        """
+        key = (listener.addr, listener.port)
+        if key in self._listeners:
+            raise ValueError(f"Port {listener.port} is already used")
+
+        self._listeners[key] = listener
+
+    def unlisten(self, listener: Listener) -> None:
+        """unregisters a listener
+
+        :listener: the listener
+
+        """
+        key = (listener.addr, listener.port)
+        if self._listeners.get(key) is listener:
+            del self._listeners[key]
+
+    def __len__(self) -> int:
+        return len(self._conns)
+
+    def __iter__(self) -> Iterator[TCB]:
+        return iter(list(self._conns.values()))
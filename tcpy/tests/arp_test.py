@@ -1,6 +1,69 @@
-from .utils import run_cmd_with_stack
+import ctypes
+import multiprocessing
+import time
+from multiprocessing import Queue
+from multiprocessing.sharedctypes import RawArray
+from typing import List, Optional, Tuple
+
+from tcpy.arp import mac2b
+from tcpy.arp_table import ARPReplica, ARPTable
+from tcpy.constants import ARP_IPV4
+from tcpy.ip_util import ip2int
+
+from .utils import PEER_IP, STACK_IP, STACK_MAC, run_cmd_with_stack
 
 
 def test_arping() -> None:
     # Calling arping
     run_cmd_with_stack(["arping", "-c3", "-I", "tap0", "10.0.0.4"])
+
+
+def test_arp_replica_mac_change() -> None:
+    ctx = multiprocessing.get_context("fork")
+    queues: List["Queue[Tuple[int, str, bytes]]"] = [ctx.Queue() for _ in range(2)]
+    versions = RawArray(ctypes.c_uint64, 2)
+    first, second = (ARPReplica(STACK_IP, STACK_MAC, idx, queues, versions) for idx in range(2))
+
+    def lookup(replica: ARPReplica, expected: bytes) -> Optional[bytes]:
+        # entries are sent through the queue by a feeder thread, they may take some time to arrive
+        deadline = time.monotonic() + 5
+        mac = replica.get_mac_for_ip(ip2int(PEER_IP))
+        while mac != expected and time.monotonic() < deadline:
+            time.sleep(0.001)
+            mac = replica.get_mac_for_ip(ip2int(PEER_IP))
+        return mac
+
+    old, new = mac2b("00:00:00:00:00:01"), mac2b("00:00:00:00:00:02")
+    first.insert(ARP_IPV4, PEER_IP, old)
+    assert lookup(second, old) == old
+    assert not second.stale()
+
+    # The peer changed its mac address, the other replica doesn't keep the stale entry
+    assert first.update(ARP_IPV4, PEER_IP, new)
+    assert second.stale()
+    assert lookup(second, new) == new
+    assert not second.stale()
+    assert not first.stale()
+
+    # An entry published but not received yet: the lookup waits for it at most SYNC_TIMEOUT
+    versions[0] += 1
+    start = time.monotonic()
+    assert second.get_mac_for_ip(ip2int(PEER_IP)) == new
+    assert time.monotonic() - start < 1 and second.stale()
+    versions[0] -= 1
+    assert not second.stale()
+
+
+def test_arp_replica_from_table() -> None:
+    table = ARPTable(STACK_IP, STACK_MAC)
+    mac = mac2b("00:00:00:00:00:01")
+    table.insert(ARP_IPV4, PEER_IP, mac)
+
+    queues: List["Queue[Tuple[int, str, bytes]]"] = [multiprocessing.get_context("fork").Queue()]
+    replica = ARPReplica.from_table(table, 0, queues, RawArray(ctypes.c_uint64, 1))
+    assert replica.snapshot() == table.snapshot() == {(ARP_IPV4, PEER_IP): mac}
+    # the values cached with the version of the table are rebuilt
+    assert replica.version() != table.version()
+    # the snapshot is a copy
+    replica.insert(ARP_IPV4, STACK_IP, mac)
+    assert len(table.snapshot()) == 1
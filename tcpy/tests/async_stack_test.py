@@ -0,0 +1,53 @@
+import asyncio
+
+from tcpy.arp import mac2b
+from tcpy.async_stack import AsyncStack
+from tcpy.constants import ARP_IPV4, ICMP_V4_REPLY, TCP_SYN
+from tcpy.eth import EthernetHeader
+from tcpy.icmpv4 import ICMPv4Header
+from tcpy.ip import IPHeader
+from tcpy.netdev import SocketPairDevice
+from tcpy.tcb import INITIAL_RTO
+from tcpy.tcp import TCPHeader
+
+from .utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC, icmp_echo_frame
+
+
+def test_async_stack() -> None:
+    device = SocketPairDevice()
+    peer_sock = device.peer
+    peer_sock.setblocking(False)
+
+    stack = AsyncStack(ip=STACK_IP, mac=STACK_MAC, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+
+    async def ping(loop: asyncio.AbstractEventLoop, size: int) -> int:
+        await loop.sock_sendall(peer_sock, icmp_echo_frame(size))
+        raw = await loop.sock_recv(peer_sock, 65535)
+        icmp = ICMPv4Header.decode(IPHeader.decode(EthernetHeader.decode(raw).payload).payload)
+        assert icmp._typ == ICMP_V4_REPLY
+        return len(icmp._data)
+
+    async def main() -> None:
+        loop = asyncio.get_running_loop()
+        server = asyncio.ensure_future(stack.serve_forever())
+        await asyncio.sleep(0)
+
+        for size in (56, 1000):
+            assert await asyncio.wait_for(ping(loop, size), 1) == size
+
+        # TCP timers run on the loop: the unanswered SYN is retransmitted after the RTO
+        tcb = stack.connect(PEER_IP, 4242)
+        stack.flush()
+        for _ in range(2):
+            raw = await asyncio.wait_for(loop.sock_recv(peer_sock, 65535), 2 * INITIAL_RTO)
+            syn = TCPHeader.decode(IPHeader.decode(EthernetHeader.decode(raw).payload).payload)
+            assert syn._flags == TCP_SYN and syn._seq == tcb.iss
+        assert stack.tcp.retransmits == 1
+
+        stack.close()
+        await asyncio.wait_for(server, 1)
+
+    asyncio.run(main())
+
+    device.close()
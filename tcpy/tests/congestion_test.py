@@ -0,0 +1,81 @@
+import pytest
+
+from tcpy.congestion import INFINITE_SSTHRESH, Cubic, NewReno, Reno, congestion_control
+
+MSS = 1000
+
+
+def test_reno() -> None:
+    cc = Reno()
+    cc.init(MSS)
+    assert cc.cwnd == 10 * MSS and cc.ssthresh == INFINITE_SSTHRESH
+
+    # slow start: the window grows by the acknowledged data (at most 2 segments per ACK)
+    cc.on_ack(MSS, 0)
+    cc.on_ack(3 * MSS, 0)
+    assert cc.cwnd == 13 * MSS
+
+    # fast retransmit and fast recovery
+    cc.on_loss(20 * MSS, 0)
+    assert cc.ssthresh == 10 * MSS and cc.cwnd == 13 * MSS
+    cc.on_dup_ack()
+    assert cc.cwnd == 14 * MSS
+    cc.on_partial_ack(MSS)
+    assert cc.cwnd == 14 * MSS
+    cc.on_recovery_end()
+    assert cc.cwnd == 10 * MSS
+
+    # congestion avoidance: one segment per window
+    for _ in range(10):
+        cc.on_ack(MSS, 0)
+    assert 10 * MSS < cc.cwnd <= 11 * MSS
+
+    cc.on_timeout(8 * MSS, 0)
+    assert cc.ssthresh == 4 * MSS and cc.cwnd == MSS
+
+
+def test_newreno_partial_ack() -> None:
+    cc = NewReno()
+    cc.init(MSS)
+    cc.on_loss(20 * MSS, 0)
+    assert cc.cwnd == 13 * MSS
+    # the window is deflated by the acknowledged data
+    cc.on_partial_ack(4 * MSS)
+    assert cc.cwnd == 10 * MSS
+
+
+def test_cubic() -> None:
+    cc = Cubic()
+    cc.init(MSS)
+    cc.on_rtt_sample(0.1, 0)
+    cc.cwnd = 100 * MSS
+    cc.ssthresh = 100 * MSS
+
+    cc.on_loss(100 * MSS, 0)
+    cc.on_recovery_end()
+    assert cc.cwnd == 70 * MSS and cc.w_max == 100
+
+    # the window grows back to w_max in K seconds (concave), then probes beyond it (convex)
+    now, windows = 0.0, []
+    while now < 8:
+        for _ in range(cc.cwnd // MSS):
+            cc.on_ack(MSS, now)
+        windows.append(cc.cwnd / MSS)
+        now += 0.1
+
+    k = round(cc.k / 0.1)
+    assert 95 <= windows[k] <= 105
+    assert windows[k // 2] - windows[0] > windows[k] - windows[k // 2]
+    assert windows[-1] > 110
+
+    # fast convergence: w_max is lowered if the window didn't reach the previous w_max
+    cc.cwnd = 90 * MSS
+    cc.w_max = 100
+    cc.on_loss(90 * MSS, now)
+    assert cc.w_max == pytest.approx(90 * 1.7 / 2)
+
+
+def test_congestion_control() -> None:
+    assert isinstance(congestion_control("cubic"), Cubic)
+    with pytest.raises(ValueError):
+        congestion_control("bbr")
@@ -0,0 +1,55 @@
+import pytest
+
+from tcpy.header import Bits, Field, HeaderSpec
+
+
+class Hdr:
+    __slots__ = ("version", "ihl", "len")
+
+    version: int
+    ihl: int
+    len: int
+
+
+SPEC = HeaderSpec(
+    Bits("B", ("version", 4), ("ihl", 4)),
+    Field("len", "H"),
+    Bits("H", ("flags", 3), (None, 1), ("offset", 12)),
+    Field("mac", "6s"),
+)
+
+
+def test_header_spec() -> None:
+    raw = bytes.fromhex("4505dc" "bfff" "aabbccddeeff")
+
+    assert SPEC.size == len(raw)
+    assert SPEC.names == ["version", "ihl", "len", "flags", "offset", "mac"]
+
+    values = SPEC.unpack_from(b"\x00" + raw, 1)
+    assert values == (4, 5, 1500, 0b101, 0xFFF, bytes.fromhex("aabbccddeeff"))
+
+    # The reserved bit is zeroed when encoding
+    assert SPEC.pack(*values) == bytes.fromhex("4505dc" "afff" "aabbccddeeff")
+
+    buf = bytearray(SPEC.size + 2)
+    SPEC.pack_into(buf, 2, *values)
+    assert buf[2:] == SPEC.pack(*values)
+
+    decoders = SPEC.decoders()
+    assert tuple(decoders[name](memoryview(raw)) for name in SPEC.names) == values
+    assert SPEC.offset("offset") == 3
+
+
+def test_header_spec_objects() -> None:
+    spec = HeaderSpec(Bits("B", ("version", 4), ("ihl", 4)), Field("len", "H"))
+    hdr = Hdr()
+    spec.decode_into(hdr, bytes.fromhex("4605dc"))
+    assert (hdr.version, hdr.ihl, hdr.len) == (4, 6, 1500)
+
+    hdr.ihl = 5
+    assert spec.encode(hdr) == bytes.fromhex("4505dc")
+
+
+def test_bits_must_fill_the_field() -> None:
+    with pytest.raises(ValueError):
+        Bits("H", ("flags", 3), ("offset", 12))
@@ -1,6 +1,30 @@
+from tcpy.constants import ICMP_V4_ECHO, ICMP_V4_REPLY
+from tcpy.icmpv4 import ICMPv4Header
+
 from .utils import run_cmd_with_stack
 
 
 def test_arping() -> None:
     # Calling ping
     run_cmd_with_stack(["ping", "-c3", "10.0.0.4"])
+
+
+def test_icmp_reply() -> None:
+    echo = ICMPv4Header(typ=ICMP_V4_ECHO, code=0, csum=0, data=bytes(range(61)))
+    echo.adjust_checksum()
+
+    icmp_r = ICMPv4Header.decode(echo.encode()).reply()
+    assert icmp_r._typ == ICMP_V4_REPLY
+
+    # decoding checks the (incrementally updated) checksum
+    ICMPv4Header.decode(icmp_r.encode())
+
+
+def test_icmp_reply_all_zero() -> None:
+    # the reply is all zero: its checksum must be 0xFFFF (0x0000 wouldn't verify, RFC 1624, 3)
+    echo = ICMPv4Header(typ=ICMP_V4_ECHO, code=0, csum=0, data=bytes(60))
+    echo.adjust_checksum()
+
+    icmp_r = ICMPv4Header.decode(echo.encode()).reply()
+    assert icmp_r._csum == 0xFFFF
+    ICMPv4Header.decode(icmp_r.encode())
@@ -1,4 +1,14 @@
-from tcpy.ip_util import ip_checksum
+import random
+import struct
+
+import pytest
+
+from tcpy.constants import ICMP, IP_MF
+from tcpy.header import fields
+from tcpy.ip import IP_HEADER_SIZE, MIN_MTU, IPHeader, check_checksum, fragment
+from tcpy.ip_util import checksum_update, checksum_update16, ip_checksum, sum_by_16bits
+
+from .utils import ip_frame
 
 
 def test_ip_checksum() -> None:
@@ -52,3 +62,148 @@ def test_ip_checksum() -> None:
     ]
 
     assert ip_checksum(bytes(hdr2)) == 0
+
+
+def _reference_checksum(raw: bytes, start: int = 0) -> int:
+    # Straightforward RFC 1071 implementation, summing one 16 bits word at a time
+    csum = start
+    for idx in range(0, len(raw) - 1, 2):
+        csum += struct.unpack("!H", raw[idx : idx + 2])[0]
+
+    if len(raw) & 1:
+        csum += raw[-1] << 8
+
+    while csum >> 16:
+        csum = (csum & 0xFFFF) + (csum >> 16)
+
+    return csum ^ 0xFFFF
+
+
+def test_ip_checksum_equivalence() -> None:
+    rand = random.Random(42)
+    sizes = [0, 1, 2, 3, 19, 20, 21, 60, 1499, 1500, 9000, 9001]
+
+    for size in sizes:
+        raw = bytes(rand.getrandbits(8) for _ in range(size))
+        for start in (0, 1, 0xFFFF, 0x1FFFE, rand.getrandbits(20)):
+            expected = _reference_checksum(raw, start=start)
+            assert ip_checksum(raw, start=start) == expected
+            assert ip_checksum(bytearray(raw), start=start) == expected
+            assert ip_checksum(memoryview(raw), start=start) == expected
+            # memoryview slices over a bigger buffer (not aligned on 16 bits)
+            padded = memoryview(b"\xaa" + raw + b"\xbb")
+            assert ip_checksum(padded[1 : size + 1], start=start) == expected
+
+
+def test_ip_checksum_edge_cases() -> None:
+    for raw in (b"", b"\x00" * 20, b"\xff" * 20, b"\xff\xff", b"\xff", b"\x00\x01" * 3):
+        assert ip_checksum(raw) == _reference_checksum(raw)
+        assert sum_by_16bits(raw) <= 0xFFFF
+
+
+def test_checksum_update() -> None:
+    rand = random.Random(1624)
+
+    for _ in range(200):
+        size = rand.randrange(2, 200) & ~1
+        raw = bytearray(rand.getrandbits(8) for _ in range(size))
+        csum = ip_checksum(raw)
+
+        # Change a random 16 bits aligned range of bytes
+        start = rand.randrange(0, size, 2)
+        end = rand.randrange(start, size + 1, 2)
+        old = bytes(raw[start:end])
+        raw[start:end] = bytes(rand.getrandbits(8) for _ in range(end - start))
+
+        assert checksum_update(csum, old, raw[start:end]) == ip_checksum(raw)
+
+        # Single 16 bits word
+        old_word = struct.unpack("!H", raw[start : start + 2])[0]
+        new_word = rand.getrandbits(16)
+        csum = ip_checksum(raw)
+        raw[start : start + 2] = struct.pack("!H", new_word)
+        assert checksum_update16(csum, old_word, new_word) == ip_checksum(raw)
+
+
+def test_checksum_update_zero() -> None:
+    # the data becomes all zero: the updated checksum is 0xFFFF like a full computation, not 0x0000
+    raw = b"\x08\x00" + bytes(18)
+    assert checksum_update16(ip_checksum(raw), 0x0800, 0) == ip_checksum(bytes(20)) == 0xFFFF
+    assert checksum_update(ip_checksum(raw), raw[:2], bytes(2)) == 0xFFFF
+
+
+def test_checksum_update_removed_bytes() -> None:
+    raw = bytes(range(40))
+    assert checksum_update(ip_checksum(raw), raw[20:], b"") == ip_checksum(raw[:20])
+
+
+def test_lazy_ip_header() -> None:
+    raw = bytes.fromhex("4500005441e040004001e4c00a0000040a000005") + bytes(64)
+
+    eager = IPHeader.decode(raw)
+    lazy = IPHeader.decode(raw, lazy=True)
+    assert isinstance(lazy, IPHeader)
+
+    # Dispatching only decodes the protocol
+    assert lazy.is_icmp() and not lazy.is_tcp()
+    decoded = set()
+    for name in IPHeader.__slots__:
+        try:
+            vars(IPHeader)[name].__get__(lazy)
+            decoded.add(name)
+        except AttributeError:
+            pass
+    assert decoded == {"proto"}
+
+    assert fields(lazy) == fields(eager)
+    assert lazy.encode() == eager.encode() == raw
+
+    # the checksum is verified separately
+    corrupted = bytearray(raw)
+    corrupted[8] = 1
+    assert IPHeader.decode(corrupted, lazy=True).is_icmp()
+    check_checksum(raw)
+    with pytest.raises(ValueError):
+        check_checksum(corrupted)
+    with pytest.raises(ValueError):
+        IPHeader.decode(corrupted)
+
+
+def test_fragment_fields() -> None:
+    raw = ip_frame(ICMP, bytes(64), 0x1234, IP_MF, 0x1ABC)[14:]
+    for hdr in (IPHeader.decode(raw), IPHeader.decode(raw, lazy=True)):
+        # the 13 bits of the fragment offset
+        assert hdr._frag_offset == 0x1ABC
+        assert hdr._flags == IP_MF and hdr.id == 0x1234
+        assert hdr.is_fragment()
+    assert not IPHeader.decode(ip_frame(ICMP, bytes(64))[14:]).is_fragment()
+
+
+def test_fragment() -> None:
+    payload = bytes(idx & 0xFF for idx in range(3000))
+    header = IPHeader.build(1, 2, ICMP, len(payload), 42, flags=0).encode()
+
+    frags = fragment(header, payload, 1000)
+    # 976 bytes per fragment: the biggest multiple of 8 fitting in the MTU with the header
+    assert [len(data) for _, data in frags] == [976, 976, 976, 72]
+    data = b""
+    for idx, (raw, part) in enumerate(frags):
+        hdr = IPHeader.decode(bytes(raw) + bytes(part))
+        assert hdr.len == IP_HEADER_SIZE + len(part) <= 1000
+        assert hdr.id == 42 and hdr.is_fragment()
+        assert hdr._frag_offset * 8 == len(data)
+        assert hdr._flags == (0 if idx == len(frags) - 1 else IP_MF)
+        data += bytes(hdr.payload)
+    assert data == payload
+
+    # the fragments of a fragment (not the last one) keep the more fragments flag and its offset
+    raw, part = frags[1]
+    for sub_raw, sub_part in fragment(raw, part, 500):
+        hdr = IPHeader.decode(bytes(sub_raw) + bytes(sub_part))
+        assert hdr._flags == IP_MF and hdr._frag_offset * 8 >= 976
+
+    # the smallest MTU still leaves room for some payload, a smaller one is refused
+    assert [len(data) for _, data in fragment(header, payload[:100], MIN_MTU)] == [48, 48, 4]
+    for mtu in (MIN_MTU - 1, IP_HEADER_SIZE):
+        with pytest.raises(ValueError):
+            fragment(header, payload, mtu)
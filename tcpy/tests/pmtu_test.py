@@ -0,0 +1,40 @@
+from tcpy.pmtu import MAX_ENTRIES, MIN_PMTU, PMTU_TIMEOUT, PMTUCache
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_pmtu_cache() -> None:
+    clock = Clock()
+    cache = PMTUCache(clock)
+    assert cache.get(1, 1500) == 1500
+
+    # The path MTU only decreases
+    assert cache.update(1, 1400, 1500)
+    assert not cache.update(1, 1450, 1500)
+    assert cache.get(1, 1500) == 1400
+    # the MTU of the link still bounds it
+    assert cache.get(1, 1280) == 1280
+    assert cache.get(2, 1500) == 1500
+
+    # Routers not reporting their MTU (or reporting a bogus one): the plateau below the datagram is used
+    assert cache.update(1, 0, 1400) and cache.get(1, 1500) == 1006
+    assert cache.update(3, 9000, 4000) and cache.get(3, 9000) == 2002
+    # too small values are raised
+    assert cache.update(4, 100, 1500) and cache.get(4, 1500) == MIN_PMTU
+
+    # The estimates expire
+    clock.now += PMTU_TIMEOUT
+    assert cache.get(1, 1500) == 1500
+    assert len(cache) == 2
+
+    # The number of destinations is bounded
+    for daddr in range(MAX_ENTRIES + 10):
+        cache.update(daddr, 1000, 1500)
+    assert len(cache) == MAX_ENTRIES
+    assert cache.get(0, 1500) == 1500 and cache.get(MAX_ENTRIES + 9, 1500) == 1000
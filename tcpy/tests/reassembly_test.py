@@ -0,0 +1,114 @@
+import random
+from typing import List
+
+from tcpy.constants import ICMP, IP_DF
+from tcpy.eth import ETH_HEADER_SIZE
+from tcpy.ip import IPHeader
+from tcpy.reassembly import DATAGRAM_OVERHEAD, REASSEMBLY_TIMEOUT, Reassembler
+from tcpy.timer_wheel import TimerWheel
+
+from .utils import fragment_frames, ip_frame
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def fragments(payload: bytes, size: int, id: int = 1) -> List[bytes]:
+    return [frame[ETH_HEADER_SIZE:] for frame in fragment_frames(ICMP, payload, size, id)]
+
+
+def test_reassembly() -> None:
+    rand = random.Random(815)
+    reassembler = Reassembler(TimerWheel(Clock()))
+    payload = bytes(rand.getrandbits(8) for _ in range(5000))
+
+    for size in (8, 1480, 4096):
+        frags = fragments(payload, size)
+        # the fragments arrive in any order, some of them twice, partly overlapping ones too
+        frags += rand.sample(frags, len(frags) // 2)
+        rand.shuffle(frags)
+        if size == 8:
+            frags.insert(0, fragments(payload, 2400)[0])
+        results = [reassembler.add(frag) for frag in frags]
+        datagram = next(result for result in results if result is not None)
+        hdr = IPHeader.decode(datagram)
+        assert hdr.payload == payload
+        assert not hdr.is_fragment() and hdr.len == 20 + len(payload)
+        assert hdr.proto == ICMP and hdr.id == 1
+        # the following duplicates start a new datagram
+        reassembler = Reassembler(TimerWheel(Clock()))
+
+    # the fragments of different datagrams don't mix
+    first, second = fragments(payload, 1480, id=1), fragments(payload[::-1], 1480, id=2)
+    for frag in first[:-1] + second[:-1]:
+        assert reassembler.add(frag) is None
+    assert len(reassembler) == 2
+    assert IPHeader.decode(reassembler.add(second[-1])).payload == payload[::-1]  # type: ignore
+    assert IPHeader.decode(reassembler.add(first[-1])).payload == payload  # type: ignore
+    assert len(reassembler) == 0 and reassembler.memory == 0
+    assert reassembler.reassembled == 2
+
+
+def test_invalid_fragments() -> None:
+    reassembler = Reassembler(TimerWheel(Clock()))
+    payload = bytes(range(256)) * 8
+
+    # the size of a fragment that isn't the last one is a multiple of 8 bytes
+    assert reassembler.add(fragments(payload, 100)[0]) is None
+    # beyond the maximum size of a datagram
+    assert reassembler.add(ip_frame(ICMP, bytes(64), 1, 0, 0x1FFF)[ETH_HEADER_SIZE:]) is None
+    assert reassembler.invalid == 2 and len(reassembler) == 0
+
+    # two last fragments ending at different offsets
+    frags = fragments(payload, 512)
+    assert reassembler.add(frags[-1]) is None
+    assert reassembler.add(fragments(payload[:1024], 512)[-1]) is None
+    assert reassembler.invalid == 3 and len(reassembler) == 0
+
+    # an unfragmented datagram keeps its don't fragment flag
+    assert IPHeader.decode(ip_frame(ICMP, payload)[ETH_HEADER_SIZE:])._flags == IP_DF
+
+
+def test_reassembly_timeout() -> None:
+    clock = Clock()
+    timers = TimerWheel(clock)
+    reassembler = Reassembler(timers)
+    frags = fragments(bytes(3000), 1480)
+
+    reassembler.add(frags[0])
+    clock.now += REASSEMBLY_TIMEOUT / 2
+    timers.advance()
+    reassembler.add(frags[1])
+    clock.now += REASSEMBLY_TIMEOUT / 2
+    timers.advance()
+    # the timeout runs from the first fragment
+    assert len(reassembler) == 0 and reassembler.memory == 0
+    assert reassembler.timeouts == 1
+    assert reassembler.add(frags[2]) is None
+    assert len(timers) == 1
+
+
+def test_reassembly_memory() -> None:
+    max_memory = 32 * 1024
+    reassembler = Reassembler(TimerWheel(Clock()), max_memory=max_memory)
+
+    # A flood of incomplete datagrams: the oldest ones are evicted
+    for id in range(1000):
+        frags = fragments(bytes(8000), 1480, id=id)
+        reassembler.add(frags[len(frags) // 2])
+        assert reassembler.memory <= max_memory
+    assert reassembler.evicted > 950
+    assert len(reassembler) * DATAGRAM_OVERHEAD < reassembler.memory <= max_memory
+
+    # a complete datagram still goes through
+    results = [reassembler.add(frag) for frag in fragments(bytes(8000), 1480, id=1000)]
+    assert results[-1] is not None and reassembler.reassembled == 1
+
+    # a datagram bigger than the memory limit can't be reassembled
+    frags = fragments(bytes(max_memory), 1480, id=1001)
+    assert [reassembler.add(frag) for frag in frags] == [None] * len(frags)
@@ -0,0 +1,55 @@
+from tcpy.ring_buffer import RingBuffer
+
+
+def test_ring_buffer() -> None:
+    ring = RingBuffer(8)
+    assert len(ring) == 0 and ring.free() == 8
+    # the storage is allocated on the first write
+    assert ring.views(8) == [] and ring.read(8) == b""
+
+    assert ring.write(b"abcdef") == 6
+    assert ring.read(4) == b"abcd"
+    # only the free space is written, the data wraps around the end of the storage
+    assert ring.write(b"ghijklmnop") == 6
+    assert len(ring) == 8 and ring.free() == 0
+    assert ring.write(b"q") == 0
+
+    assert bytes(ring.view(0, 8)) == b"efgh"
+    assert bytes(ring.view(3, 8)) == b"h"
+    assert bytes(ring.view(4, 3)) == b"ijk"
+    assert [bytes(view) for view in ring.views(6)] == [b"efgh", b"ij"]
+
+    buf = memoryview(bytearray(5))
+    assert ring.read_into(buf) == 5
+    assert bytes(buf) == b"efghi"
+    ring.consume(2)
+    assert ring.read(10) == b"l"
+
+    # views are over the storage (no copy)
+    ring.write(b"xyz")
+    view = ring.view(0, 3)
+    ring.consume(1)
+    ring.write(b"ABCDEF")
+    assert bytes(view) == b"Fyz"
+
+    # the storage is freed once the buffer is empty, the views over it are still valid
+    ring.consume(len(ring))
+    assert len(ring._buf) == 0
+    assert bytes(view) == b"Fyz"
+    assert ring.write(b"abc") == 3 and ring.read(8) == b"abc"
+
+
+def test_ring_buffer_write_ahead() -> None:
+    ring = RingBuffer(8)
+    ring.write(b"abcd")
+    ring.consume(2)
+    # written ahead of the stored data, it wraps around the end of the storage
+    assert ring.write_at(2, b"ghij") == 4
+    assert ring.write_at(6, b"xyz") == 0
+    assert len(ring) == 2 and ring.free() == 6
+    assert ring.read(2) == b"cd"
+
+    # the storage isn't reset while data is written ahead
+    assert ring.write(b"ef") == 2
+    ring.commit(4)
+    assert ring.read(8) == b"efghij"
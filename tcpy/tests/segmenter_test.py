@@ -0,0 +1,45 @@
+from tcpy.arp import mac2b
+from tcpy.constants import ETH_P_IP, IP_TCP, TCP_ACK, TCP_PSH
+from tcpy.eth import EthernetHeader
+from tcpy.ip import IPHeader
+from tcpy.ip_util import ip2int
+from tcpy.segmenter import HeaderTemplate
+from tcpy.tcp import TCPHeader
+from tcpy.tcp_options import TCPOptions
+
+from .utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC
+
+
+def encode(timestamps: bool, payload: bytes) -> bytes:
+    """encodes a segment with the header objects"""
+    saddr, daddr = ip2int(STACK_IP), ip2int(PEER_IP)
+    tcp_hdr = TCPHeader(
+        src_port=80,
+        dst_port=5000,
+        seq=0xFFFFFF00,
+        ack=1234,
+        hl=5,
+        flags=TCP_ACK | TCP_PSH,
+        win_size=0x1234,
+        csum=0,
+        uptr=0,
+        additional_fields=b"",
+        payload=payload,
+    )
+    if timestamps:
+        tcp_hdr.set_options(TCPOptions(timestamps=(0xDEADBEEF, 42)))
+    ip_hdr = IPHeader.build(saddr, daddr, IP_TCP, tcp_hdr._length(), 7)
+    tcp_hdr.adjust_checksum(ip_hdr)
+    return EthernetHeader.spec.pack(mac2b(PEER_MAC), mac2b(STACK_MAC), ETH_P_IP) + ip_hdr.encode() + tcp_hdr.encode()
+
+
+def test_header_template() -> None:
+    for timestamps in (False, True):
+        template = HeaderTemplate(
+            mac2b(STACK_MAC), mac2b(PEER_MAC), ip2int(STACK_IP), ip2int(PEER_IP), 80, 5000, timestamps, 0
+        )
+        # the template is reused: every segment only patches its fields
+        for size in (1, 1447, 1448, 0):
+            payload = bytes(idx & 0xFF for idx in range(size))
+            headers = template.headers(0xFFFFFF00, 1234, TCP_ACK | TCP_PSH, 0x1234, 7, 0xDEADBEEF, 42, payload)
+            assert bytes(headers) + payload == encode(timestamps, payload)
@@ -0,0 +1,114 @@
+import random
+from typing import List, Set, Tuple
+
+from tcpy.seq import SEQ_MOD, SeqRanges, seq_add
+
+
+def ranges(seqs: Set[int]) -> List[Tuple[int, int]]:
+    """returns the sorted ranges of a set of (unwrapped) sequence numbers"""
+    result: List[Tuple[int, int]] = []
+    for seq in sorted(seqs):
+        if result and result[-1][1] == seq:
+            result[-1] = (result[-1][0], seq + 1)
+        else:
+            result.append((seq, seq + 1))
+    return result
+
+
+def test_add_merges_ranges() -> None:
+    seqs = SeqRanges(max_ranges=100)
+    assert seqs.add(100, 200)
+    assert seqs.add(300, 400)
+    assert list(seqs) == [(100, 200), (300, 400)]
+
+    # overlapping and touching ranges are merged
+    assert seqs.add(150, 250)
+    assert seqs.add(250, 300)
+    assert list(seqs) == [(100, 400)]
+    assert seqs.size == 300
+
+    assert seqs.add(50, 60)
+    assert seqs.add(0, 500)
+    assert list(seqs) == [(0, 500)] and seqs.size == 500
+    assert not seqs.add(10, 10)
+
+
+def test_front() -> None:
+    seqs = SeqRanges(max_ranges=100)
+    for start in (100, 300, 500):
+        seqs.add(start, start + 100)
+
+    # no range starts at or before the sequence number
+    assert seqs.pop_front(50) == 50
+    assert seqs.pop_front(100) == 200
+    assert list(seqs) == [(300, 400), (500, 600)]
+    assert seqs.next_range(350) == (300, 400)
+    assert seqs.next_range(400) == (500, 600)
+    assert seqs.next_range(600) is None
+    assert seqs.end() == 600
+
+    seqs.trim(550)
+    assert list(seqs) == [(550, 600)] and seqs.size == 50
+    seqs.trim(600)
+    assert not seqs and seqs.size == 0
+
+
+def test_wrap_around() -> None:
+    seqs = SeqRanges(max_ranges=100)
+    start = SEQ_MOD - 1000
+    assert seqs.add(start, seq_add(start, 500))
+    assert seqs.add(seq_add(start, 1500), seq_add(start, 2000))
+    assert seqs.add(seq_add(start, 500), seq_add(start, 1500))
+    assert list(seqs) == [(start, 1000)]
+    assert seqs.pop_front(start) == 1000
+    assert not seqs
+
+    # the reference follows the ranges: the set is never empty while the sequence numbers go around
+    # the sequence space several times
+    front = 0
+    seqs.add(10, 20)
+    for _ in range(12):
+        following = seq_add(front, SEQ_MOD // 3)
+        assert seqs.add(seq_add(following, 10), seq_add(following, 20))
+        assert seqs.pop_front(seq_add(front, 10)) == seq_add(front, 20)
+        assert list(seqs) == [(seq_add(following, 10), seq_add(following, 20))]
+        front = following
+
+
+def test_max_ranges() -> None:
+    seqs = SeqRanges(max_ranges=2)
+    assert seqs.add(0, 10) and seqs.add(20, 30)
+    assert not seqs.add(40, 50)
+    # a range merged with the existing ones is still accepted
+    assert seqs.add(10, 15) and seqs.add(30, 50)
+    assert list(seqs) == [(0, 15), (20, 50)]
+
+
+def test_random() -> None:
+    rand = random.Random(42)
+    base = SEQ_MOD - 5000
+    seqs = SeqRanges(max_ranges=10000)
+    expected: Set[int] = set()
+    front = 0
+    for _ in range(2000):
+        action = rand.random()
+        if action < 0.7:
+            start = front + rand.randrange(3000)
+            end = start + rand.randrange(1, 100)
+            assert seqs.add(seq_add(base, start), seq_add(base, end))
+            expected.update(range(start, end))
+        elif action < 0.85:
+            front += rand.randrange(200)
+            seqs.trim(seq_add(base, front))
+            expected = {seq for seq in expected if seq >= front}
+        else:
+            front += rand.randrange(200)
+            end = front
+            while end in expected:
+                end += 1
+            assert seqs.pop_front(seq_add(base, front)) == seq_add(base, end)
+            expected = {seq for seq in expected if seq > end}
+            front = end
+
+        assert list(seqs) == [(seq_add(base, start), seq_add(base, end)) for start, end in ranges(expected)]
+        assert seqs.size == len(expected)
@@ -0,0 +1,146 @@
+import asyncio
+import select
+import threading
+from typing import Tuple
+
+import pytest
+
+from tcpy.async_stack import AsyncStack
+from tcpy.congestion import Cubic
+from tcpy.netdev import SocketDevice
+from tcpy.socket import AsyncSocket, Socket
+from tcpy.stack import Stack
+from tcpy.tcb import TCPState
+
+from .utils import PEER_IP, PEER_MAC, STACK_IP, STACK_MAC
+
+PORT = 8080
+
+
+def linked_stacks() -> Tuple[Stack, Stack]:
+    # The client stack (PEER_IP) and the server stack (STACK_IP) are connected by in-memory devices,
+    # the mac addresses are resolved with ARP
+    dev_a, dev_b = SocketDevice.pair()
+    return Stack(ip=PEER_IP, mac=PEER_MAC, device=dev_a), Stack(ip=STACK_IP, mac=STACK_MAC, device=dev_b)
+
+
+def test_blocking_echo() -> None:
+    client_stack, server_stack = linked_stacks()
+    client_stack.start_thread()
+    server_stack.start_thread()
+
+    server = Socket(server_stack)
+    server.bind(("", PORT))
+    server.listen()
+
+    def serve() -> None:
+        conn, addr = server.accept()
+        assert addr[0] == PEER_IP
+        with conn:
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    return
+                conn.sendall(data)
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+
+    with Socket(client_stack) as client:
+        client.connect((STACK_IP, PORT))
+        for size in (1, 1000, 10_000):
+            request = bytes(range(256)) * (size // 256) + bytes(size % 256)
+            client.sendall(request)
+            response = b""
+            while len(response) < size:
+                response += client.recv(size)
+            assert response == request
+
+        # the round trip time is measured with the timestamps echoed by the server
+        info = client.info()
+        assert info.state == TCPState.ESTABLISHED and info.timestamps
+        assert 0 < info.rtt < info.rto
+
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+    with pytest.raises(ConnectionRefusedError):
+        Socket(client_stack).connect((STACK_IP, PORT + 1))
+
+    server.close()
+    client_stack.stop()
+    server_stack.stop()
+
+
+def test_non_blocking_select() -> None:
+    client_stack, server_stack = linked_stacks()
+    client_stack.start_thread()
+    server_stack.start_thread()
+
+    server = Socket(server_stack, blocking=False)
+    server.bind(("", PORT))
+    server.listen()
+    server.set_congestion("cubic")
+    with pytest.raises(BlockingIOError):
+        server.accept()
+
+    client = Socket(client_stack, blocking=False)
+    with pytest.raises(BlockingIOError):
+        client.connect((STACK_IP, PORT))
+
+    # the client fd is readable once the connection is established
+    assert select.select([client], [], [], 5)[0] == [client]
+    client.connect((STACK_IP, PORT))
+
+    assert select.select([server], [], [], 5)[0] == [server]
+    conn, _ = server.accept()
+    assert conn._tcb is not None and isinstance(conn._tcb.cc, Cubic)
+    assert select.select([server, conn], [], [], 0)[0] == []
+    with pytest.raises(BlockingIOError):
+        conn.recv(10)
+
+    client.sendall(b"ping")
+    assert select.select([conn], [], [], 5)[0] == [conn]
+    assert conn.recv(10) == b"ping"
+    assert select.select([conn], [], [], 0)[0] == []
+
+    # the fd is readable once the peer closed the connection
+    client.close()
+    assert select.select([conn], [], [], 5)[0] == [conn]
+    assert conn.recv(10) == b""
+
+    conn.close()
+    server.close()
+    client_stack.stop()
+    server_stack.stop()
+
+
+def test_async_socket() -> None:
+    dev_a, dev_b = SocketDevice.pair()
+
+    async def main() -> None:
+        async with AsyncStack(ip=PEER_IP, mac=PEER_MAC, device=dev_a) as client_stack, AsyncStack(
+            ip=STACK_IP, mac=STACK_MAC, device=dev_b
+        ) as server_stack:
+            server = AsyncSocket(server_stack)
+            server.bind(("", PORT))
+            server.listen()
+
+            async def serve() -> None:
+                conn, _ = await server.accept()
+                await conn.sendall((await conn.recv(100)).upper())
+                conn.close()
+
+            task = asyncio.ensure_future(serve())
+            client = AsyncSocket(client_stack)
+            await client.connect((STACK_IP, PORT))
+            await client.sendall(b"hello")
+            assert await client.recv(100) == b"HELLO"
+            assert await client.recv(100) == b""
+            client.close()
+            await task
+            server.close()
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    dev_a.close()
+    dev_b.close()
@@ -0,0 +1,478 @@
+import errno
+import socket
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import pytest
+
+from tcpy.arp import mac2b
+from tcpy.constants import (
+    ARP_IPV4,
+    ETH_P_IP,
+    ICMP,
+    ICMP_V4_DST_UNREACHABLE,
+    ICMP_V4_ECHO,
+    ICMP_V4_FRAG_NEEDED,
+    ICMP_V4_REPLY,
+    IP_DF,
+    IP_TCP,
+    TCP_ACK,
+    TCP_RST,
+    TCP_SYN,
+)
+from tcpy.eth import ETH_HEADER_SIZE, EthernetHeader
+from tcpy.icmpv4 import ICMPv4Header
+from tcpy.ip import IP_HEADER_SIZE, IPHeader
+from tcpy.ip_util import ip2int
+from tcpy.netdev import CallableDevice, SocketDevice, SocketPairDevice
+from tcpy.reassembly import Reassembler
+from tcpy.stack import Stack
+from tcpy.tcp import TCP_HEADER_SIZE, TCPHeader
+from tcpy.tcp_engine import DELAYED_ACK_TIMEOUT
+from tcpy.tcp_options import TIMESTAMPS_SIZE
+from tcpy.timer_wheel import TimerWheel
+
+from .utils import (
+    PEER_IP,
+    PEER_MAC,
+    STACK_IP,
+    STACK_MAC,
+    arp_reply_frame,
+    arp_request_frame,
+    fragment_frames,
+    icmp_echo_frame,
+    ip_frame,
+    tcp_frame,
+)
+
+
+def test_rx_batch() -> None:
+    device = SocketPairDevice()
+    peer_sock = device.peer
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, mtu=9000, batch_size=2, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+
+    # Jumbo frame
+    for size in (56, 8000, 56):
+        peer_sock.send(icmp_echo_frame(size))
+
+    assert stack.rx_batch() == 2
+    assert stack.rx_batch() == 1
+    assert stack.rx_batch() == 0
+
+    # One write per reply, replies are written when the batch is over
+    assert stack.tx.frames == 3
+    assert stack.tx.syscalls_per_frame() == 1
+    assert len(stack.tx) == 0
+
+    for size in (56, 8000, 56):
+        ip_hdr = IPHeader.decode(EthernetHeader.decode(peer_sock.recv(65535)).payload)
+        icmp = ICMPv4Header.decode(ip_hdr.payload)
+        assert icmp._typ == ICMP_V4_REPLY
+        assert len(icmp._data) == size
+
+    device.close()
+
+
+def test_truncated_frames() -> None:
+    device = SocketPairDevice()
+    peer_sock = device.peer
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, batch_size=16, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+
+    tcp = tcp_frame(0)
+    bad_offset = bytearray(tcp)
+    # data offset of 2 words, smaller than the fixed header
+    bad_offset[14 + 20 + 12] = 2 << 4
+    bad_ihl = bytearray(icmp_echo_frame(8))
+    bad_ihl[14] = 0x43
+    truncated = [
+        tcp[:6],
+        arp_request_frame()[:14 + 4],
+        arp_request_frame()[:14 + 8 + 10],
+        ip_frame(IP_TCP, b"")[:14],
+        ip_frame(IP_TCP, b"")[:14 + 12],
+        bytes(bad_ihl),
+        ip_frame(IP_TCP, tcp[14 + 20:14 + 20 + 12]),
+        bytes(bad_offset),
+        ip_frame(ICMP, b"\x08\x00"),
+    ]
+    for frame in truncated:
+        peer_sock.send(frame)
+
+    assert stack.rx_batch() == len(truncated)
+    assert stack.rx_dropped == len(truncated)
+    assert stack.tx.frames == 0
+
+    # The stack still handles valid frames afterwards
+    peer_sock.send(icmp_echo_frame(56))
+    assert stack.rx_batch() == 1
+    assert stack.rx_dropped == len(truncated)
+    assert stack.tx.frames == 1
+
+    device.close()
+
+
+class FailingDevice(CallableDevice):
+
+    """A CallableDevice whose reads fail with error once it's set"""
+
+    def __init__(self) -> None:
+        super().__init__(lambda frame: None)
+        self.error: Optional[Exception] = None
+
+    def recv_into(self, buf: memoryview) -> int:
+        if self.error is not None:
+            raise self.error
+        return super().recv_into(buf)
+
+
+def test_device_errors() -> None:
+    device = FailingDevice()
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, batch_size=4, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+    device.inject(icmp_echo_frame(56))
+    assert stack.rx_batch() == 1
+    assert stack._pool is not None and len(stack._pool) == 4
+
+    # A read error ends the batch, the buffers go back to the pool whatever happens
+    device.error = OSError(errno.EIO, "I/O error")
+    assert stack.rx_batch() == 0
+    assert stack.rx_errors == 1 and len(stack._pool) == 4
+    device.error = RuntimeError("unexpected")
+    with pytest.raises(RuntimeError):
+        stack.rx_batch()
+    assert len(stack._pool) == 4
+    device.close()
+
+    # The RX loop stops once the other end of the device is closed (it would spin on the readable fd)
+    sock, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, device=SocketDevice(sock))
+    peer.close()
+    thread = threading.Thread(target=stack.run, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive() and stack.device_eof
+    assert stack.rx_frames == 0 and stack.rx_errors == 0
+    sock.close()
+
+
+def test_rx_steady_state_allocations() -> None:
+    device = SocketPairDevice()
+    peer_sock = device.peer
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, mtu=9000, batch_size=16, device=device)
+    frame = arp_reply_frame()
+
+    def rx() -> None:
+        for _ in range(16):
+            peer_sock.send(frame)
+        assert stack.rx_batch() == 16
+
+    # Warm up (creates the pool and the ARP table entry)
+    rx()
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(100):
+            rx()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Nothing is kept around and frames are not copied in a newly allocated (jumbo) frame buffer
+    assert after - before < 1024
+    assert peak - before < stack.frame_size()
+    assert stack._pool is not None and stack._pool.misses == 0
+
+    device.close()
+
+
+def test_workers() -> None:
+    devices = [SocketPairDevice() for _ in range(2)]
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, queues=2)
+    stack.start_workers(list(devices))
+    for device in devices:
+        device.sock.close()
+
+    try:
+        # The peer MAC address is learned by the first worker, the second one gets it from its replica
+        devices[0].peer.send(arp_reply_frame())
+        for peer_sock in (device.peer for device in devices):
+            peer_sock.settimeout(5)
+            peer_sock.send(icmp_echo_frame(56))
+            ip_hdr = IPHeader.decode(EthernetHeader.decode(peer_sock.recv(65535)).payload)
+            assert ICMPv4Header.decode(ip_hdr.payload)._typ == ICMP_V4_REPLY
+
+        assert stack.worker_counters() == [2, 1]
+    finally:
+        stack.stop()
+        for device in devices:
+            device.close()
+
+
+def test_callable_device() -> None:
+    sent: List[bytes] = []
+    device = CallableDevice(sent.append)
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+
+    device.inject(icmp_echo_frame(56))
+    assert stack.rx_batch() == 1
+    assert stack.rx_batch() == 0
+
+    ip_hdr = IPHeader.decode(EthernetHeader.decode(sent[0]).payload)
+    assert ICMPv4Header.decode(ip_hdr.payload)._typ == ICMP_V4_REPLY
+
+    # A frame bigger than the MTU is truncated and dropped, the next ones are still handled
+    device.inject(icmp_echo_frame(3000))
+    device.inject(icmp_echo_frame(56))
+    assert stack.rx_batch() == 2
+    assert stack.rx_dropped == 1 and len(sent) == 2
+    device.close()
+
+
+def test_fragmented_echo() -> None:
+    sent: List[bytes] = []
+    device = CallableDevice(sent.append)
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+
+    # An echo request bigger than the MTU, its fragments arrive out of order
+    data = bytes(idx & 0xFF for idx in range(8000))
+    echo = ICMPv4Header(typ=ICMP_V4_ECHO, code=0, csum=0, data=data)
+    echo.adjust_checksum()
+    frames = fragment_frames(ICMP, echo.encode(), 1480)
+    for frame in frames[::-1]:
+        device.inject(frame)
+    assert stack.rx_batch() == len(frames)
+    assert len(stack.reassembly) == 0 and stack.reassembly.reassembled == 1
+
+    # the reply is fragmented too
+    assert len(sent) == len(frames) and all(len(frame) <= ETH_HEADER_SIZE + stack.mtu() for frame in sent)
+    reassembler = Reassembler(TimerWheel())
+    datagrams = [reassembler.add(EthernetHeader.decode(frame).payload) for frame in sent]
+    reply = ICMPv4Header.decode(IPHeader.decode(datagrams[-1]).payload)  # type: ignore
+    assert reply._typ == ICMP_V4_REPLY and reply._data == data
+    device.close()
+
+    # an MTU too small to fragment the datagrams is refused
+    with pytest.raises(ValueError):
+        Stack(ip=STACK_IP, mac=STACK_MAC, mtu=27, device=device)
+
+
+def test_linked_stacks() -> None:
+    # Two stacks connected by a pair of in-memory devices: an ARP request sent by the first one
+    # is answered by the second one
+    dev_a, dev_b = SocketDevice.pair()
+    stack_a = Stack(ip=PEER_IP, mac=PEER_MAC, device=dev_a)
+    stack_b = Stack(ip=STACK_IP, mac=STACK_MAC, device=dev_b)
+
+    dev_a.send([arp_request_frame()])
+    assert stack_b.rx_batch() == 1
+    assert stack_a.rx_batch() == 1
+    assert stack_a.table.get_mac_for_ip(ip2int(STACK_IP)) == mac2b(STACK_MAC)
+    assert stack_b.table.get_mac_for_ip(ip2int(PEER_IP)) == mac2b(PEER_MAC)
+
+    dev_a.close()
+    dev_b.close()
+
+
+def lossy_transfer(sack: bool) -> int:
+    """sends data between two stacks linked by in-process devices, some data segments are dropped
+
+    :sack: whether the stacks use selective acknowledgments
+    :returns: the number of bytes retransmitted by the sender
+
+    """
+    devices: List[CallableDevice] = []
+    seen: Dict[int, int] = {}
+
+    def deliver(idx: int, frame: bytes) -> None:
+        eth = EthernetHeader.decode(frame)
+        tcp_hdr = TCPHeader.decode(IPHeader.decode(eth.payload).payload) if eth.typ == ETH_P_IP else None
+        if idx == 1 and tcp_hdr is not None and tcp_hdr._payload:
+            # the third data segment is lost twice (a timeout is needed), the sixth one once
+            seen[tcp_hdr._seq] = count = seen.get(tcp_hdr._seq, 0) + 1
+            rank = sorted(seen).index(tcp_hdr._seq)
+            if (rank == 2 and count <= 2) or (rank == 5 and count == 1):
+                return
+        devices[idx].inject(frame)
+
+    devices.extend((CallableDevice(lambda frame: deliver(1, frame)), CallableDevice(lambda frame: deliver(0, frame))))
+    sender = Stack(ip=PEER_IP, mac=PEER_MAC, device=devices[0], sack=sack)
+    receiver = Stack(ip=STACK_IP, mac=STACK_MAC, device=devices[1], sack=sack)
+    sender.table.insert(ARP_IPV4, STACK_IP, mac2b(STACK_MAC))
+    receiver.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+
+    def pump() -> None:
+        while receiver.rx_batch() + sender.rx_batch():
+            pass
+
+    listener = receiver.listen(4242)
+    client = sender.connect(STACK_IP, 4242)
+    sender.flush()
+    pump()
+    server = receiver.tcp.accept(listener)
+    assert server is not None and client.sack_ok == server.sack_ok == sack
+
+    data = bytes(idx & 0xFF for idx in range(10 * client.mss))
+    sender.tcp.send(client, data)
+    sender.flush()
+    pump()
+    # the retransmission of the third segment is lost too
+    assert client.snd_una != client.snd_max
+    sender.tcp.retransmit_timeout(client)
+    sender.flush()
+    pump()
+
+    assert receiver.tcp.recv(server, len(data)) == data
+    for device in devices:
+        device.close()
+    return sender.tcp.retransmitted_bytes
+
+
+def test_sack_loss_recovery() -> None:
+    # go-back-N after the timeout resends what the receiver already holds, SACK only the holes
+    assert lossy_transfer(sack=False) > lossy_transfer(sack=True) == 3 * (Stack().tcp_mss() - TIMESTAMPS_SIZE)
+
+
+def frag_needed_frame(datagram: bytes, mtu: int) -> bytes:
+    """builds the ICMP fragmentation needed message a router sends to the stack at PEER_IP when it
+    can't forward a datagram"""
+    router = ip2int("10.0.0.1")
+    data = mtu.to_bytes(4, "big") + datagram[: IP_HEADER_SIZE + 8]
+    icmp = ICMPv4Header(typ=ICMP_V4_DST_UNREACHABLE, code=ICMP_V4_FRAG_NEEDED, csum=0, data=data)
+    icmp.adjust_checksum()
+    payload = icmp.encode()
+    ip_hdr = IPHeader.build(router, ip2int(PEER_IP), ICMP, len(payload), 0)
+    return EthernetHeader.spec.pack(mac2b(PEER_MAC), mac2b(STACK_MAC), ETH_P_IP) + ip_hdr.encode() + payload
+
+
+def test_path_mtu_discovery() -> None:
+    # A router with a 1000 bytes MTU between the stacks drops the bigger datagrams (they have the don't
+    # fragment flag) and reports its MTU
+    path_mtu = 1000
+    devices: List[CallableDevice] = []
+    icmp: List[bytes] = []
+
+    def deliver(idx: int, frame: bytes) -> None:
+        datagram = frame[ETH_HEADER_SIZE:]
+        ip_hdr = IPHeader.decode(datagram) if EthernetHeader.decode(frame).typ == ETH_P_IP else None
+        if ip_hdr is not None and ip_hdr.len > path_mtu:
+            assert ip_hdr._flags == IP_DF
+            icmp.append(frag_needed_frame(datagram, path_mtu))
+            devices[0].inject(icmp[-1])
+            return
+        devices[idx].inject(frame)
+
+    devices.extend((CallableDevice(lambda frame: deliver(1, frame)), CallableDevice(lambda frame: deliver(0, frame))))
+    sender = Stack(ip=PEER_IP, mac=PEER_MAC, device=devices[0])
+    receiver = Stack(ip=STACK_IP, mac=STACK_MAC, device=devices[1])
+    sender.table.insert(ARP_IPV4, STACK_IP, mac2b(STACK_MAC))
+    receiver.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+
+    def pump() -> None:
+        while receiver.rx_batch() + sender.rx_batch():
+            pass
+
+    listener = receiver.listen(4242)
+    client = sender.connect(STACK_IP, 4242)
+    sender.flush()
+    pump()
+    server = receiver.tcp.accept(listener)
+    assert server is not None and client.mss == sender.tcp_mss() - TIMESTAMPS_SIZE
+
+    data = bytes(idx & 0xFF for idx in range(40_000))
+    sender.tcp.send(client, data)
+    sender.flush()
+    pump()
+    # the segments are sent again in smaller datagrams, no retransmission timeout was needed
+    assert receiver.tcp.recv(server, len(data)) == data
+    assert client.mss == path_mtu - IP_HEADER_SIZE - TCP_HEADER_SIZE - TIMESTAMPS_SIZE
+    assert sender.path_mtu(ip2int(STACK_IP)) == path_mtu
+    assert sender.tcp.timeouts == 0 and len(icmp) >= 1
+
+    # the new connections to the destination use the path MTU
+    other = sender.connect(STACK_IP, 4242)
+    sender.flush()
+    pump()
+    assert other.mss == client.mss
+
+    # a (forged) message quoting a segment that isn't in flight is ignored
+    sender.tcp.send(client, b"x")
+    quoted = bytearray(icmp[0][ETH_HEADER_SIZE + IP_HEADER_SIZE + 8 :])
+    quoted[IP_HEADER_SIZE + 4 : IP_HEADER_SIZE + 8] = (client.snd_max + 1000).to_bytes(4, "big")
+    mss = client.mss
+    devices[0].inject(frag_needed_frame(bytes(quoted), 600))
+    sender.rx_batch()
+    assert client.mss == mss and sender.path_mtu(ip2int(STACK_IP)) == path_mtu
+
+    # a datagram with the don't fragment flag bigger than the MTU isn't sent
+    sent = len(sender.tx)
+    sender.ip_output(ip2int(STACK_IP), [IPHeader.build(ip2int(PEER_IP), ip2int(STACK_IP), IP_TCP, 2000, 0).encode(), bytes(2000)])
+    assert sender.tx_dropped == 1 and len(sender.tx) == sent
+
+    for device in devices:
+        device.close()
+
+
+def test_tcp_segments() -> None:
+    device = SocketPairDevice()
+    stack = Stack(ip=STACK_IP, mac=STACK_MAC, device=device)
+    stack.table.insert(ARP_IPV4, PEER_IP, mac2b(PEER_MAC))
+    listener = stack.listen(4242)
+
+    def recv_segment() -> TCPHeader:
+        ip_hdr = IPHeader.decode(EthernetHeader.decode(device.peer.recv(65535)).payload)
+        tcp_hdr = TCPHeader.decode(ip_hdr.payload)
+        assert tcp_hdr.checksum(ip_hdr) == 0
+        return tcp_hdr
+
+    device.peer.send(tcp_frame(0, flags=TCP_SYN, seq=100, ack=0))
+    stack.rx_batch()
+    syn_ack = recv_segment()
+    assert syn_ack._flags == TCP_SYN | TCP_ACK
+    assert syn_ack._ack == 101
+    # The peer didn't send options: the default MSS is used and the window isn't scaled
+    assert syn_ack.options().mss == stack.tcp_mss() and syn_ack.options().wscale is None
+
+    ack = (syn_ack._seq + 1) & 0xFFFFFFFF
+    device.peer.send(tcp_frame(5, flags=TCP_ACK, seq=101, ack=ack))
+    stack.rx_batch()
+    tcb = stack.tcp.accept(listener)
+    assert tcb is not None and stack.tcp.recv(tcb, 10) == bytes(5)
+    # The ACK is delayed
+    time.sleep(2 * DELAYED_ACK_TIMEOUT)
+    stack.run_timers()
+    assert recv_segment()._ack == 106
+    assert stack.tcp.delayed_acks == 1
+
+    # A batch of full sized segments gets a single cumulative ACK
+    mss = stack.tcp_mss()
+    for idx in range(4):
+        device.peer.send(tcp_frame(mss, seq=106 + idx * mss, ack=ack))
+    assert stack.rx_batch() == 4
+    assert recv_segment()._ack == 106 + 4 * mss
+    assert stack.tcp.acks_saved == 3
+
+    # Data segments are built from the header template of the connection, it follows the ARP table
+    for mac in (PEER_MAC, "00:00:00:00:00:42"):
+        stack.table.update(ARP_IPV4, PEER_IP, mac2b(mac))
+        stack.tcp.send(tcb, b"hello")
+        stack.flush()
+        frame = device.peer.recv(65535)
+        assert EthernetHeader.decode(frame).dmac == mac2b(mac)
+        ip_hdr = IPHeader.decode(EthernetHeader.decode(frame).payload)
+        data = TCPHeader.decode(ip_hdr.payload)
+        assert data.checksum(ip_hdr) == 0 and bytes(data._payload) == b"hello"
+    assert tcb.template is not None
+
+    # No listener on this port
+    device.peer.send(tcp_frame(0, flags=TCP_SYN, seq=100, ack=0, dst_port=4343))
+    stack.rx_batch()
+    assert recv_segment()._flags == TCP_RST | TCP_ACK
+
+    device.close()
@@ -0,0 +1,809 @@
+import random
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+import pytest
+
+from tcpy.congestion import Cubic, NewReno, Reno
+from tcpy.constants import INADDR_ANY, TCP_ACK, TCP_RST, TCP_SYN
+from tcpy.ip_util import ip2int
+from tcpy.seq import SeqRanges, seq_add, seq_diff, seq_le, seq_lt
+from tcpy.tcb import DEFAULT_BUFFER_SIZE, INITIAL_RTO, TCB, ConnKey, TCPState
+from tcpy.tcp import TCPHeader
+from tcpy.tcp_engine import (
+    COOKIE_MAX_AGE,
+    COOKIE_PERIOD_BITS,
+    DELAYED_ACK_TIMEOUT,
+    KEEPALIVE_IDLE,
+    KEEPALIVE_INTERVAL,
+    KEEPALIVE_PROBES,
+    MAX_RETRIES,
+    MAX_RTO,
+    MIN_RTO,
+    MSL,
+    TCPEngine,
+)
+from tcpy.tcp_options import TIMESTAMPS_SIZE
+
+from .utils import PEER_IP, STACK_IP
+
+A = ip2int(PEER_IP)
+B = ip2int(STACK_IP)
+# payload of a full sized segment: the MSS minus the timestamps option
+SEG = 1460 - TIMESTAMPS_SIZE
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class WrappingEngine(TCPEngine):
+
+    """An engine using ISNs close to 2**32 (sequence numbers wrap around during the transfers)"""
+
+    def isn(self, key: ConnKey) -> int:
+        return 0xFFFFFF00
+
+
+class Link:
+
+    """Two engines connected back to back, segments are delivered when run is called
+    (every segment is acknowledged right away unless delayed_ack is set)"""
+
+    def __init__(
+        self, buffer_size: int = DEFAULT_BUFFER_SIZE, delayed_ack: float = 0.0, sack: bool = True, timestamps: bool = True
+    ) -> None:
+        self.clock = Clock()
+        self.wire: Deque[Tuple[int, int, TCPHeader]] = deque()
+        self.a: TCPEngine = WrappingEngine(
+            self._output,
+            clock=self.clock,
+            buffer_size=buffer_size,
+            delayed_ack=delayed_ack,
+            sack=sack,
+            timestamps=timestamps,
+        )
+        self.b = TCPEngine(
+            self._output,
+            clock=self.clock,
+            buffer_size=buffer_size,
+            delayed_ack=delayed_ack,
+            sack=sack,
+            timestamps=timestamps,
+        )
+        self.engines: Dict[int, TCPEngine] = {A: self.a, B: self.b}
+
+    def _output(self, saddr: int, daddr: int, seg: TCPHeader) -> None:
+        self.wire.append((saddr, daddr, seg))
+
+    def run(self, batch: bool = False) -> int:
+        """delivers the segments on the wire
+
+        :batch: all the segments are delivered in a batch (see TCPEngine.start_batch)
+
+        """
+        count = 0
+        while self.wire:
+            if batch:
+                self.a.start_batch()
+                self.b.start_batch()
+            while self.wire:
+                saddr, daddr, seg = self.wire.popleft()
+                # Segments go through their encoding (the payload isn't shared)
+                self.engines[daddr].segment_arrives(saddr, daddr, TCPHeader.decode(seg.encode()))
+                count += 1
+            if batch:
+                self.a.end_batch()
+                self.b.end_batch()
+        return count
+
+    def advance(self, delay: float) -> None:
+        """moves the clock forward and runs the expired timers"""
+        self.clock.now += delay
+        self.a.timers.advance()
+        self.b.timers.advance()
+
+
+def test_seq_arithmetic() -> None:
+    assert seq_add(0xFFFFFFFF, 2) == 1
+    assert seq_diff(1, 0xFFFFFFFF) == 2
+    assert seq_diff(0xFFFFFFFF, 1) == -2
+    assert seq_lt(0xFFFFFFF0, 5)
+    assert not seq_lt(5, 0xFFFFFFF0)
+    assert seq_le(7, 7)
+
+
+def test_connection_lifecycle() -> None:
+    link = Link()
+    listener = link.b.listen(B, 80)
+
+    client = link.a.connect(A, 5000, B, 80)
+    assert client.state == TCPState.SYN_SENT
+    link.run()
+    assert client.state == TCPState.ESTABLISHED
+
+    server = link.b.accept(listener)
+    assert server is not None and server.state == TCPState.ESTABLISHED
+    assert link.b.accept(listener) is None
+
+    # Data in both directions (several segments, the client sequence numbers wrap around)
+    data = bytes(idx & 0xFF for idx in range(5000))
+    assert link.a.send(client, data) == len(data)
+    link.run()
+    assert link.b.recv(server, 10000) == data
+    assert len(client.snd_buf) == 0 and client.snd_una == client.snd_nxt
+    assert seq_lt(client.iss, client.snd_nxt) and client.snd_nxt < client.iss
+
+    link.b.send(server, b"pong")
+    link.run()
+    assert link.a.recv(client, 100) == b"pong"
+
+    # The client closes first
+    link.a.close(client)
+    assert client.state == TCPState.FIN_WAIT_1
+    link.run()
+    assert client.state == TCPState.FIN_WAIT_2
+    assert server.state == TCPState.CLOSE_WAIT
+
+    link.b.close(server)
+    assert server.state == TCPState.LAST_ACK
+    link.run()
+    assert server.state == TCPState.CLOSED
+    assert client.state == TCPState.TIME_WAIT
+    assert len(link.b.table) == 0
+
+    # The 4-tuple can be used again once 2 * MSL expired
+    with pytest.raises(ValueError):
+        link.a.connect(A, 5000, B, 80)
+    link.advance(2 * MSL)
+    assert len(link.a.table) == 0
+    client = link.a.connect(A, 5000, B, 80)
+    link.run()
+    assert client.state == TCPState.ESTABLISHED
+
+
+def test_connection_refused() -> None:
+    link = Link()
+    client = link.a.connect(A, 5000, B, 81)
+    link.run()
+    assert client.state == TCPState.CLOSED
+    assert len(link.a.table) == len(link.b.table) == 0
+
+
+def test_abort() -> None:
+    link = Link()
+    link.b.listen(B, 80)
+    client = link.a.connect(A, 5000, B, 80)
+    link.run()
+
+    link.a.abort(client)
+    link.run()
+    assert client.state == TCPState.CLOSED
+    assert len(link.a.table) == len(link.b.table) == 0
+
+
+def test_listener_address() -> None:
+    link = Link()
+    other = ip2int("10.0.0.42")
+    link.engines[other] = link.b
+
+    # A listener only accepts the connections to its own address
+    link.b.listen(other, 80)
+    client = link.a.connect(A, 5000, B, 80)
+    link.run()
+    assert client.state == TCPState.CLOSED
+    assert len(link.b.table) == 0
+
+    # The wildcard listener accepts the connections to the addresses without a listener
+    wildcard = link.b.listen(INADDR_ANY, 80)
+    client = link.a.connect(A, 5001, B, 80)
+    link.run()
+    assert client.state == TCPState.ESTABLISHED
+    assert link.b.accept(wildcard) is not None
+    assert link.b.table.listener(other, 80) is not wildcard
+    assert link.b.table.listener(B, 80) is wildcard
+
+    with pytest.raises(ValueError):
+        link.b.listen(INADDR_ANY, 80)
+
+
+def syn(saddr: int, sport: int) -> Tuple[int, int, TCPHeader]:
+    """returns a SYN from saddr:sport to B:80"""
+    seg = TCPHeader(
+        src_port=sport,
+        dst_port=80,
+        seq=sport * 1000,
+        ack=0,
+        hl=5,
+        flags=TCP_SYN,
+        win_size=0xFFFF,
+        csum=0,
+        uptr=0,
+        additional_fields=b"",
+        payload=b"",
+    )
+    return saddr, B, seg
+
+
+def handshake_ack(syn_ack: TCPHeader) -> TCPHeader:
+    """returns the ACK completing the handshake of a SYN-ACK sent by B"""
+    ack = TCPHeader.decode(syn_ack.encode())
+    ack.src_port, ack.dst_port = ack.dst_port, ack.src_port
+    ack._seq, ack._ack, ack._flags = syn_ack._ack, seq_add(syn_ack._seq, 1), TCP_ACK
+    return ack
+
+
+def test_syn_flood() -> None:
+    link = Link()
+    listener = link.b.listen(B, 80, backlog=2, syn_backlog=8)
+
+    # Spoofed SYNs: a TCB is only created for the first ones, the others get a SYN cookie
+    for idx in range(100):
+        link.b.segment_arrives(*syn(ip2int("10.1.0.0") + idx, 1024 + idx))
+    assert len(link.wire) == 100
+    link.wire.clear()
+    assert listener.half_open == 8
+    assert len(link.b.table) == 8
+    assert link.b.syn_cookies_sent == 92
+
+    # A legitimate client completes the handshake with its cookie
+    client = link.a.connect(A, 5000, B, 80)
+    link.run()
+    assert client.state == TCPState.ESTABLISHED
+    assert link.b.syn_cookies_accepted == 1
+    server = link.b.accept(listener)
+    assert isinstance(server, TCB) and server.state == TCPState.ESTABLISHED
+    assert server.mss == 1460 and not server.sack_ok and not server.ts_ok
+    link.a.send(client, b"hello")
+    link.run()
+    assert link.b.recv(server, 100) == b"hello"
+
+    # A forged ACK is reset
+    _, _, forged = syn(A, 5001)
+    forged._flags = TCP_ACK
+    forged._ack = 0x12345678
+    link.b.segment_arrives(A, B, forged)
+    _, _, rst = link.wire.popleft()
+    assert rst._flags & TCP_RST
+    assert link.b.table.get((A, 5001, B, 80)) is None
+
+    # The cookies expire
+    link.b.segment_arrives(*syn(A, 5002))
+    _, _, syn_ack = link.wire.popleft()
+    link.clock.now += COOKIE_MAX_AGE << COOKIE_PERIOD_BITS
+    link.b.segment_arrives(A, B, handshake_ack(syn_ack))
+    _, _, rst = link.wire.popleft()
+    assert rst._flags & TCP_RST
+    assert link.b.syn_cookies_accepted == 1
+
+    # The half-open connections time out
+    for _ in range(10):
+        link.advance(MAX_RTO)
+    link.wire.clear()
+    assert listener.half_open == 0
+    assert len(link.b.table) == 1
+
+    # The SYNs are dropped while the accept queue is full
+    link.wire.clear()
+    for port in (6000, 6001):
+        link.a.connect(A, port, B, 80)
+        link.run()
+    assert len(listener.accept_queue) == 2
+    link.b.segment_arrives(*syn(A, 6002))
+    assert not link.wire
+    assert link.b.listen_drops == 1
+
+    # A valid cookie is dropped (without RST) while the accept queue is full
+    link.b.accept(listener)
+    listener.syn_backlog = 0
+    link.b.segment_arrives(*syn(A, 6003))
+    _, _, syn_ack = link.wire.popleft()
+    link.a.connect(A, 6004, B, 80)
+    link.run()
+    assert len(listener.accept_queue) == 2 and link.b.syn_cookies_accepted == 2
+    link.b.segment_arrives(A, B, handshake_ack(syn_ack))
+    assert not link.wire
+    assert link.b.cookie_drops == 1 and link.b.listen_drops == 1
+    assert link.b.table.get((A, 6003, B, 80)) is None
+
+
+def test_forged_ack() -> None:
+    link = Link()
+    listener = link.b.listen(B, 80, syn_backlog=0)
+    link.b.segment_arrives(*syn(A, 5000))
+    _, _, syn_ack = link.wire.popleft()
+    ack = handshake_ack(syn_ack)
+
+    # The ACKs are only checked as SYN cookies while a cookie sent by the listener can be valid
+    other = link.b.listen(B, 81)
+    ack.dst_port = 81
+    link.b.segment_arrives(A, B, ack)
+    _, _, rst = link.wire.popleft()
+    assert rst._flags & TCP_RST and rst._seq == ack._ack
+    assert other.cookie_time is None and not other.accept_queue
+
+    link.advance(COOKIE_MAX_AGE << COOKIE_PERIOD_BITS)
+    ack.dst_port = 80
+    link.b.segment_arrives(A, B, ack)
+    _, _, rst = link.wire.popleft()
+    assert rst._flags & TCP_RST
+    assert not listener.accept_queue and link.b.syn_cookies_accepted == 0
+
+
+def test_out_of_window_segment() -> None:
+    link = Link()
+    listener = link.b.listen(B, 80)
+    client = link.a.connect(A, 5000, B, 80)
+    link.run()
+    server = link.b.accept(listener)
+    assert isinstance(server, TCB)
+
+    # An old duplicate is acknowledged but not delivered
+    link.a.send(client, b"hello")
+    _, _, seg = link.wire[0]
+    link.run()
+    link.b.segment_arrives(A, B, seg)
+    assert len(link.wire) == 1
+    link.run()
+    assert link.b.recv(server, 100) == b"hello"
+
+
+def test_bounded_buffers() -> None:
+    # The stream is much larger than the buffers: the data wraps around the ring buffers many times
+    link = Link(buffer_size=1500)
+    listener = link.b.listen(B, 80)
+    client = link.a.connect(A, 5000, B, 80)
+    link.run()
+    server = link.b.accept(listener)
+    assert server is not None
+
+    data = bytes(idx * 7 & 0xFF for idx in range(50_000))
+    sent, received = 0, bytearray()
+    buf = memoryview(bytearray(1000))
+    while len(received) < len(data):
+        sent += link.a.send(client, data[sent : sent + 4000])
+        assert len(client.snd_buf) <= 1500
+        link.run()
+        assert len(server.rcv_buf) <= 1500
+        received += buf[: link.b.recv_into(server, buf)]
+        link.run()
+
+    assert received == data
+
+
+def test_window_scaling() -> None:
+    link = Link(buffer_size=1 << 20)
+    listener = link.b.listen(B, 80)
+    client = link.a.connect(A, 5000, B, 80)
+    syn = link.wire[0][2].options()
+    assert syn.mss == 1460 and syn.wscale == 5
+    link.run()
+    server = link.b.accept(listener)
+    assert server is not None
+
+    for tcb in (client, server):
+        assert tcb.wscale_ok and tcb.snd_wscale == tcb.rcv_wscale == 5
+        assert tcb.mss == SEG
+    # the window of the ACK completing the handshake is scaled: the whole buffer of the client
+    # is usable (not capped at 64 KiB)
+    assert server.snd_wnd == 1 << 20
+
+    data = bytes(512 * 1024)
+    assert link.b.send(server, data) == len(data)
+    # the first burst is limited by the initial congestion window
+    assert len(link.wire) == 10
+    link.run()
+    assert link.a.recv(client, len(data)) == data
+
+
+def established(link: Link) -> Tuple[TCB, TCB]:
+    listener = link.b.listen(B, 80)
+    client = link.a.connect(A, 5000, B, 80)
+    link.run()
+    server = link.b.accept(listener)
+    assert server is not None
+    return client, server
+
+
+def test_fast_retransmit() -> None:
+    link = Link(buffer_size=1 << 20, sack=False)
+    client, server = established(link)
+
+    data = bytes(idx & 0xFF for idx in range(10 * SEG))
+    link.a.send(client, data)
+    # a segment of the initial window is lost: the next ones are answered with duplicate ACKs
+    # (the receiver keeps them), the retransmission of the lost segment fills the hole
+    assert len(link.wire) == 10
+    del link.wire[6]
+    link.run()
+
+    assert link.b.recv(server, len(data)) == data
+    assert link.a.fast_retransmits == 1 and link.a.retransmits == 1 and link.a.timeouts == 0
+    # ssthresh is half of the 4 segments in flight when the loss was detected
+    assert not client.in_recovery and client.cc.cwnd == client.cc.ssthresh == 2 * SEG
+
+
+def test_newreno_partial_ack() -> None:
+    link = Link(buffer_size=1 << 20, sack=False)
+    client, server = established(link)
+
+    data = bytes(idx & 0xFF for idx in range(10 * SEG))
+    link.a.send(client, data)
+    # two segments are lost: the ACK of the first retransmission is partial, the second hole
+    # is retransmitted without waiting for duplicate ACKs (RFC 6582)
+    del link.wire[6]
+    del link.wire[3]
+    link.run()
+
+    assert link.b.recv(server, len(data)) == data
+    assert link.a.fast_retransmits == 1 and link.a.retransmits == 2 and link.a.timeouts == 0
+
+
+def test_sack_recovery() -> None:
+    link = Link(buffer_size=1 << 20)
+    client, server = established(link)
+    assert client.sack_ok and server.sack_ok
+
+    data = bytes(idx & 0xFF for idx in range(10 * SEG))
+    link.a.send(client, data)
+    lost = [link.wire[idx][2]._seq for idx in (2, 5, 6)]
+    for idx in (6, 5, 2):
+        del link.wire[idx]
+    # the duplicate ACKs report what the receiver holds, the first block has the last segment received
+    segments = list(link.wire)
+    link.wire.clear()
+    for saddr, daddr, seg in segments[:5]:
+        link.b.segment_arrives(saddr, daddr, TCPHeader.decode(seg.encode()))
+    assert [seg.options().sack for _, _, seg in list(link.wire)[2:]] == [
+        [(lost[0] + SEG, lost[0] + 2 * SEG)],
+        [(lost[0] + SEG, lost[0] + 3 * SEG)],
+        [(lost[2] + SEG, lost[2] + 2 * SEG), (lost[0] + SEG, lost[0] + 3 * SEG)],
+    ]
+    assert list(server.ooo or ()) == [(lost[0] + SEG, lost[0] + 3 * SEG), (lost[2] + SEG, lost[2] + 2 * SEG)]
+    link.wire.extend(segments[5:])
+
+    link.run()
+    assert link.b.recv(server, len(data)) == data
+    # only the holes are retransmitted, in a single recovery
+    assert link.a.fast_retransmits == 1 and link.a.retransmits == 3 and link.a.timeouts == 0
+    assert link.a.retransmitted_bytes == 3 * SEG
+    assert not client.sacked and not server.ooo
+
+
+def test_reordering() -> None:
+    link = Link(buffer_size=1 << 20)
+    client, server = established(link)
+    rand = random.Random(7)
+
+    data = bytes(idx & 0xFF for idx in range(200 * SEG))
+    link.a.send(client, data)
+    received = bytearray()
+    ranges = 0
+    # every flight is delivered in a random order, the out of order data is delivered once the holes are filled
+    while link.wire:
+        segments = list(link.wire)
+        link.wire.clear()
+        rand.shuffle(segments)
+        for saddr, daddr, seg in segments:
+            link.engines[daddr].segment_arrives(saddr, daddr, TCPHeader.decode(seg.encode()))
+            if server.ooo is not None:
+                assert server.ooo.size <= server.rcv_buf.capacity
+                ranges = max(ranges, len(server.ooo))
+        received += link.b.recv(server, len(data))
+
+    assert received == data
+    assert ranges > 1
+    # the ranges are freed once the holes are filled
+    assert server.ooo is None
+
+
+def test_out_of_order_fin() -> None:
+    link = Link()
+    client, server = established(link)
+
+    # the first segment is delayed: the second one and the FIN arrive out of order, the connection is
+    # closed as soon as the hole is filled (the FIN isn't retransmitted)
+    data = bytes(idx & 0xFF for idx in range(2 * SEG))
+    link.a.send(client, data)
+    link.a.close(client)
+    assert len(link.wire) == 3
+    delayed = link.wire.popleft()
+    for saddr, daddr, seg in list(link.wire):
+        link.b.segment_arrives(saddr, daddr, TCPHeader.decode(seg.encode()))
+    link.wire.clear()
+    assert server.state == TCPState.ESTABLISHED and server.ooo_fin is not None
+
+    link.wire.append(delayed)
+    link.run()
+    assert server.state == TCPState.CLOSE_WAIT and server.ooo_fin is None
+    assert client.state == TCPState.FIN_WAIT_2
+    assert link.b.recv(server, len(data)) == data
+    assert link.a.retransmits == 0
+
+
+def test_time_wait_fin_retransmission() -> None:
+    link = Link()
+    client, server = established(link)
+    link.a.close(client)
+    link.run()
+    link.b.close(server)
+    saddr, daddr, fin = link.wire.popleft()
+    link.a.segment_arrives(saddr, daddr, TCPHeader.decode(fin.encode()))
+    assert client.state == TCPState.TIME_WAIT
+    # the ACK of the FIN is lost
+    link.wire.clear()
+
+    # the retransmitted FIN is acknowledged again and restarts the 2 MSL timeout
+    link.advance(MSL)
+    assert len(link.wire) == 1 and link.b.retransmits == 1
+    link.run()
+    assert server.state == TCPState.CLOSED
+    link.advance(1.5 * MSL)
+    assert client.state == TCPState.TIME_WAIT
+    link.advance(MSL)
+    assert client.state == TCPState.CLOSED and len(link.a.table) == 0
+
+
+def test_out_of_order_limit() -> None:
+    link = Link()
+    client, server = established(link)
+    server.ooo = SeqRanges(max_ranges=1)
+
+    data = bytes(idx & 0xFF for idx in range(5 * SEG))
+    link.a.send(client, data)
+    segments = list(link.wire)
+    link.wire.clear()
+    # beyond the maximum number of ranges, an out of order segment is dropped without being written
+    for saddr, daddr, seg in (segments[1], segments[3]):
+        link.b.segment_arrives(saddr, daddr, TCPHeader.decode(seg.encode()))
+    assert list(server.ooo) == [(segments[1][2]._seq, segments[2][2]._seq)] and server.rcv_buf._ahead == 2 * SEG
+    link.wire.clear()
+
+    link.wire.extend(segments)
+    link.run()
+    assert link.b.recv(server, len(data)) == data
+
+
+def test_retransmit_timeout() -> None:
+    link = Link()
+    client, server = established(link)
+
+    # the whole window is lost, no duplicate ACK comes back
+    data = bytes(idx & 0xFF for idx in range(20 * SEG))
+    link.a.send(client, data)
+    link.wire.clear()
+    assert client.snd_nxt == client.snd_max != client.snd_una
+
+    link.a.retransmit_timeout(client)
+    assert client.cc.cwnd == client.mss and len(link.wire) == 1
+    link.run()
+    assert link.b.recv(server, len(data)) == data
+    assert link.a.timeouts == 1
+    assert client.snd_una == client.snd_nxt == client.snd_max
+
+    # the FIN is retransmitted too
+    link.a.close(client)
+    link.wire.clear()
+    link.a.retransmit_timeout(client)
+    link.run()
+    assert server.state == TCPState.CLOSE_WAIT and client.state == TCPState.FIN_WAIT_2
+
+
+def test_retransmission_timer() -> None:
+    link = Link()
+    client, server = established(link)
+    assert client.rtx_timer is None or not client.rtx_timer.active()
+
+    # the round trip time measured during the handshake (0 with the test clock) gives the lowest timeout
+    assert client.srtt == 0 and client.rto == MIN_RTO
+
+    data = bytes(idx & 0xFF for idx in range(3 * SEG))
+    link.a.send(client, data)
+    link.wire.clear()
+    link.advance(MIN_RTO - 0.01)
+    assert not link.wire
+    link.advance(0.01)
+    assert len(link.wire) == 1 and link.a.timeouts == 1
+
+    # the timeout is backed off
+    link.wire.clear()
+    link.advance(MIN_RTO)
+    assert not link.wire
+    link.advance(MIN_RTO)
+    assert len(link.wire) == 1 and client.retries == 2
+
+    link.run()
+    assert link.b.recv(server, len(data)) == data
+    assert client.retries == 0 and client.rtx_timer is not None and not client.rtx_timer.active()
+
+    # the connection is aborted if the peer doesn't answer anymore
+    link.a.send(client, b"hello")
+    for _ in range(MAX_RETRIES + 1):
+        link.wire.clear()
+        link.advance(MAX_RTO)
+    assert client.state == TCPState.CLOSED and client.reset
+    assert len(link.a.table) == 0 and len(link.a.timers) == 0
+
+
+@pytest.mark.parametrize("timestamps", (True, False))
+def test_rtt_estimation(timestamps: bool) -> None:
+    link = Link(timestamps=timestamps)
+    listener = link.b.listen(B, 80)
+    client = link.a.connect(A, 5000, B, 80)
+    link.advance(0.1)
+    link.run()
+    server = link.b.accept(listener)
+    assert server is not None and client.ts_ok == server.ts_ok == timestamps
+
+    # the handshake gives the first sample (RFC 6298, 2.2)
+    assert client.srtt == pytest.approx(0.1) and client.rttvar == pytest.approx(0.05)
+    assert client.rto == pytest.approx(0.3)
+    assert server.srtt == 0 and server.rto == MIN_RTO
+
+    # the estimate converges to the round trip time of the path, the timeout follows it
+    for _ in range(30):
+        link.a.send(client, b"ping")
+        link.advance(0.02)
+        link.run()
+        link.b.recv(server, 4)
+    assert client.srtt is not None and abs(client.srtt - 0.02) < 0.002
+    assert client.rto == MIN_RTO
+
+    info = client.info()
+    assert info.rtt == client.srtt and info.rto == client.rto and info.timestamps == timestamps
+    assert info.mss == (SEG if timestamps else 1460) and info.cwnd == client.cc.cwnd
+
+
+def with_timestamps(seg: TCPHeader, tsval: int, tsecr: int) -> TCPHeader:
+    """returns a copy of seg carrying the given timestamps"""
+    seg = TCPHeader.decode(seg.encode())
+    options = seg.options()
+    options.timestamps = (tsval, tsecr)
+    seg.set_options(options)
+    return seg
+
+
+def test_bogus_timestamps() -> None:
+    link = Link()
+    client, server = established(link)
+    link.advance(100.0)
+
+    # ACKs echoing a TSecr of 0, a timestamp older than the data or from the future: the round trip time
+    # comes from the timed segment instead
+    for delta in (None, -1000, 1000):
+        link.a.send(client, b"ping")
+        link.advance(0.05)
+        saddr, daddr, seg = link.wire.popleft()
+        link.b.segment_arrives(saddr, daddr, TCPHeader.decode(seg.encode()))
+        _, _, ack = link.wire.popleft()
+        tsval, tsecr = ack.options().timestamps  # type: ignore
+        link.a.segment_arrives(B, A, with_timestamps(ack, tsval, 0 if delta is None else tsecr + delta))
+        assert client.snd_una == client.snd_max
+        assert client.srtt is not None and 0 < client.srtt <= 0.05 and client.rto < 1.0
+
+    # a segment acknowledging data not sent yet isn't acceptable: its timestamp isn't echoed
+    ts_recent = client.ts_recent
+    link.b.send(server, b"pong")
+    _, _, seg = link.wire.popleft()
+    seg._ack = seq_add(client.snd_max, 1000)
+    link.a.segment_arrives(B, A, with_timestamps(seg, ts_recent + 1000, 0))
+    assert client.ts_recent == ts_recent and not client.rcv_buf
+
+
+def test_syn_retransmission() -> None:
+    link = Link()
+    listener = link.b.listen(B, 80)
+    client = link.a.connect(A, 5000, B, 80)
+    link.wire.clear()
+    link.advance(INITIAL_RTO)
+    assert len(link.wire) == 1
+    link.run()
+    assert client.state == TCPState.ESTABLISHED and link.b.accept(listener) is not None
+
+
+def test_persist_timer() -> None:
+    link = Link(buffer_size=2 * SEG)
+    client, server = established(link)
+
+    data = bytes(idx & 0xFF for idx in range(4 * SEG))
+    assert link.a.send(client, data) == 2 * SEG
+    link.run()
+    # the window of the server is closed
+    assert client.snd_wnd == 0
+    assert link.a.send(client, data[2 * SEG :]) == 2 * SEG
+    assert client.persist_timer is not None and client.persist_timer.active()
+
+    # the window update is lost, the window probe gets it again
+    assert link.b.recv(server, len(data)) == data[: 2 * SEG]
+    assert len(link.wire) == 1
+    link.wire.clear()
+    link.advance(INITIAL_RTO)
+    assert len(link.wire) == 1
+    link.run()
+    assert link.b.recv(server, len(data)) == data[2 * SEG :]
+    assert not client.persist_timer.active()
+
+
+def test_keepalive() -> None:
+    link = Link()
+    client, server = established(link)
+    link.a.set_keepalive(client, True)
+
+    # the probe is answered
+    link.advance(KEEPALIVE_IDLE)
+    assert len(link.wire) == 1
+    link.run()
+    assert client.probes == 0
+
+    # the peer is gone
+    link.advance(KEEPALIVE_IDLE)
+    for _ in range(KEEPALIVE_PROBES):
+        assert len(link.wire) == 1
+        link.wire.clear()
+        link.advance(KEEPALIVE_INTERVAL)
+    assert client.state == TCPState.CLOSED and client.reset
+
+
+def test_delayed_ack() -> None:
+    link = Link(delayed_ack=DELAYED_ACK_TIMEOUT)
+    client, server = established(link)
+
+    # a single segment is acknowledged when the timer expires
+    link.a.send(client, b"hello")
+    link.run()
+    assert not link.wire and server.ack_pending == 1
+    link.advance(DELAYED_ACK_TIMEOUT)
+    assert len(link.wire) == 1 and link.b.delayed_acks == 1
+    link.run()
+    assert client.snd_una == client.snd_max
+
+    # every second full sized segment is acknowledged
+    link.a.send(client, bytes(4 * SEG))
+    assert len(link.wire) == 4
+    assert link.run() == 6
+    assert link.b.acks_saved == 2
+
+    # a single ACK per batch
+    link.a.send(client, bytes(8 * SEG))
+    assert len(link.wire) == 8
+    link.run(batch=True)
+    assert client.snd_una == client.snd_max and link.b.acks_saved == 9
+
+    # the reply carries the ACK
+    link.a.send(client, b"ping")
+    link.run()
+    link.b.send(server, b"pong")
+    assert len(link.wire) == 1 and not server.ack_pending
+    link.run()
+    assert link.b.acks_saved == 10
+    assert client.ack_pending == 1 and client.delack_timer is not None and client.delack_timer.active()
+
+    # out of order segments are acknowledged right away
+    link.a.send(client, bytes(3 * SEG))
+    del link.wire[0]
+    assert link.run() == 4
+
+
+def test_congestion_control_selection() -> None:
+    link = Link()
+    link.b.congestion = "cubic"
+    listener = link.b.listen(B, 80)
+    listener.congestion = "reno"
+    client = link.a.connect(A, 5000, B, 80, congestion="cubic")
+    link.run()
+    server = link.b.accept(listener)
+    assert server is not None
+
+    assert isinstance(client.cc, Cubic) and isinstance(server.cc, Reno)
+    assert client.cc.mss == client.mss
+
+    link.a.set_congestion(client, "newreno")
+    assert type(client.cc) is NewReno
+    with pytest.raises(ValueError):
+        link.a.set_congestion(client, "vegas")
+    with pytest.raises(ValueError):
+        TCPEngine(link._output, congestion="vegas")
@@ -1,11 +1,13 @@
+from tcpy.header import fields
 from tcpy.ip import IPHeader
 from tcpy.tcp import TCPHeader
+from tcpy.tcp_options import TCPOptions
 
 from .utils import run_cmd_with_stack
 
 
 def test_tcp_handshake() -> None:
-    run_cmd_with_stack(["nc", "10.0.0.4", "1337", "-z", "-w", "1"])
+    run_cmd_with_stack(["nc", "10.0.0.4", "1337", "-z", "-w", "1"], listen=[1337])
 
 
 def test_decode_encode_tcp_hdr() -> None:
@@ -63,8 +65,8 @@ def test_decode_encode_tcp_hdr() -> None:
     ]
 
     res = TCPHeader.decode(bytes(raw))
-    res_dict = res.__dict__
-    expected = TCPHeader(
+    res_dict = fields(res)
+    expected_hdr = TCPHeader(
         src_port=33996,
         dst_port=1337,
         seq=1825363489,
@@ -76,7 +78,8 @@ def test_decode_encode_tcp_hdr() -> None:
         uptr=0,
         additional_fields=bytes(raw)[20:],
         payload=bytes([]),
-    ).__dict__
+    )
+    expected = fields(expected_hdr)
 
     assert len(res_dict) == len(expected)
     for k, v in res_dict.items():
@@ -160,3 +163,54 @@ def test_tcp_checksum() -> None:
     tcp_hdr = TCPHeader.decode(ip_hdr.payload)
 
     assert 0x1E22 == tcp_hdr.checksum(ip_hdr)
+
+
+def test_lazy_tcp_hdr() -> None:
+    raw = bytes.fromhex(
+        "84cc05396cccd62100000000a0027210fc5c0000"
+        "020405b40402080a90ceb0220000000001030307"
+    )
+
+    lazy = TCPHeader.decode(raw, lazy=True)
+    assert fields(lazy) == fields(TCPHeader.decode(raw))
+    assert lazy.encode() == raw
+
+
+def test_tcp_options() -> None:
+    raw = bytes.fromhex(
+        "84cc05396cccd62100000000a0027210fc5c0000"
+        "020405b40402080a90ceb0220000000001030307"
+    )
+
+    options = TCPHeader.decode(raw).options()
+    assert options == TCPOptions(mss=1460, wscale=7, sack_permitted=True, timestamps=(0x90CEB022, 0))
+    # Encoded with the same layout
+    assert options.encode() == raw[20:]
+
+    # Unknown options are skipped, a truncated option ends the parsing
+    assert TCPOptions.decode(bytes.fromhex("01fe0400000204" "05b4030305")).mss == 1460
+    assert TCPOptions.decode(bytes.fromhex("0204")) == TCPOptions()
+
+    for options in (
+        TCPOptions(),
+        TCPOptions(mss=536),
+        TCPOptions(mss=8960, wscale=14),
+        TCPOptions(sack_permitted=True),
+        TCPOptions(wscale=0, timestamps=(1, 2)),
+        TCPOptions(sack=[(1, 2), (0xFFFFFFF0, 3)]),
+        TCPOptions(timestamps=(1, 2), sack=[(10, 20), (30, 40), (50, 60)]),
+    ):
+        encoded = options.encode()
+        assert len(encoded) % 4 == 0
+        assert TCPOptions.decode(encoded) == options
+
+    # at most 4 SACK blocks fit in the options
+    sack = [(idx, idx + 1) for idx in range(6)]
+    assert TCPOptions.decode(TCPOptions(sack=sack).encode()).sack == sack[:4]
+    assert TCPOptions.decode(TCPOptions(timestamps=(1, 2), sack=sack).encode()).sack == sack[:3]
+
+    # same segment without options (data offset of 5 words)
+    tcp_hdr = TCPHeader.decode(raw[:12] + bytes([5 << 4]) + raw[13:20])
+    tcp_hdr.set_options(TCPOptions(mss=1460))
+    assert tcp_hdr._hl == 6
+    assert TCPHeader.decode(tcp_hdr.encode()).options().mss == 1460
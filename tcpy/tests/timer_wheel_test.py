@@ -0,0 +1,96 @@
+from typing import List
+
+from tcpy.timer_wheel import Timer, TimerWheel
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_timer_wheel() -> None:
+    clock = Clock()
+    wheel = TimerWheel(clock, tick=0.01)
+    fired: List[str] = []
+    timers = {name: Timer(fired.append, name) for name in ("a", "b", "c", "d")}
+
+    assert wheel.timeout() is None
+    wheel.schedule(timers["a"], 0.05)
+    # the other ones are in the higher levels of the wheel
+    wheel.schedule(timers["b"], 10)
+    wheel.schedule(timers["c"], 600)
+    wheel.schedule(timers["d"], 1)
+    assert len(wheel) == 4 and timers["a"].active()
+    assert wheel.timeout() == 0.05
+
+    # re-arming and cancelling
+    wheel.schedule(timers["d"], 3)
+    wheel.cancel(timers["c"])
+    wheel.cancel(timers["c"])
+    assert len(wheel) == 3 and not timers["c"].active()
+
+    clock.now = 0.04
+    assert wheel.advance() == 0 and not fired
+    clock.now = 0.05
+    assert wheel.advance() == 1 and fired == ["a"]
+    assert not timers["a"].active()
+
+    # the poll timeout never goes past the next cascade of the wheel
+    timeout = wheel.timeout()
+    assert timeout is not None and 0 < timeout <= 2.56
+
+    clock.now = 2.99
+    wheel.advance()
+    assert fired == ["a"]
+    clock.now = 3.0
+    wheel.advance()
+    assert fired == ["a", "d"]
+
+    # the clock jumps past several expirations
+    wheel.schedule(timers["c"], 4000)
+    clock.now = 5000
+    assert wheel.advance() == 2 and fired == ["a", "d", "b", "c"]
+    assert len(wheel) == 0 and wheel.timeout() is None
+
+
+def test_timer_wheel_precision() -> None:
+    clock = Clock()
+    wheel = TimerWheel(clock, tick=0.01)
+    expired: List[float] = []
+    delays = [0.01 * i + 0.003 for i in range(1, 30_000, 7)]
+    for delay in delays:
+        wheel.schedule(Timer(lambda _: expired.append(clock.now)), delay)
+
+    # timers are never late by more than a tick, nor early
+    while wheel.timeout() is not None:
+        timeout = wheel.timeout()
+        assert timeout is not None
+        clock.now = round(clock.now + timeout, 2)
+        wheel.advance()
+
+    assert len(expired) == len(delays)
+    for delay, when in zip(delays, expired):
+        assert delay <= when <= delay + 0.01 + 1e-9
+
+
+def test_timer_rearmed_from_callback() -> None:
+    clock = Clock()
+    wheel = TimerWheel(clock, tick=0.01)
+    count = []
+
+    def periodic(timer: Timer) -> None:
+        count.append(clock.now)
+        if len(count) < 5:
+            wheel.schedule(timer, 1)
+
+    timer = Timer(periodic)
+    timer.arg = timer
+    wheel.schedule(timer, 1)
+    for _ in range(10):
+        clock.now += 1
+        wheel.advance()
+
+    assert count == [1, 2, 3, 4, 5]
@@ -0,0 +1,22 @@
+import os
+
+from tcpy.netdev import FdDevice
+from tcpy.tx_queue import TXQueue
+
+
+def test_tx_queue() -> None:
+    rfd, wfd = os.pipe()
+    tx = TXQueue(threshold=16)
+
+    payload = memoryview(b"0123456789")
+    assert not tx.push([b"abc", payload[:5]])
+    assert tx.push([b"def", payload[5:], b"!"])
+    assert len(tx) == 2
+
+    assert tx.flush(FdDevice(wfd)) == 2
+    assert len(tx) == 0
+    assert os.read(rfd, 100) == b"abc01234def56789!"
+    assert tx.frames == 2 and tx.syscalls == 2
+
+    os.close(rfd)
+    os.close(wfd)
@@ -1,8 +1,33 @@
 import os
 import subprocess
-from typing import List
+from typing import List, Sequence
 
+from tcpy.arp import ARPHeader, ARPIPv4, mac2b
+from tcpy.constants import (
+    ARP_ETHERNET,
+    ARP_IPV4,
+    ARP_REPLY,
+    ARP_REQUEST,
+    ETH_P_ARP,
+    ETH_P_IP,
+    ICMP,
+    ICMP_V4_ECHO,
+    IP_DF,
+    IP_MF,
+    IP_TCP,
+    TCP_ACK,
+)
+from tcpy.eth import EthernetHeader
+from tcpy.icmpv4 import ICMPv4Header
+from tcpy.ip import IPHeader
+from tcpy.ip_util import Buffer, ip2int
 from tcpy.stack import Stack
+from tcpy.tcp import TCPHeader
+
+STACK_IP = "10.0.0.4"
+STACK_MAC = "aa:bb:cc:dd:ee:ff"
+PEER_IP = "10.0.0.5"
+PEER_MAC = "11:22:33:44:55:66"
 
 
 def setup_virt_interf() -> None:
@@ -10,13 +35,15 @@ def setup_virt_interf() -> None:
     subprocess.check_output(["ip", "route", "add", "dev", "tap0", "10.0.0.0/24"])
 
 
-def run_cmd_with_stack(cmd: List[str]) -> None:
+def run_cmd_with_stack(cmd: List[str], listen: Sequence[int] = ()) -> None:
     if not os.geteuid() == 0:
         print("Only root can run this test, skipping it for now...")
         return
 
     print("Starting the stack...")
     s = Stack()
+    for port in listen:
+        s.listen(port)
     s.start()
 
     print("Starting the virtual interface...")
@@ -26,3 +53,81 @@ def run_cmd_with_stack(cmd: List[str]) -> None:
     subprocess.check_output(cmd)
 
     s.stop()
+
+
+def ip_frame(proto: int, payload: Buffer, id: int = 0, flags: int = IP_DF, frag_offset: int = 0) -> bytes:
+    """builds an ethernet frame containing an IP datagram sent by the peer to the stack"""
+    ip_hdr = IPHeader(
+        version=4,
+        ihl=5,
+        tos=0,
+        len=20 + len(payload),
+        id=id,
+        flags=flags,
+        frag_offset=frag_offset,
+        ttl=64,
+        proto=proto,
+        csum=0,
+        saddr=ip2int(PEER_IP),
+        daddr=ip2int(STACK_IP),
+        payload=payload,
+    )
+    ip_hdr.adjust_checksum()
+    eth = EthernetHeader(
+        dmac=mac2b(STACK_MAC), smac=mac2b(PEER_MAC), typ=ETH_P_IP, payload=ip_hdr.encode()
+    )
+    return eth.encode()
+
+
+def fragment_frames(proto: int, payload: Buffer, size: int, id: int = 1) -> List[bytes]:
+    """builds the ethernet frames of the fragments (of size bytes of payload, the last one excepted)
+    of an IP datagram sent by the peer to the stack"""
+    return [
+        ip_frame(proto, payload[start : start + size], id, IP_MF if start + size < len(payload) else 0, start // 8)
+        for start in range(0, len(payload), size)
+    ]
+
+
+def tcp_frame(payload_size: int, flags: int = TCP_ACK, seq: int = 1, ack: int = 1, dst_port: int = 4242) -> bytes:
+    """builds an ethernet frame containing a TCP segment (with a valid checksum) with the given payload size"""
+    tcp_hdr = TCPHeader(
+        src_port=1337,
+        dst_port=dst_port,
+        seq=seq,
+        ack=ack,
+        hl=5,
+        flags=flags,
+        win_size=0xFFFF,
+        csum=0,
+        uptr=0,
+        additional_fields=b"",
+        payload=bytes(payload_size),
+    )
+    tcp_hdr.adjust_checksum(IPHeader.build(ip2int(PEER_IP), ip2int(STACK_IP), IP_TCP, tcp_hdr._length(), 0))
+    return ip_frame(IP_TCP, tcp_hdr.encode())
+
+
+def icmp_echo_frame(payload_size: int) -> bytes:
+    """builds an ethernet frame containing an ICMP echo request with the given payload size"""
+    # Same kind of payload as ping
+    data = bytes(idx & 0xFF for idx in range(payload_size))
+    echo = ICMPv4Header(typ=ICMP_V4_ECHO, code=0, csum=0, data=data)
+    echo.adjust_checksum()
+    return ip_frame(ICMP, echo.encode())
+
+
+def arp_reply_frame() -> bytes:
+    """builds an ethernet frame containing an ARP reply sent by the peer to the stack"""
+    return _arp_frame(ARP_REPLY, STACK_MAC)
+
+
+def arp_request_frame() -> bytes:
+    """builds an ethernet frame containing an ARP request (broadcasted) sent by the peer for the stack IP"""
+    return _arp_frame(ARP_REQUEST, "ff:ff:ff:ff:ff:ff")
+
+
+def _arp_frame(opcode: int, dmac: str) -> bytes:
+    data = ARPIPv4(smac=mac2b(PEER_MAC), sip=PEER_IP, dmac=mac2b(dmac), dip=STACK_IP)
+    arp = ARPHeader(hwtype=ARP_ETHERNET, protype=ARP_IPV4, hwsize=6, prosize=4, opcode=opcode, data=data.encode())
+    eth = EthernetHeader(dmac=mac2b(dmac), smac=mac2b(PEER_MAC), typ=ETH_P_ARP, payload=arp.encode())
+    return eth.encode()
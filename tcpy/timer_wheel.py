@@ -0,0 +1,189 @@
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_TICK = 0.01
+
+# slots of the first level (one tick each) and of the following levels
+ROOT_BITS = 8
+LEVEL_BITS = 6
+LEVELS = 4
+
+
+class Timer:
+
+    """A timer of a TimerWheel: callback(arg) is called when it expires, it can be re-armed"""
+
+    __slots__ = ("callback", "arg", "expires", "_slot", "_level")
+
+    def __init__(self, callback: Callable[[Any], None], arg: Any = None):
+        """creates a new (inactive) Timer
+
+        :callback: function called with arg when the timer expires
+        :arg: argument given to callback (for instance the connection owning the timer)
+
+        """
+        self.callback = callback
+        self.arg = arg
+        # expiration tick
+        self.expires = 0
+        # the slot holding the timer while it's armed
+        self._slot: Optional[Dict["Timer", None]] = None
+        self._level = 0
+
+    def active(self) -> bool:
+        """checks if the timer is armed"""
+        return self._slot is not None
+
+
+class TimerWheel:
+
+    """A hierarchical timing wheel (Varghese & Lauck): timers are stored in slots of lists indexed by
+    their expiration tick, the first level has a slot per tick and each following level covers the
+    whole range of the previous one per slot. Timers of a higher level are cascaded to the lower levels
+    when their slot comes up.
+
+    Arming, re-arming and cancelling a timer are O(1) (a slot is a dict used as an ordered set),
+    advancing the wheel only visits the ticks that elapsed (and skips the empty first level).
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, tick: float = DEFAULT_TICK):
+        """creates a new TimerWheel
+
+        :clock: function returning the current time in seconds
+        :tick: resolution of the timers in seconds
+
+        """
+        self._clock = clock
+        self.tick = tick
+        self._levels: List[List[Dict[Timer, None]]] = [[{} for _ in range(1 << ROOT_BITS)]]
+        for _ in range(LEVELS - 1):
+            self._levels.append([{} for _ in range(1 << LEVEL_BITS)])
+        # number of timers per level
+        self._counts = [0] * LEVELS
+        self._now = self._ticks(clock())
+
+    def _ticks(self, now: float) -> int:
+        # rounding errors must not delay the tick a timeout computed by timeout() ends on
+        return int(now / self.tick + 1e-6)
+
+    def __len__(self) -> int:
+        return sum(self._counts)
+
+    def schedule(self, timer: Timer, delay: float) -> None:
+        """arms a timer (it's re-armed if it was already armed)
+
+        :timer: the timer
+        :delay: delay in seconds (rounded up to the next tick)
+
+        """
+        slot = timer._slot
+        if slot is not None:
+            del slot[timer]
+            self._counts[timer._level] -= 1
+
+        # the clock may be ahead of the wheel if it wasn't advanced recently
+        now = max(self._ticks(self._clock()), self._now)
+        timer.expires = now + max(1, math.ceil(delay / self.tick - 1e-6))
+        self._insert(timer)
+
+    def cancel(self, timer: Timer) -> None:
+        """disarms a timer (nothing happens if it's not armed)
+
+        :timer: the timer
+
+        """
+        slot = timer._slot
+        if slot is None:
+            return
+
+        del slot[timer]
+        timer._slot = None
+        self._counts[timer._level] -= 1
+
+    def advance(self) -> int:
+        """runs the callbacks of the timers that expired
+
+        :returns: the number of expired timers
+
+        """
+        target = self._ticks(self._clock())
+        count = 0
+        root_mask = (1 << ROOT_BITS) - 1
+        while self._now < target:
+            if not self._counts[0]:
+                # nothing can expire before the next cascade: jump to it
+                boundary = (self._now | root_mask) + 1
+                if boundary > target or not sum(self._counts):
+                    self._now = target
+                    break
+                self._now = boundary - 1
+
+            self._now += 1
+            if not self._now & root_mask:
+                self._cascade(1)
+
+            slot = self._levels[0][self._now & root_mask]
+            while slot:
+                timer = next(iter(slot))
+                self.cancel(timer)
+                timer.callback(timer.arg)
+                count += 1
+
+        return count
+
+    def timeout(self) -> Optional[float]:
+        """returns the delay until the next timer may expire (used as the poll timeout of the RX loop)
+
+        :returns: a delay in seconds, None if there is no timer
+
+        """
+        if not sum(self._counts):
+            return None
+
+        root = self._levels[0]
+        root_size = len(root)
+        if self._counts[0]:
+            for delta in range(1, root_size + 1):
+                if root[(self._now + delta) % root_size]:
+                    break
+        else:
+            # the next cascade
+            delta = root_size - (self._now % root_size)
+
+        return max(0.0, (self._now + delta) * self.tick - self._clock())
+
+    def _insert(self, timer: Timer) -> None:
+        delta = timer.expires - self._now
+        if delta < 1 << ROOT_BITS:
+            level = 0
+        else:
+            level = min((delta.bit_length() - ROOT_BITS - 1) // LEVEL_BITS + 1, LEVELS - 1)
+
+        if level == 0:
+            idx = max(timer.expires, self._now) & ((1 << ROOT_BITS) - 1)
+        else:
+            # timers beyond the range of the last level are kept in its last slot and cascaded again
+            expires = min(timer.expires, self._now + (1 << (ROOT_BITS + LEVEL_BITS * (LEVELS - 1))) - 1)
+            idx = (expires >> (ROOT_BITS + LEVEL_BITS * (level - 1))) & ((1 << LEVEL_BITS) - 1)
+
+        slot = self._levels[level][idx]
+        slot[timer] = None
+        timer._slot = slot
+        timer._level = level
+        self._counts[level] += 1
+
+    def _cascade(self, level: int) -> None:
+        """moves the timers of the current slot of a level to the lower levels"""
+        shift = ROOT_BITS + LEVEL_BITS * (level - 1)
+        idx = (self._now >> shift) & ((1 << LEVEL_BITS) - 1)
+        if not idx and level + 1 < LEVELS:
+            self._cascade(level + 1)
+
+        slot = self._levels[level][idx]
+        timers = list(slot)
+        slot.clear()
+        self._counts[level] -= len(timers)
+        for timer in timers:
+            timer._slot = None
+            self._insert(timer)
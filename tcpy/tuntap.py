@@ -1,26 +1,46 @@
 import os
+import socket
 import struct
 from fcntl import ioctl
-from typing import Tuple
+from typing import List, Tuple
 
-from .constants import IFF_NO_PI, IFF_TAP, TUNSETIFF
+from .constants import IFF_MULTI_QUEUE, IFF_NO_PI, IFF_TAP, SIOCGIFMTU, SIOCSIFMTU, TUNSETIFF
 
 IFREQ_STRUCT = "16sH"
+IFREQ_MTU_STRUCT = "16si"
 
 
-def open_tun(interf: str) -> Tuple[int, Tuple[str, int]]:
+def open_tun(interf: str, multi_queue: bool = False) -> Tuple[int, Tuple[str, int]]:
     """opens a tun/tap interface
 
     :interf: A string for the name of the interface
+    :multi_queue: opens one queue of a multi queue interface (IFF_MULTI_QUEUE)
     :returns: A tuple (fd: int, (name: str, mode: int))
 
     """
     fd = os.open("/dev/net/tun", os.O_RDWR)
     mode = IFF_TAP | IFF_NO_PI
+    if multi_queue:
+        mode |= IFF_MULTI_QUEUE
     ifs = ioctl(fd, TUNSETIFF, encode_ifreq(interf, mode))
     return (fd, decode_ifreq(ifs))
 
 
+def open_tun_queues(interf: str, count: int) -> Tuple[List[int], Tuple[str, int]]:
+    """opens count queues of a multi queue tap interface, the kernel spreads the flows
+    across the queues (flow hashing)
+
+    :interf: A string for the name of the interface (it may be a template like tap%d)
+    :count: the number of queues
+    :returns: A tuple (fds: List[int], (name: str, mode: int))
+
+    """
+    fd, (name, mode) = open_tun(interf, multi_queue=True)
+    # The other queues are attached to the interface created by the first one
+    fds = [fd] + [open_tun(name, multi_queue=True)[0] for _ in range(count - 1)]
+    return (fds, (name, mode))
+
+
 def encode_ifreq(name: str, mode: int) -> bytes:
     """encode_ifreq encodes the given name and mode into an
     ifreq struct
@@ -42,3 +62,26 @@ def decode_ifreq(raw: bytes) -> Tuple[str, int]:
     """
     tup = struct.unpack(IFREQ_STRUCT, raw)
     return (tup[0].strip(b"\x00").decode(), tup[1])
+
+
+def get_mtu(name: str) -> int:
+    """returns the MTU of the given network interface
+
+    :name: Name of the network interface (str)
+    :returns: the MTU (int)
+
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        ifs = ioctl(sock, SIOCGIFMTU, struct.pack(IFREQ_MTU_STRUCT, name.encode(), 0))
+    return struct.unpack(IFREQ_MTU_STRUCT, ifs)[1]
+
+
+def set_mtu(name: str, mtu: int) -> None:
+    """sets the MTU of the given network interface (requires root)
+
+    :name: Name of the network interface (str)
+    :mtu: The MTU to set (int), for instance 9000 for jumbo frames
+
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        ioctl(sock, SIOCSIFMTU, struct.pack(IFREQ_MTU_STRUCT, name.encode(), mtu))
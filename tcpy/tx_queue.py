@@ -0,0 +1,76 @@
+import logging
+from typing import List
+
+from .ip_util import Buffer
+from .netdev import NetDevice
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TX_THRESHOLD = 256 * 1024
+
+
+class TXQueue:
+
+    """A queue of outgoing frames
+
+    Frames are queued as lists of segments (headers encoded separately and views over payloads)
+    and sent when the queue is flushed: fd devices write them with one os.writev per frame (the
+    segments are gathered by the kernel, frames are never concatenated in Python).
+    The queue is flushed at the end of every RX batch or once it holds more than threshold bytes.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_TX_THRESHOLD):
+        """creates a new TXQueue
+
+        :threshold: number of queued bytes above which push asks for a flush
+
+        """
+        self._threshold = threshold
+        self._frames: List[List[Buffer]] = []
+        self._size = 0
+        # counters
+        self.frames = 0
+        self.syscalls = 0
+        self.dropped = 0
+
+    def push(self, segments: List[Buffer]) -> bool:
+        """queues a frame, segments may be views over received frames (they are only
+        used until the next flush)
+
+        :segments: the segments of the frame, in order
+        :returns: True if the queue should be flushed
+
+        """
+        self._frames.append(segments)
+        self._size += sum(map(len, segments))
+        return self._size >= self._threshold
+
+    def flush(self, device: NetDevice) -> int:
+        """sends the queued frames on the device, frames that can't be sent without blocking are dropped
+
+        :device: the device of the interface
+        :returns: the number of frames written
+
+        """
+        frames, self._frames, self._size = self._frames, [], 0
+        written = 0
+
+        for idx, segments in enumerate(frames):
+            self.syscalls += 1
+            try:
+                device.send(segments)
+            except BlockingIOError:
+                self.dropped += len(frames) - idx
+                logger.warning("Dropping %d outgoing frames, the interface is busy", len(frames) - idx)
+                break
+            written += 1
+
+        self.frames += written
+        return written
+
+    def syscalls_per_frame(self) -> float:
+        """returns the average number of write syscalls per frame sent"""
+        return self.syscalls / self.frames if self.frames else 0.0
+
+    def __len__(self) -> int:
+        return len(self._frames)